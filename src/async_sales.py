@@ -0,0 +1,493 @@
+import asyncio
+import queue
+import threading
+import time
+from operator import itemgetter
+
+from cassandra.cluster import EXEC_PROFILE_DEFAULT
+from cassandra.query import BatchStatement, BatchType
+
+from etl_analysis import SALES_TABLES, build_scan_tasks, columnar_profile
+from etl_cassandra import (
+    BATCH_MAX_BYTES,
+    MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    TRANSACTION_ID_POS,
+    WriteTarget,
+    group_partition_batches,
+    prepare_targets,
+)
+from load_checkpoint import RetryBackoff
+from metrics import METRICS
+
+# Consultas de scan simultâneas e linhas por página (como no etl_analysis.py)
+SCAN_CONCURRENCY = 16
+SCAN_FETCH_SIZE = 10_000
+
+# Requisições de escrita em voo por carga
+LOAD_CONCURRENCY = 100
+
+# Envios seguidos antes de o writer ceder a vez no event loop, para que
+# scans e outras tarefas do mesmo loop não esperem uma rajada inteira
+SEND_BURST = 32
+
+_END = object()
+
+
+def _post(loop, callback, *args):
+    """
+    call_soon_threadsafe chamado das threads do driver. Respostas que chegam
+    depois de o loop fechar (scan abandonado no meio) são descartadas.
+    """
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        pass
+
+
+async def execute(session, statement, params=None, execution_profile=EXEC_PROFILE_DEFAULT):
+    """
+    session.execute_async como corrotina: devolve as linhas da primeira
+    página (no formato do row_factory do perfil) sem ocupar uma thread
+    esperando a resposta.
+    """
+    loop = asyncio.get_running_loop()
+    result = loop.create_future()
+
+    def settle(setter, value):
+        if not result.done():
+            setter(value)
+
+    response = session.execute_async(statement, params, execution_profile=execution_profile)
+    response.add_callbacks(
+        lambda rows: _post(loop, settle, result.set_result, rows),
+        lambda exc: _post(loop, settle, result.set_exception, exc),
+    )
+    return await result
+
+
+async def iter_pages(session, statement, params=None, execution_profile=EXEC_PROFILE_DEFAULT):
+    """
+    Páginas de uma consulta, uma por vez. A página seguinte só é pedida ao
+    cluster quando o consumidor volta para buscá-la, então uma consulta
+    lenta de consumir não acumula páginas em memória.
+    """
+    loop = asyncio.get_running_loop()
+    arrivals = asyncio.Queue()
+    response = session.execute_async(statement, params, execution_profile=execution_profile)
+    # os callbacks valem para todas as páginas da consulta
+    response.add_callbacks(lambda rows: _post(loop, arrivals.put_nowait, rows),
+                           lambda exc: _post(loop, arrivals.put_nowait, exc))
+    while True:
+        page = await arrivals.get()
+        if isinstance(page, Exception):
+            raise page
+        yield page
+        if not response.has_more_pages:
+            return
+        response.start_fetching_next_page()
+
+
+async def _scan_task(session, statement, params, execution_profile, pages):
+    timed = METRICS.enabled
+    started = time.perf_counter() if timed else None
+    try:
+        async for page in iter_pages(session, statement, params, execution_profile):
+            if timed:
+                METRICS.observe("analytics_page_latency_seconds",
+                                time.perf_counter() - started, outcome="ok")
+            await pages.put(page)
+            if timed:
+                started = time.perf_counter()
+    except Exception:
+        if timed:
+            METRICS.observe("analytics_page_latency_seconds",
+                            time.perf_counter() - started, outcome="error")
+        raise
+
+
+async def scan_sales(session, tasks=None, concurrency=SCAN_CONCURRENCY,
+                     fetch_size=SCAN_FETCH_SIZE, execution_profile=None,
+                     mode=None, splits=64, years=None, since=None, table="base"):
+    """
+    Scan de sales_transactions como async generator:
+
+        async for page in scan_sales(session):
+            ...
+
+    Executa as tarefas (statement, parâmetros) com até `concurrency`
+    consultas ao mesmo tempo e gera as páginas na ordem em que chegam. Sem
+    `tasks`, elas são montadas por build_scan_tasks com mode/splits/years/
+    since/table (mode=None: o fan-out do layout). As páginas vêm colunares
+    (columnar_page_factory, na ordem de SALES_COLUMNS) salvo outro
+    `execution_profile`.
+
+    Backpressure: a fila entre as consultas e o consumidor guarda no máximo
+    2 * concurrency páginas, e cada consulta só pede a página seguinte
+    depois de entregar a anterior; um consumidor lento segura o scan em vez
+    de acumular memória. Vários scans (e cargas) podem rodar no mesmo event
+    loop, cada um com o próprio limite. fetch_size vale para a sessão
+    inteira (session.default_fetch_size), como no scan síncrono.
+    """
+    if tasks is None:
+        tasks = await asyncio.to_thread(
+            build_scan_tasks, session, mode or SALES_TABLES[table]["fanout"], splits, years,
+            since, table,
+        )
+    if execution_profile is None:
+        execution_profile = columnar_profile(session)
+    session.default_fetch_size = fetch_size
+
+    pages = asyncio.Queue(maxsize=concurrency * 2)
+    METRICS.gauge_fn("analytics_page_queue_length", pages.qsize)
+    pending = iter(tasks)
+
+    async def worker():
+        # cada worker pega a próxima tarefa livre até acabarem
+        try:
+            for statement, params in pending:
+                await _scan_task(session, statement, params, execution_profile, pages)
+        except Exception as exc:
+            METRICS.inc("analytics_scan_errors_total", error=type(exc).__name__)
+            await pages.put(exc)
+        await pages.put(_END)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(tasks)) or 1)]
+    try:
+        remaining = len(workers)
+        while remaining:
+            item = await pages.get()
+            if item is _END:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+class LoadUnit:
+    """Um bloco em carga: requisições ainda sem desfecho e linhas que falharam."""
+
+    __slots__ = ("key", "chunk", "outstanding", "sealed", "failed_ids")
+
+    def __init__(self, key, chunk):
+        self.key = key
+        self.chunk = chunk
+        self.outstanding = 0
+        self.sealed = False
+        self.failed_ids = []
+
+
+class AsyncWriter:
+    """
+    Envia statements com session.execute_async mantendo no máximo
+    `concurrency` requisições em voo (ou controller.limit, com um
+    AdaptiveConcurrency). submit() só espera quando todas as vagas estão
+    ocupadas. As respostas chegam das threads do driver e são tratadas no
+    event loop: falhas voltam depois do backoff de RetryBackoff.delay_for, até
+    max_attempts tentativas, e têm prioridade sobre os envios novos.
+
+    on_unit(unit) é chamado no loop quando todas as requisições de um bloco
+    terminam (com unit.failed_ids preenchido se alguma falhou de vez).
+    `labels` distingue os gauges de writers que rodam juntos no mesmo loop.
+    """
+
+    def __init__(self, session, concurrency=LOAD_CONCURRENCY, controller=None,
+                 max_attempts=MAX_ATTEMPTS, retry_base_delay=RETRY_BASE_DELAY, on_unit=None,
+                 labels=None):
+        self.session = session
+        self.concurrency = concurrency
+        self.controller = controller
+        self.max_attempts = max_attempts
+        self.backoff = RetryBackoff(base_delay=retry_base_delay)
+        self.on_unit = on_unit
+        self.rows_ok = 0
+        self.errors = []  # lista de (transaction_id, exceção)
+        self.retries = 0
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self._pending = 0
+        self._waiting = 0  # reenvios ainda no backoff
+        self._ready = []  # reenvios prontos para sair
+        self._burst = 0
+        labels = labels or {}
+        METRICS.gauge_fn("etl_requests_in_flight", lambda: self._pending, **labels)
+        METRICS.gauge_fn("etl_retry_queue_length", lambda: self._waiting + len(self._ready),
+                         **labels)
+
+    @property
+    def limit(self):
+        return self.controller.limit if self.controller is not None else self.concurrency
+
+    async def _slot(self):
+        self._burst += 1
+        if self._burst >= SEND_BURST:
+            self._burst = 0
+            await asyncio.sleep(0)
+        while True:
+            while self._ready and self._pending < self.limit:
+                self._send(*self._ready.pop())
+            if self._pending < self.limit:
+                return
+            self._burst = 0
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def submit(self, unit, statement, params, row_ids):
+        """Envia um INSERT (ou BATCH) do bloco `unit`; row_ids são os transaction_id cobertos."""
+        if METRICS.enabled:
+            t0 = time.perf_counter()
+            await self._slot()
+            METRICS.add_stage_time("await", time.perf_counter() - t0)
+        else:
+            await self._slot()
+        unit.outstanding += 1
+        self._send(unit, statement, params, row_ids, 1)
+
+    def seal(self, unit):
+        """Indica que todas as requisições do bloco já foram enviadas."""
+        unit.sealed = True
+        if unit.outstanding == 0 and self.on_unit is not None:
+            self.on_unit(unit)
+
+    def _send(self, unit, statement, params, row_ids, attempt):
+        self._pending += 1
+        started = time.perf_counter()
+        request = (unit, statement, params, row_ids, attempt)
+        try:
+            future = self.session.execute_async(statement, params)
+        except Exception as exc:
+            future, error = None, exc
+        if METRICS.enabled:
+            METRICS.add_stage_time("send", time.perf_counter() - started)
+        if future is None:
+            self._complete(request, started, error)
+            return
+        future.add_callbacks(
+            lambda _rows: _post(self._loop, self._complete, request, started, None),
+            lambda exc: _post(self._loop, self._complete, request, started, exc),
+        )
+
+    def _complete(self, request, started, exc):
+        unit, statement, params, row_ids, attempt = request
+        if METRICS.enabled or self.controller is not None:
+            latency = time.perf_counter() - started
+            METRICS.observe("etl_request_latency_seconds", latency,
+                            outcome="ok" if exc is None else "error")
+            if self.controller is not None:
+                self.controller.on_complete(started, latency, exc, self._pending)
+        self._pending -= 1
+        self._changed.set()
+        if exc is None:
+            self.rows_ok += len(row_ids)
+        else:
+            METRICS.inc("etl_request_errors_total", error=type(exc).__name__)
+            if attempt < self.max_attempts:
+                METRICS.inc("etl_retries_total")
+                self.retries += 1
+                self._waiting += 1
+                self._loop.call_later(self.backoff.delay_for(attempt), self._due,
+                                      (unit, statement, params, row_ids, attempt + 1))
+                return
+            METRICS.inc("etl_failed_rows_total", len(row_ids))
+            self.errors.extend((row_id, exc) for row_id in row_ids)
+            unit.failed_ids.extend(row_ids)
+        unit.outstanding -= 1
+        if unit.sealed and unit.outstanding == 0 and self.on_unit is not None:
+            self.on_unit(unit)
+
+    def _due(self, request):
+        self._waiting -= 1
+        self._ready.append(request)
+        self._changed.set()
+
+    async def drain(self):
+        """Espera as requisições em voo e esgota os reenvios."""
+        while True:
+            # limpa antes de enviar: um envio que falha na hora já se completa
+            self._changed.clear()
+            while self._ready and self._pending < self.limit:
+                self._send(*self._ready.pop())
+            if not (self._pending or self._waiting or self._ready):
+                return
+            await self._changed.wait()
+
+
+async def load_sales(session, batches, targets=None, table="base", lookups=False,
+                     concurrency=LOAD_CONCURRENCY, batch_rows=None, batch_bytes=BATCH_MAX_BYTES,
+                     controller=None, max_attempts=MAX_ATTEMPTS,
+                     retry_base_delay=RETRY_BASE_DELAY, on_chunk=None, report=None):
+    """
+    Carga a partir de um async iterable de blocos:
+
+        stats = await load_sales(session, blocos)
+
+    Cada bloco é um par (chave, lista de tuplas do INSERT), como os de
+    stream_encoded_chunks, ou só a lista (a chave vira o número do bloco).
+    Sem `targets`, os INSERTs vêm de prepare_targets(session, table,
+    lookups); com mais de um destino cada linha é gravada em todos.
+
+    Mantém até `concurrency` requisições em voo (AsyncWriter) enquanto o
+    próximo bloco é lido: o iterable só é consumido quando há vaga, então
+    a memória fica limitada pelo bloco atual e pelas requisições em voo.
+    batch_rows agrupa as linhas por partição em BATCH UNLOGGED, como no
+    modo partition-batch.
+
+    on_chunk(chave, linhas, ids_com_falha) é chamado, no event loop, quando
+    todas as escritas de um bloco terminam (é onde o loader atualiza
+    checkpoint e rollups); report(progresso), depois do envio de cada bloco.
+    Retorna o mesmo dicionário de load_pipelined.
+    """
+    start = time.perf_counter()
+    if targets is None:
+        targets = await asyncio.to_thread(prepare_targets, session, table, lookups)
+    elif not isinstance(targets, (list, tuple)):
+        targets = [WriteTarget(targets, None, itemgetter(0))]
+
+    failed_units = 0
+
+    def on_unit(unit):
+        nonlocal failed_units
+        if unit.failed_ids:
+            failed_units += 1
+        if on_chunk is not None:
+            on_chunk(unit.key, unit.chunk, unit.failed_ids)
+        unit.chunk = None
+
+    writer = AsyncWriter(session, concurrency, controller, max_attempts, retry_base_delay,
+                         on_unit=on_unit)
+    enviados = 0
+    chunk_num = 0
+    async for item in batches:
+        if isinstance(item, tuple) and len(item) == 2 and isinstance(item[1], list):
+            key, chunk = item
+        else:
+            key, chunk = chunk_num, item
+        chunk_num += 1
+        unit = LoadUnit(key, chunk)
+        for statement, num_params, partition_key in targets:
+            if batch_rows:
+                for rows in group_partition_batches(chunk, batch_rows, batch_bytes,
+                                                    partition_key):
+                    batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+                    for params in rows:
+                        batch.add(statement, params[:num_params])
+                    await writer.submit(unit, batch, None,
+                                        [params[TRANSACTION_ID_POS] for params in rows])
+            elif num_params is None:
+                for params in chunk:
+                    await writer.submit(unit, statement, params, (params[TRANSACTION_ID_POS],))
+            else:
+                for params in chunk:
+                    await writer.submit(unit, statement, params[:num_params],
+                                        (params[TRANSACTION_ID_POS],))
+        writer.seal(unit)
+        enviados += len(chunk) * len(targets)
+        if report is not None:
+            report({"key": key, "chunks": chunk_num, "rows": enviados, "rows_ok": writer.rows_ok,
+                    "retries": writer.retries, "errors": len(writer.errors),
+                    "concurrency": writer.limit})
+
+    await writer.drain()
+    return {
+        "rows": enviados,
+        "rows_ok": writer.rows_ok,
+        "errors": writer.errors,
+        "retries": writer.retries,
+        "failed_units": failed_units,
+        "concurrency": controller.summary() if controller is not None else None,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+async def from_blocking(iterable, maxsize=4, gauge=None):
+    """
+    Iterador síncrono e bloqueante (ex.: stream_encoded_chunks, que lê e
+    codifica o Parquet) como async iterator: uma thread produtora o percorre
+    com no máximo `maxsize` itens prontos à frente do consumidor, sem travar
+    o event loop. Erros do iterador são relançados no consumidor. Com
+    `gauge`, o número de itens prontos é exportado com esse nome.
+    """
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    if gauge is not None:
+        METRICS.gauge_fn(gauge, items.qsize)
+    slots = threading.Semaphore(maxsize)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                _post(loop, items.put_nowait, item)
+        except Exception as exc:
+            _post(loop, items.put_nowait, exc)
+        _post(loop, items.put_nowait, _END)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = await items.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            slots.release()
+            yield item
+    finally:
+        stop.set()
+
+
+def to_blocking(async_iterable, maxsize=32):
+    """
+    O inverso de from_blocking: consome um async iterable num event loop
+    em thread própria e entrega os itens num iterador síncrono comum, com no
+    máximo `maxsize` itens na fila. Se o consumidor parar antes do fim, o
+    async iterable é fechado (aclose) e a thread encerra.
+    """
+    out = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def pump():
+        try:
+            async for item in async_iterable:
+                if not await asyncio.to_thread(put, item):
+                    break
+        except Exception as exc:
+            put(exc)
+        finally:
+            if hasattr(async_iterable, "aclose"):
+                await async_iterable.aclose()
+        put(_END)
+
+    thread = threading.Thread(target=asyncio.run, args=(pump(),), daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = out.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,1146 @@
+import argparse
+import asyncio
+import http.client
+import json
+import multiprocessing as mp
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+from itertools import islice
+from pathlib import Path
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from cassandra.cluster import Cluster
+
+from async_sales import from_blocking, load_sales, scan_sales
+from cassandra_session import add_connection_args, connect_cluster, load_connection_config
+from etl_cassandra import (
+    BATCH_MAX_BYTES,
+    BATCH_MAX_ROWS,
+    INSERT_CQL,
+    READ_BATCH_ROWS,
+    estimate_batch_bytes,
+    iter_encoded_rows,
+    iter_parquet_batches,
+    load_batch_and_wait,
+    load_pipelined,
+    load_sharded,
+    needs_year_month,
+    prepare_targets,
+    row_generator_itertuples,
+    stream_encoded_chunks,
+    stream_encoded_rows,
+    year_month_values,
+)
+from etl_analysis import (
+    SALES_TABLES,
+    SCAN_MODES,
+    aggregate_from_rollups,
+    aggregate_sales_stream,
+    build_scan_tasks,
+    fetch_all_sales,
+    fetch_all_sales_records,
+    parse_years,
+    scan_sales_pages,
+)
+from fake_cassandra import add_backend_args, fake_options, preload_parquet
+from lookup_api import SalesLookup
+from metrics import fmt_mb, peak_rss_mb
+from plots_marketplace import DENSITY_THRESHOLD, render_plots
+from query_service import ROUTES, SalesQueryService, make_server
+from sales_aggregates import (
+    TICKET_QUANTILES,
+    SalesAggregator,
+    aggregate_dataframe,
+    customers_tickets_dataframe,
+    factorize_into,
+    to_datetime64,
+)
+from sketches import KeyedHyperLogLog, KeyedKLL
+from snapshot_cache import SalesSnapshot
+
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_INPUT = BASE_DIR / "data" / "raw" / "marketplace_bigdata_1M.parquet"
+
+
+def fmt(n):
+    """Formata inteiros com separador de milhar no padrão brasileiro."""
+    return f"{n:,}".replace(",", ".")
+
+
+def consume(iterable):
+    """Esgota um iterador sem guardar os itens e devolve o tempo gasto."""
+    start = time.perf_counter()
+    deque(iterable, maxlen=0)
+    return time.perf_counter() - start
+
+
+def bench_encode(args):
+    """
+    Compara o gerador original (itertuples) com o encoder colunar
+    sobre o mesmo DataFrame.
+    """
+    print(f"[BENCH] Lendo {args.input} ...")
+    df = pd.read_parquet(args.input)
+    if args.rows:
+        df = df.head(args.rows)
+    n = len(df)
+    print(f"[BENCH] Linhas: {fmt(n)}")
+
+    # Os dois caminhos precisam produzir exatamente as mesmas tuplas
+    amostra = min(n, 1_000)
+    if list(islice(row_generator_itertuples(df), amostra)) != list(islice(iter_encoded_rows(df), amostra)):
+        print("[ERRO] O encoder colunar gerou tuplas diferentes do gerador original.")
+        sys.exit(1)
+
+    t_old = consume(row_generator_itertuples(df))
+    print(f"[BENCH] itertuples : {t_old:8.2f}s  ({fmt(int(n / t_old))} linhas/s)")
+
+    t_new = consume(iter_encoded_rows(df))
+    print(f"[BENCH] colunar    : {t_new:8.2f}s  ({fmt(int(n / t_new))} linhas/s)")
+
+    print(f"[BENCH] Speedup: {t_old / t_new:.1f}x")
+
+
+def _read_worker(mode, path, batch_size):
+    """Executado em processo separado para que o pico de RSS seja isolado."""
+    start = time.perf_counter()
+    if mode == "full":
+        df = pd.read_parquet(path)
+        n = len(df)
+        deque(iter_encoded_rows(df), maxlen=0)
+    else:
+        n = 0
+        for _ in stream_encoded_rows(path, batch_size):
+            n += 1
+    return n, time.perf_counter() - start, peak_rss_mb()
+
+
+def bench_read(args):
+    """
+    Compara pd.read_parquet (arquivo inteiro em memória) com a leitura em
+    streaming por RecordBatch, medindo tempo e pico de RSS de cada modo.
+    """
+    ctx = mp.get_context("spawn")
+    for mode in ("full", "stream"):
+        with ctx.Pool(1) as pool:
+            n, elapsed, peak = pool.apply(_read_worker, (mode, args.input, args.batch_size))
+        print(f"[BENCH] {mode:<7}: {fmt(n)} linhas em {elapsed:6.2f}s "
+              f"({fmt(int(n / elapsed))} linhas/s) | pico RSS: {fmt_mb(peak)}")
+
+
+def connect(args, role="default"):
+    """
+    Abre sessão no keyspace da configuração (--cassandra-config) do cluster
+    ou do fake (nos benchmarks com add_backend_args), com o perfil `role`
+    de cassandra_session.
+    """
+    connection = load_connection_config(args.cassandra_config)
+    backend = getattr(args, "backend", "cassandra")
+    cluster = connect_cluster(backend=backend,
+                              fake_options=fake_options(args) if backend == "fake" else None,
+                              config=connection, role=role)
+    return cluster, cluster.connect(connection["keyspace"])
+
+
+def bench_load(args):
+    """
+    Compara, num cluster real, o laço lote-e-espera original com a carga
+    em pipeline (INSERTs individuais ou BATCH UNLOGGED por partição), sobre
+    as mesmas args.rows linhas do arquivo.
+    """
+    cluster, session = connect(args, role="write")
+    prepared = session.prepare(INSERT_CQL)
+    resultados = {}
+    try:
+        for mode in args.modes.split(","):
+            print(f"[BENCH] Modo {mode} ...")
+            if mode == "batch":
+                stats = load_batch_and_wait(
+                    session, prepared,
+                    stream_encoded_rows(args.input, args.batch_size, args.rows),
+                    batch_size=args.batch_size, concurrency=args.concurrency,
+                )
+            else:
+                stats = load_pipelined(
+                    session, prepared,
+                    stream_encoded_chunks(args.input, args.batch_size, args.rows),
+                    concurrency=args.concurrency,
+                    batch_rows=args.batch_rows if mode == "partition-batch" else None,
+                    batch_bytes=int(args.batch_kb * 1024),
+                )
+            resultados[mode] = stats["rows_ok"] / stats["elapsed"]
+    finally:
+        cluster.shutdown()
+
+    print("-" * 80)
+    for mode, rate in resultados.items():
+        print(f"[BENCH] {mode:<16}: {fmt(int(rate))} linhas/s")
+    for base_mode in ("batch", "pipeline"):
+        if base_mode not in resultados:
+            continue
+        for mode, rate in resultados.items():
+            if mode not in ("batch", base_mode):
+                print(f"[BENCH] {mode} x {base_mode}: {rate / resultados[base_mode]:.2f}x")
+
+
+def bench_scale(args):
+    """
+    Curva de escalabilidade do loader multiprocesso: carrega as mesmas
+    args.rows linhas com 1, 2, 4... workers e mostra a vazão, o speedup
+    sobre 1 worker e a eficiência (speedup / workers). Quando a eficiência
+    despenca, o gargalo passou a ser o cluster e não o cliente.
+    """
+    config = {
+        "connection": load_connection_config(args.cassandra_config),
+        "input": args.input, "batch_size": args.batch_size, "max_rows": args.rows,
+        "skip": None, "concurrency": args.concurrency, "batch_rows": None,
+        "batch_bytes": BATCH_MAX_BYTES, "rollups": False, "rollup_flush_rows": 0,
+        "checkpoint": None, "source": None, "max_attempts": 1, "retry_delay": 0.0,
+        "table": "base", "backend": args.backend, "fake_options": fake_options(args),
+    }
+    resultados = {}
+    for workers in (int(w) for w in args.workers.split(",")):
+        print(f"[BENCH] {workers} worker(s) ...")
+        stats = load_sharded(config, workers)
+        resultados[workers] = stats["rows_ok"] / stats["elapsed"]
+        if stats["error_count"] or stats["worker_failures"]:
+            print(f"[ALERTA] erros: {stats['error_count']} | "
+                  f"workers com falha: {stats['worker_failures']}")
+
+    print("-" * 80)
+    # vazão por worker na menor configuração testada (normalmente 1 worker)
+    base = resultados[min(resultados)] / min(resultados)
+    for workers, rate in resultados.items():
+        speedup = rate / base
+        print(f"[BENCH] {workers:>3} worker(s): {fmt(int(rate)):>10} linhas/s | "
+              f"speedup {speedup:5.2f}x | eficiência {speedup / workers:6.1%}")
+
+
+def partition_sizes(path, batch_size=READ_BATCH_ROWS):
+    """
+    Estima, a partir do Parquet, o tamanho de cada partição nos dois
+    layouts: ((state)) em sales_transactions e ((state, year_month)) em
+    sales_transactions_by_month. Usa estimate_batch_bytes, a mesma
+    estimativa dos lotes por partição do loader.
+    """
+    totals = {"base": None, "bucketed": None}
+    for record_batch in iter_parquet_batches(path, batch_size):
+        frame = pd.DataFrame({
+            "state": record_batch.column("state").to_numpy(zero_copy_only=False),
+            "year_month": year_month_values(record_batch),
+        })
+        for layout, keys in (("base", ["state"]), ("bucketed", ["state", "year_month"])):
+            frame["bytes"] = estimate_batch_bytes(record_batch, year_month=layout == "bucketed")
+            sizes = frame.groupby(keys)["bytes"].sum()
+            totals[layout] = sizes if totals[layout] is None else totals[layout].add(sizes, fill_value=0)
+    return totals
+
+
+def bench_partitions(args):
+    """
+    Compara o tamanho das partições dos dois layouts sem precisar de
+    cluster: quantidade, maior, média, p99 e quantas passam de
+    args.limit_mb (o Cassandra recomenda ficar bem abaixo de 100 MB).
+    """
+    start = time.perf_counter()
+    totals = partition_sizes(args.input)
+    print(f"[BENCH] Estimativa calculada em {time.perf_counter() - start:.2f}s")
+    print("-" * 80)
+    limit = args.limit_mb * 1024 * 1024
+    for layout, sizes in totals.items():
+        sizes = sizes.sort_values(ascending=False)
+        print(f"[BENCH] {SALES_TABLES[layout]['name']} "
+              f"(PRIMARY KEY (({SALES_TABLES[layout]['partition_key']}), ...))")
+        print(f"[BENCH]   partições: {fmt(len(sizes))} | maior: {fmt_mb(sizes.iloc[0] / 1024 / 1024)} "
+              f"| média: {fmt_mb(sizes.mean() / 1024 / 1024)} "
+              f"| p99: {fmt_mb(sizes.quantile(0.99) / 1024 / 1024)} "
+              f"| acima de {args.limit_mb:g} MB: {int((sizes > limit).sum())}")
+        maiores = ", ".join(
+            f"{'/'.join(key) if isinstance(key, tuple) else key}={fmt_mb(size / 1024 / 1024)}"
+            for key, size in sizes.head(3).items()
+        )
+        print(f"[BENCH]   maiores: {maiores}")
+
+
+def bench_layout(args):
+    """
+    Vazão de escrita e de scan dos dois layouts num cluster real: carrega
+    as mesmas args.rows linhas em cada tabela e depois lê cada uma com o
+    fan-out do layout (por state no original, por bucket no mensal).
+    """
+    cluster, session = connect(args)
+    resultados = {}
+    try:
+        for table in args.tables.split(","):
+            layout = SALES_TABLES[table]
+            print(f"[BENCH] Layout {table} ({layout['name']}) ...")
+            stats = load_pipelined(
+                session, prepare_targets(session, table),
+                stream_encoded_chunks(args.input, args.batch_size, args.rows,
+                                      year_month=needs_year_month(table)),
+                concurrency=args.concurrency,
+            )
+            write_rate = stats["rows_ok"] / stats["elapsed"]
+
+            start = time.perf_counter()
+            tasks = build_scan_tasks(session, layout["fanout"], args.splits, table=table)
+            n = sum(len(page) for page in scan_sales_pages(session, tasks, args.workers))
+            elapsed = time.perf_counter() - start
+            resultados[table] = (write_rate, n / elapsed, len(tasks))
+    finally:
+        cluster.shutdown()
+
+    print("-" * 80)
+    for table, (write_rate, scan_rate, n_tasks) in resultados.items():
+        print(f"[BENCH] {table:<9}: escrita {fmt(int(write_rate)):>10} linhas/s | "
+              f"scan {fmt(int(scan_rate)):>10} linhas/s ({n_tasks} tarefas)")
+    if len(resultados) == 2:
+        (w0, s0, _), (w1, s1, _) = resultados.values()
+        print(f"[BENCH] bucketed x base: escrita {w1 / w0:.2f}x | scan {s1 / s0:.2f}x")
+
+
+def bench_offline(args):
+    """
+    Carga e scan contra o FakeCluster (fake_cassandra.py), sem cluster: cada
+    modo de carga grava as mesmas args.rows linhas num FakeCluster novo e o
+    último carregado é lido em cada modo de scan. Com latência simulada, a
+    vazão reflete o custo do cliente (encode, bind, callbacks) e a
+    capacidade de manter requisições em voo.
+    """
+    options = {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+               "error_rate": args.error_rate, "seed": 42}
+    keyspace = load_connection_config(args.cassandra_config)["keyspace"]
+    resultados = {}
+    for mode in args.modes.split(","):
+        cluster = connect_cluster(backend="fake", fake_options=options)
+        session = cluster.connect(keyspace)
+        print(f"[BENCH] Carga {mode} ...")
+        if mode == "batch":
+            stats = load_batch_and_wait(
+                session, session.prepare(INSERT_CQL),
+                stream_encoded_rows(args.input, args.batch_size, args.rows),
+                batch_size=args.batch_size, concurrency=args.concurrency,
+            )
+        else:
+            stats = load_pipelined(
+                session, session.prepare(INSERT_CQL),
+                stream_encoded_chunks(args.input, args.batch_size, args.rows),
+                concurrency=args.concurrency,
+                batch_rows=BATCH_MAX_ROWS if mode == "partition-batch" else None,
+                retry_base_delay=0.01, report=lambda progress: None,
+            )
+        resultados[f"carga {mode}"] = (stats["rows_ok"], stats["elapsed"])
+        if mode != args.modes.split(",")[-1]:
+            cluster.shutdown()
+
+    for mode in args.scans.split(","):
+        start = time.perf_counter()
+        tasks = build_scan_tasks(session, mode, args.splits)
+        n = sum(len(page) for page in scan_sales_pages(session, tasks, args.workers))
+        resultados[f"scan {mode}"] = (n, time.perf_counter() - start)
+    cluster.shutdown()
+
+    print("-" * 80)
+    for name, (n, elapsed) in resultados.items():
+        print(f"[BENCH] {name:<22}: {fmt(n)} linhas em {elapsed:6.2f}s "
+              f"({fmt(int(n / elapsed))} linhas/s)")
+    print(f"[BENCH] Pico de memória (RSS): {fmt_mb(peak_rss_mb())}")
+
+
+def bench_scan(args):
+    """
+    Mede o scan completo de sales_transactions em cada modo (serial, faixas
+    de token e por partição/clustering) e o speedup sobre o SELECT serial.
+    """
+    cluster, session = connect(args, role="scan")
+    resultados = {}
+    try:
+        for mode in args.modes.split(","):
+            start = time.perf_counter()
+            tasks = build_scan_tasks(session, mode, args.splits, args.split_years)
+            n = sum(len(page) for page in scan_sales_pages(session, tasks, args.workers))
+            elapsed = time.perf_counter() - start
+            resultados[mode] = elapsed
+            print(f"[BENCH] {mode:<10}: {fmt(n)} linhas em {elapsed:6.2f}s "
+                  f"({fmt(int(n / elapsed))} linhas/s, {len(tasks)} tarefas)")
+    finally:
+        cluster.shutdown()
+
+    if "serial" in resultados:
+        for mode, elapsed in resultados.items():
+            if mode != "serial":
+                print(f"[BENCH] Speedup {mode} x serial: {resultados['serial'] / elapsed:.2f}x")
+
+
+def _fetch_worker(path, connection, scan_mode, workers):
+    """Executado em processo separado para isolar o pico de RSS de cada caminho."""
+    cluster = connect_cluster(config=connection, role="scan")
+    session = cluster.connect(connection["keyspace"])
+    try:
+        start = time.perf_counter()
+        if path == "dicts":
+            df = fetch_all_sales_records(session, mode=scan_mode, workers=workers)
+        else:
+            df = fetch_all_sales(session, mode=scan_mode, workers=workers)
+        elapsed = time.perf_counter() - start
+        frame_mb = df.memory_usage(deep=True).sum() / (1024 * 1024)
+        return len(df), elapsed, peak_rss_mb(), frame_mb
+    finally:
+        cluster.shutdown()
+
+
+def bench_fetch(args):
+    """
+    Compara a montagem do DataFrame da análise: lista de dicionários
+    (caminho anterior) x buffers colunares tipados, em tempo e memória.
+    """
+    connection = load_connection_config(args.cassandra_config)
+    ctx = mp.get_context("spawn")
+    for path in ("dicts", "columnar"):
+        with ctx.Pool(1) as pool:
+            n, elapsed, peak, frame_mb = pool.apply(
+                _fetch_worker, (path, connection, args.scan, args.workers)
+            )
+        print(f"[BENCH] {path:<9}: {fmt(n)} linhas em {elapsed:6.2f}s | "
+              f"pico RSS: {fmt_mb(peak)} | DataFrame final: {fmt_mb(frame_mb)}")
+
+
+def _aggregate_worker(engine, path, batch_size):
+    """Executado em processo separado: agrega o Parquet por um dos motores."""
+    start = time.perf_counter()
+    if engine == "dataframe":
+        results = aggregate_dataframe(pd.read_parquet(path))
+    else:
+        aggregator = SalesAggregator()
+        for record_batch in iter_parquet_batches(path, batch_size):
+            aggregator.update({name: record_batch[name] for name in record_batch.schema.names})
+        results = aggregator.results()
+    elapsed = time.perf_counter() - start
+    return [df.to_csv(index=False) for df in results], elapsed, peak_rss_mb()
+
+
+def bench_aggregate(args):
+    """
+    Agregação completa em memória (groupby do pandas) x agregador em
+    streaming, lendo o Parquet local. Mostra tempo, pico de RSS e se os
+    três CSVs gerados são idênticos.
+    """
+    ctx = mp.get_context("spawn")
+    outputs = {}
+    for engine in ("dataframe", "stream"):
+        with ctx.Pool(1) as pool:
+            csvs, elapsed, peak = pool.apply(_aggregate_worker, (engine, args.input, args.batch_size))
+        outputs[engine] = csvs
+        print(f"[BENCH] {engine:<9}: {elapsed:6.2f}s | pico RSS: {fmt_mb(peak)}")
+
+    nomes = ("receita_estado_categoria", "preco_rating_por_produto", "vendas_por_mes")
+    for nome, a, b in zip(nomes, outputs["dataframe"], outputs["stream"]):
+        linhas_a, linhas_b = a.splitlines(), b.splitlines()
+        diferentes = sum(x != y for x, y in zip(linhas_a, linhas_b)) + abs(len(linhas_a) - len(linhas_b))
+        if not diferentes:
+            status = "idêntico"
+        else:
+            # O groupby do pandas depende da ordem das linhas no último dígito;
+            # o agregador soma em centavos, de forma exata
+            fa, fb = pd.read_csv(StringIO(a)), pd.read_csv(StringIO(b))
+            numeric = fa.select_dtypes("number").columns
+            same = fa.drop(columns=numeric).equals(fb.drop(columns=numeric)) and np.allclose(
+                fa[numeric], fb[numeric], rtol=1e-12, atol=0
+            )
+            status = f"{diferentes} linhas diferem" + (
+                " apenas no último dígito (rtol 1e-12)" if same else ""
+            )
+        print(f"[BENCH] {nome}.csv: {status}")
+
+
+def bench_rollup(args):
+    """
+    Latência da análise completa: scan + agregação de sales_transactions
+    x leitura das tabelas de rollup mantidas pelo loader.
+    """
+    cluster, session = connect(args, role="scan")
+    try:
+        start = time.perf_counter()
+        from_scan = aggregate_sales_stream(session, mode=args.scan, workers=args.workers)
+        t_scan = time.perf_counter() - start
+
+        start = time.perf_counter()
+        from_rollup = aggregate_from_rollups(session)
+        t_rollup = time.perf_counter() - start
+    finally:
+        cluster.shutdown()
+
+    print("-" * 80)
+    print(f"[BENCH] scan   : {t_scan:8.3f}s ({fmt(from_scan.rows)} linhas)")
+    print(f"[BENCH] rollup : {t_rollup:8.3f}s ({fmt(from_rollup.rows)} transações cobertas)")
+    print(f"[BENCH] Speedup: {t_scan / t_rollup:.0f}x")
+    iguais = [a.to_csv(index=False) == b.to_csv(index=False)
+              for a, b in zip(from_scan.results(), from_rollup.results())]
+    print(f"[BENCH] CSVs idênticos (receita, preço/rating, mês): {iguais}")
+
+
+def bench_cache(args):
+    """
+    Início da análise: scan completo do cluster x snapshot Parquet local
+    (snapshot_cache.py). Mede a primeira montagem do snapshot, a abertura
+    seguinte (sondagem das partições + leitura em memory map, sem mudanças
+    no cluster) e a leitura offline, e confere se os DataFrames batem.
+    """
+    cluster, session = connect(args, role="scan")
+    cache_dir = Path(tempfile.mkdtemp(prefix="snapshot_bench_"))
+    try:
+        if args.backend == "fake":
+            print(f"[BENCH] Carregando {args.input.name} no backend fake ...")
+            preload_parquet(session, args.input, args.rows, table=args.table)
+
+        start = time.perf_counter()
+        df_scan = fetch_all_sales(session, workers=args.workers, table=args.table)
+        t_scan = time.perf_counter() - start
+
+        snapshot = SalesSnapshot(cache_dir, args.table)
+        start = time.perf_counter()
+        snapshot.refresh(session, args.workers)
+        t_build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        snapshot = SalesSnapshot(cache_dir, args.table)
+        relidos = snapshot.refresh(session, args.workers)
+        df_cache = snapshot.read_dataframe()
+        t_open = time.perf_counter() - start
+
+        start = time.perf_counter()
+        df_offline = SalesSnapshot(cache_dir, args.table).read_dataframe()
+        t_offline = time.perf_counter() - start
+    finally:
+        cluster.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print("-" * 80)
+    print(f"[BENCH] scan do cluster          : {t_scan:6.2f}s ({fmt(len(df_scan))} linhas)")
+    print(f"[BENCH] montagem do snapshot     : {t_build:6.2f}s")
+    print(f"[BENCH] snapshot + sondagem      : {t_open:6.2f}s ({len(relidos)} estados relidos)")
+    print(f"[BENCH] snapshot offline         : {t_offline:6.2f}s ({fmt(len(df_offline))} linhas)")
+    print(f"[BENCH] Speedup (scan / snapshot + sondagem): {t_scan / t_open:.1f}x")
+    # a ordem das linhas muda a soma em ponto flutuante no último dígito
+    iguais = []
+    for a, b in zip(aggregate_dataframe(df_scan), aggregate_dataframe(df_cache)):
+        numeric = a.select_dtypes("number").columns
+        iguais.append(a.drop(columns=numeric).equals(b.drop(columns=numeric))
+                      and np.allclose(a[numeric], b[numeric], rtol=1e-12, atol=0))
+    print(f"[BENCH] Resultados iguais (receita, preço/rating, mês; rtol 1e-12): {iguais}")
+
+
+def _plots_worker(processed_dir, img_dir, workers, density_threshold, dpi):
+    """Executado em processo separado: pico de RSS isolado por configuração."""
+    start = time.perf_counter()
+    render_plots(processed_dir, img_dir, BASE_DIR / "assets" / "img" / "Infnet-Logo.png",
+                 workers, density_threshold, dpi)
+    return time.perf_counter() - start, peak_rss_mb(), peak_rss_mb(children=True)
+
+
+def bench_plots(args):
+    """
+    Renderização dos gráficos: o laço original (sequencial, um marcador por
+    produto) x pool de processos x pool + densidade pré-agregada, com
+    args.products produtos sintéticos (reamostrados do CSV atual) no
+    gráfico de dispersão.
+    """
+    processed = BASE_DIR / "data" / "processed"
+    work_dir = Path(tempfile.mkdtemp(prefix="plots_bench_"))
+    try:
+        (work_dir / "processed").mkdir()
+        for name in ("receita_estado_categoria.csv", "vendas_por_mes.csv"):
+            shutil.copy(processed / name, work_dir / "processed" / name)
+        base = pd.read_csv(processed / "preco_rating_por_produto.csv")
+        rng = np.random.default_rng(42)
+        sample = base.iloc[rng.integers(0, len(base), args.products)].reset_index(drop=True)
+        sample["product_id"] = [f"P{i:09d}" for i in range(args.products)]
+        sample["avg_price"] *= rng.normal(1.0, 0.02, args.products)
+        sample.to_csv(work_dir / "processed" / "preco_rating_por_produto.csv", index=False)
+        print(f"[BENCH] {fmt(args.products)} produtos no gráfico de dispersão, {args.dpi} dpi")
+
+        configs = [
+            ("original", 1, None),
+            ("pool", args.workers, None),
+            ("pool+densidade", args.workers, args.density_threshold),
+        ]
+        ctx = mp.get_context("spawn")
+        for label, workers, threshold in configs:
+            # ProcessPoolExecutor em vez de Pool: o processo não é daemon e
+            # pode abrir o pool de renderização
+            with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                elapsed, peak, peak_children = pool.submit(
+                    _plots_worker, work_dir / "processed", work_dir / f"img_{label}",
+                    workers, threshold, args.dpi,
+                ).result()
+            print(f"[BENCH] {label:<15}: {elapsed:6.2f}s | pico RSS: {fmt_mb(peak)}"
+                  + (f" | maior processo do pool: {fmt_mb(peak_children)}" if workers > 1 else ""))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _latency_line(label, latencies, elapsed):
+    p50, p99, worst = np.percentile(latencies * 1000, [50, 99, 100])
+    print(f"[BENCH] {label:<26}: p50 {p50:7.2f} ms | p99 {p99:7.2f} ms | máx {worst:7.2f} ms"
+          f" | {fmt(int(len(latencies) / elapsed))} consultas/s")
+
+
+def bench_lookup(args):
+    """
+    Consultas por chave nas tabelas sales_by_product / sales_by_customer:
+    args.lookups ids sorteados do Parquet, consultados em sequência
+    (session.execute, uma de cada vez) e em paralelo pelo SalesLookup.
+    """
+    cluster, session = connect(args, role="lookup")
+    try:
+        if args.backend == "fake":
+            print(f"[BENCH] Carregando {args.input.name} no backend fake (com --lookups) ...")
+            preload_parquet(session, args.input, args.rows, lookups=True)
+        keys = pd.read_parquet(args.input, columns=["product_id", "customer_id"])
+        if args.rows:
+            keys = keys.head(args.rows)
+        rng = np.random.default_rng(42)
+        lookup = SalesLookup(session, concurrency=args.concurrency)
+
+        for table, column in (("sales_by_product", "product_id"),
+                              ("sales_by_customer", "customer_id")):
+            ids = keys[column].to_numpy()[rng.integers(0, len(keys), args.lookups)].tolist()
+            print("-" * 80)
+            print(f"[BENCH] {table}: {fmt(len(ids))} consultas")
+
+            statement = lookup._statement(table, False, False, None)
+            sequential = ids[:args.sequential]
+            latencies = np.empty(len(sequential))
+            start = time.perf_counter()
+            for i, key in enumerate(sequential):
+                t0 = time.perf_counter()
+                list(session.execute(statement, (key,)))
+                latencies[i] = time.perf_counter() - t0
+            _latency_line(f"sequencial ({fmt(len(sequential))})", latencies,
+                          time.perf_counter() - start)
+
+            start = time.perf_counter()
+            df = lookup.lookup(table, ids)
+            elapsed = time.perf_counter() - start
+            _latency_line(f"paralelo ({args.concurrency} em voo)", lookup.latencies, elapsed)
+            print(f"[BENCH] {fmt(len(df))} linhas devolvidas | erros: {len(lookup.errors)}")
+    finally:
+        cluster.shutdown()
+
+
+def _rank_errors(values, keys, est_keys, estimates):
+    """
+    Erro de rank de cada quantil estimado: |fração dos valores do grupo <=
+    estimativa - q|, em pontos percentuais. Retorna (mediana, máximo).
+    """
+    errors = []
+    for q, column in zip(TICKET_QUANTILES, estimates.T):
+        estimate = pd.Series(column, index=est_keys).reindex(keys).to_numpy()
+        rank = pd.Series(values <= estimate).groupby(keys).mean()
+        errors.append(np.abs(rank.to_numpy() - q))
+    errors = np.concatenate(errors) * 100
+    return np.median(errors), errors.max()
+
+
+def bench_sketches(args):
+    """
+    Clientes distintos e p50/p95 do ticket por (state, mês) e por state:
+    pandas exato com o DataFrame inteiro x sketches HyperLogLog/KLL
+    alimentados em streaming pelo Parquet. Mede o erro contra o exato,
+    confere que sketches montados um por state (como um por partição do
+    scan) e depois unidos dão o mesmo resultado e mostra o tamanho do
+    estado persistido.
+    """
+    shift = SalesAggregator._PAIR_SHIFT
+    columns = ["state", "customer_id", "total_value", "purchase_date"]
+
+    df = pd.read_parquet(args.input, columns=columns)
+    start = time.perf_counter()
+    customers_tickets_dataframe(df)
+    t_exact = time.perf_counter() - start
+    mem_exact = df.memory_usage(deep=True).sum()
+
+    vocab = {}
+    customers, tickets = KeyedHyperLogLog(), KeyedKLL()
+    per_state = {}
+    t_sketch = 0.0
+    for batch in pq.ParquetFile(args.input).iter_batches(args.batch_size, columns=columns):
+        start = time.perf_counter()
+        state = factorize_into(vocab, batch.column("state"))
+        months = to_datetime64(batch.column("purchase_date")).astype("datetime64[M]").astype(np.int64)
+        keys = state * shift + months
+        customer_id = batch.column("customer_id").to_numpy(zero_copy_only=False)
+        total_value = batch.column("total_value").to_numpy()
+        customers.add(keys, customer_id)
+        tickets.add(keys, total_value)
+        t_sketch += time.perf_counter() - start
+        # mesma leitura, um par de sketches por state (fora do tempo medido)
+        for code in np.unique(state).tolist():
+            mask = state == code
+            hll, kll = per_state.setdefault(code, (KeyedHyperLogLog(), KeyedKLL()))
+            hll.add(keys[mask], customer_id[mask])
+            kll.add(keys[mask], total_value[mask])
+
+    start = time.perf_counter()
+    state_json = json.dumps({"customers": customers.to_dict(), "tickets": tickets.to_dict()})
+    t_save = time.perf_counter() - start
+
+    merged_hll, merged_kll = KeyedHyperLogLog(), KeyedKLL()
+    for hll, kll in per_state.values():
+        merged_hll.merge(hll)
+        merged_kll.merge(kll)
+
+    df_keys = (factorize_into(vocab, df["state"]) * shift
+               + df["purchase_date"].to_numpy().astype("datetime64[M]").astype(np.int64))
+    exact_distinct = pd.Series(df["customer_id"].to_numpy()).groupby(df_keys).nunique()
+
+    print("-" * 80)
+    print(f"[BENCH] {fmt(len(df))} linhas, {fmt(len(exact_distinct))} chaves (state, mês)")
+    # os dois tempos sem a leitura do Parquet
+    print(f"[BENCH] pandas exato   : {t_exact:6.2f}s (groupby, DataFrame inteiro) | "
+          f"colunas em memória: {fmt_mb(mem_exact / 2 ** 20)}")
+    print(f"[BENCH] sketches       : {t_sketch:6.2f}s (streaming, lotes de {fmt(args.batch_size)}) | "
+          f"estado persistido: {fmt_mb(len(state_json) / 2 ** 20)} (JSON, {t_save:.2f}s)")
+
+    for label, hll, kll, group in (
+        ("state e mês", customers, tickets, lambda keys: keys),
+        ("state", customers, tickets, lambda keys: keys // shift),
+    ):
+        keys, _ = hll.items()
+        hll_keys, distinct = hll.regroup(group(keys)).estimates()
+        keys, _ = kll.items()
+        kll_keys, _, quantiles = kll.regroup(group(keys)).quantiles(TICKET_QUANTILES)
+        exact = pd.Series(df["customer_id"].to_numpy()).groupby(group(df_keys)).nunique()
+        rel = np.abs(distinct / exact.reindex(hll_keys).to_numpy() - 1) * 100
+        rank_median, rank_max = _rank_errors(df["total_value"].to_numpy(), group(df_keys),
+                                             kll_keys, quantiles)
+        print(f"[BENCH] por {label:<12}: clientes distintos erro mediano {np.median(rel):.2f}% "
+              f"/ máx {rel.max():.2f}% | p50/p95 erro de rank mediano "
+              f"{rank_median:.2f} p.p. / máx {rank_max:.2f} p.p.")
+
+    keys, registers = customers.items()
+    merged_keys, merged_registers = merged_hll.items()
+    order = pd.Index(merged_keys).get_indexer(keys)
+    iguais = np.array_equal(registers, merged_registers[order])
+    kll_keys, _, quantiles = merged_kll.quantiles(TICKET_QUANTILES)
+    rank_median, rank_max = _rank_errors(df["total_value"].to_numpy(), df_keys, kll_keys, quantiles)
+    print(f"[BENCH] um sketch por state + merge: HyperLogLog idêntico ao de uma passada: {iguais} | "
+          f"KLL erro de rank máx {rank_max:.2f} p.p.")
+
+
+def _query_mix(service, count, seed=42):
+    """
+    Consultas sorteadas: 40% receita por state (às vezes de uma categoria),
+    30% top-N de produtos (n e mínimo de transações variados) e 30% receita
+    mensal num intervalo. Retorna [(método, kwargs)].
+    """
+    rng = np.random.default_rng(seed)
+    states = sorted(service.data.revenue)
+    categories = sorted({r["category"] for records in service.data.revenue.values() for r in records})
+    months = service.data.months.tolist()
+    queries = []
+    for kind in rng.choice(3, count, p=[0.4, 0.3, 0.3]).tolist():
+        if kind == 0:
+            kwargs = {"state": states[rng.integers(len(states))]}
+            if rng.random() < 0.25:
+                kwargs["category"] = categories[rng.integers(len(categories))]
+            queries.append(("revenue_by_category", kwargs))
+        elif kind == 1:
+            queries.append(("top_products", {
+                "n": int(rng.choice([5, 10, 20, 50])),
+                "min_transactions": int(rng.integers(1, 41)),
+                "by": str(rng.choice(["avg_rating", "avg_rating", "avg_price"])),
+            }))
+        else:
+            lo, hi = sorted(rng.integers(0, len(months), 2).tolist())
+            queries.append(("monthly_revenue", {"start": months[lo], "end": months[hi]}))
+    return queries
+
+
+def _serve_worker(processed_dir, port, cache_size):
+    """Servidor HTTP do serviço de consultas, em processo separado."""
+    make_server(SalesQueryService(processed_dir, cache_size), "127.0.0.1", port).serve_forever()
+
+
+def _http_client_run(port, queries):
+    paths = {method: path for path, (method, _) in ROUTES.items()}
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    latencies = np.empty(len(queries))
+    start = time.perf_counter()
+    for i, (method, kwargs) in enumerate(queries):
+        t0 = time.perf_counter()
+        conn.request("GET", f"{paths[method]}?{urlencode(kwargs)}")
+        response = conn.getresponse()
+        json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status} em {paths[method]}")
+        latencies[i] = time.perf_counter() - t0
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return latencies, elapsed
+
+
+def bench_queries(args):
+    """
+    Teste de carga do serviço de consultas (query_service.py) sobre uma
+    cópia de data/processed: args.queries consultas sorteadas, chamadas
+    direto no processo com e sem cache e pelo servidor HTTP (servidor em
+    outro processo, um cliente com keep-alive). No fim, reescreve um CSV e
+    confere se o serviço recarrega e devolve o valor novo.
+    """
+    work_dir = Path(tempfile.mkdtemp(prefix="query_bench_"))
+    try:
+        shutil.copytree(BASE_DIR / "data" / "processed", work_dir, dirs_exist_ok=True)
+        start = time.perf_counter()
+        service = SalesQueryService(work_dir, args.cache_size, check_interval=0.2)
+        print(f"[BENCH] Carga dos CSVs: {time.perf_counter() - start:.2f}s "
+              f"({fmt(service.data.rows)} linhas)")
+        queries = _query_mix(service, args.queries)
+        distintas = len({(m, tuple(sorted(k.items()))) for m, k in queries})
+        print(f"[BENCH] {fmt(len(queries))} consultas ({fmt(distintas)} distintas)")
+
+        for label, cache_size in (("sem cache", 0), ("com cache", args.cache_size)):
+            service = SalesQueryService(work_dir, cache_size, check_interval=0.2)
+            latencies = np.empty(len(queries))
+            start = time.perf_counter()
+            for i, (method, kwargs) in enumerate(queries):
+                t0 = time.perf_counter()
+                getattr(service, method)(**kwargs)
+                latencies[i] = time.perf_counter() - t0
+            _latency_line(f"processo, {label}", latencies, time.perf_counter() - start)
+        print(f"[BENCH] acertos do cache: {service.stats()['hit_rate']:.1%}")
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = mp.get_context("spawn").Process(
+            target=_serve_worker, args=(work_dir, port, args.cache_size), daemon=True,
+        )
+        server.start()
+        try:
+            for _ in range(100):
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            http_queries = queries[:args.http_queries]
+            latencies, elapsed = _http_client_run(port, http_queries)
+            _latency_line("HTTP, com cache", latencies, elapsed)
+        finally:
+            server.terminate()
+            server.join()
+
+        # invalidação: mesma consulta antes e depois de reescrever o CSV
+        before = service.monthly_revenue()["total_revenue"]
+        monthly = pd.read_csv(work_dir / "vendas_por_mes.csv")
+        monthly["total_revenue"] *= 2
+        monthly.to_csv(work_dir / "vendas_por_mes.csv", index=False)
+        time.sleep(0.3)
+        after = service.monthly_revenue()["total_revenue"]
+        print(f"[BENCH] CSV reescrito: recarregado={service.reloads == 1}, "
+              f"receita total dobrou={np.isclose(after, 2 * before)}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+async def _loop_lag(stop, interval=0.01):
+    """Maior atraso do event loop: quanto um sleep(interval) passou do previsto."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+def bench_async(args):
+    """
+    Uma carga e args.scans scans completos com async_sales: em sequência x
+    todos juntos no mesmo event loop (asyncio.gather). Mostra o tempo de
+    cada operação, o tempo total e o maior atraso do loop, que só fica
+    baixo se nada bloquear o event loop (leitura do Parquet e respostas do
+    driver chegam por threads).
+    """
+    cluster, session = connect(args)
+    try:
+        if args.backend == "fake":
+            print(f"[BENCH] Carregando {args.input.name} no backend fake ...")
+            preload_parquet(session, args.input, args.rows)
+
+        async def load():
+            stats = await load_sales(
+                session,
+                from_blocking(stream_encoded_chunks(args.input, args.batch_size, args.rows)),
+                concurrency=args.concurrency,
+            )
+            return "carga", stats["rows_ok"], stats["elapsed"]
+
+        async def scan(i):
+            start = time.perf_counter()
+            n = 0
+            async for page in scan_sales(session, concurrency=args.workers):
+                if page:
+                    n += len(page[0])
+            return f"scan {i + 1}", n, time.perf_counter() - start
+
+        async def run(together):
+            stop = asyncio.Event()
+            lag = asyncio.create_task(_loop_lag(stop))
+            start = time.perf_counter()
+            operations = [load()] + [scan(i) for i in range(args.scans)]
+            if together:
+                results = await asyncio.gather(*operations)
+            else:
+                results = [await operation for operation in operations]
+            elapsed = time.perf_counter() - start
+            stop.set()
+            return results, elapsed, await lag
+
+        resultados = {}
+        for label, together in (("sequencial", False), ("mesmo loop", True)):
+            results, elapsed, lag = asyncio.run(run(together))
+            resultados[label] = elapsed
+            print("-" * 80)
+            for name, n, op_elapsed in results:
+                print(f"[BENCH] {label:<10} | {name:<6}: {fmt(n)} linhas em {op_elapsed:6.2f}s "
+                      f"({fmt(int(n / op_elapsed))} linhas/s)")
+            print(f"[BENCH] {label:<10} | total : {elapsed:6.2f}s | "
+                  f"maior atraso do loop: {lag * 1000:.1f} ms")
+    finally:
+        cluster.shutdown()
+
+    print("-" * 80)
+    print(f"[BENCH] mesmo loop x sequencial: "
+          f"{resultados['sequencial'] / resultados['mesmo loop']:.2f}x")
+
+
+def _session_variant(variant, connection, role):
+    """Cluster com os padrões do driver ("padrão") ou o de cassandra_session ("ajustado")."""
+    if variant == "padrão":
+        return Cluster(connection["hosts"], port=connection["port"])
+    return connect_cluster(config=connection, role=role)
+
+
+def bench_session(args):
+    """
+    Carga em pipeline e scan completo com o Cluster nos padrões do driver
+    (como os scripts abriam antes) x o Cluster de cassandra_session, com os
+    perfis "write" e "scan" da configuração (--cassandra-config): balanceamento
+    token-aware, compressão, timeouts e statements preparados uma vez por
+    sessão. Mesmas args.rows linhas e mesmas tarefas de scan nos dois casos.
+    """
+    connection = load_connection_config(args.cassandra_config)
+    resultados = {}
+    for variant in ("padrão", "ajustado"):
+        cluster = _session_variant(variant, connection, "write")
+        try:
+            session = cluster.connect(connection["keyspace"])
+            stats = load_pipelined(
+                session, prepare_targets(session, "base"),
+                stream_encoded_chunks(args.input, args.batch_size, args.rows),
+                concurrency=args.concurrency,
+            )
+        finally:
+            cluster.shutdown()
+        load_rate = stats["rows_ok"] / stats["elapsed"]
+        print(f"[BENCH] {variant:<9} carga: {fmt(stats['rows_ok'])} linhas em "
+              f"{stats['elapsed']:6.2f}s ({fmt(int(load_rate))} linhas/s, "
+              f"erros: {stats['error_count']})")
+
+        cluster = _session_variant(variant, connection, "scan")
+        try:
+            session = cluster.connect(connection["keyspace"])
+            start = time.perf_counter()
+            tasks = build_scan_tasks(session, args.scan, args.splits)
+            n = sum(len(page) for page in scan_sales_pages(session, tasks, args.workers))
+            elapsed = time.perf_counter() - start
+        finally:
+            cluster.shutdown()
+        print(f"[BENCH] {variant:<9} scan : {fmt(n)} linhas em {elapsed:6.2f}s "
+              f"({fmt(int(n / elapsed))} linhas/s)")
+        resultados[variant] = (load_rate, n / elapsed)
+
+    print("-" * 80)
+    for stage, i in (("carga", 0), ("scan", 1)):
+        print(f"[BENCH] {stage}: ajustado x padrão = "
+              f"{resultados['ajustado'][i] / resultados['padrão'][i]:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline ETL do marketplace.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_encode = sub.add_parser("encode", help="itertuples x encoder colunar")
+    p_encode.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    p_encode.add_argument("--rows", type=int, default=None, help="limita o número de linhas")
+    p_encode.set_defaults(func=bench_encode)
+
+    p_read = sub.add_parser("read", help="pd.read_parquet x streaming por RecordBatch")
+    p_read.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    p_read.add_argument("--batch-size", type=int, default=READ_BATCH_ROWS)
+    p_read.set_defaults(func=bench_read)
+
+    p_agg = sub.add_parser("aggregate", help="groupby em memória x agregador em streaming")
+    p_agg.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    p_agg.add_argument("--batch-size", type=int, default=READ_BATCH_ROWS)
+    p_agg.set_defaults(func=bench_aggregate)
+
+    p_load = sub.add_parser("load", help="lote-e-espera x pipeline (requer cluster)")
+    p_load.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    p_load.add_argument("--rows", type=int, default=200_000)
+    p_load.add_argument("--modes", default="batch,pipeline,partition-batch")
+    p_load.add_argument("--batch-size", type=int, default=10_000)
+    p_load.add_argument("--concurrency", type=int, default=100)
+    p_load.add_argument("--batch-rows", type=int, default=BATCH_MAX_ROWS)
+    p_load.add_argument("--batch-kb", type=float, default=BATCH_MAX_BYTES / 1024)
+    add_connection_args(p_load)
+    add_backend_args(p_load)
+    p_load.set_defaults(func=bench_load)
+
+    p_scale = sub.add_parser("scale", help="vazão da carga por número de workers (requer cluster)")
+    p_scale.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    p_scale.add_argument("--rows", type=int, default=1_000_000)
+    p_scale.add_argument("--workers", default="1,2,4,8,16",
+                         help="números de workers a testar, separados por vírgula")
+    p_scale.add_argument("--batch-size", type=int, default=10_000)
+    p_scale.add_argument("--concurrency", type=int, default=100,
+                         help="requisições em voo por worker")
+    add_connection_args(p_scale)
+    add_backend_args(p_scale)
+    p_scale.set_defaults(func=bench_scale)
+
+    p_offline = sub.add_parser("offline", help="carga e scan no Cassandra em processo (sem cluster)")
+    p_offline.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    p_offline.add_argument("--rows", type=int, default=200_000)
+    p_offline.add_argument("--modes", default="pipeline,partition-batch",
+                           help="modos de carga medidos (pipeline, partition-batch, batch)")
+    p_offline.add_argument("--scans", default="serial,token,partition",
+                           help="modos de scan medidos depois da carga")
+    p_offline.add_argument("--batch-size", type=int, default=10_000)
+    p_offline.add_argument("--concurrency", type=int, default=100)
+    p_offline.add_argument("--splits", type=int, default=64)
+    p_offline.add_argument("--workers", type=int, default=16)
+    p_offline.add_argument("--latency-ms", type=float, default=1.0,
+                           help="latência simulada por requisição")
+    p_offline.add_argument("--jitter-ms", type=float, default=0.5)
+    p_offline.add_argument("--error-rate", type=float, default=0.0)
+    add_connection_args(p_offline)
+    p_offline.set_defaults(func=bench_offline)
+
+    p_scan = sub.add_parser("scan", help="scan serial x paralelo (requer cluster)")
+    p_scan.add_argument("--modes", default=",".join(m for m in SCAN_MODES if m != "bucket"))
+    p_scan.add_argument("--splits", type=int, default=64)
+    p_scan.add_argument("--workers", type=int, default=16)
+    p_scan.add_argument("--split-years", type=parse_years, default=None)
+    add_connection_args(p_scan)
+    p_scan.set_defaults(func=bench_scan)
+
+    p_parts = sub.add_parser("partitions", help="tamanho das partições: state x (state, mês)")
+    p_parts.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    p_parts.add_argument("--limit-mb", type=float, default=100.0,
+                         help="tamanho a partir do qual a partição é contada como grande")
+    p_parts.set_defaults(func=bench_partitions)
+
+    p_layout = sub.add_parser("layout", help="escrita e scan por layout de tabela (requer cluster)")
+    p_layout.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    p_layout.add_argument("--rows", type=int, default=1_000_000)
+    p_layout.add_argument("--tables", default="base,bucketed")
+    p_layout.add_argument("--batch-size", type=int, default=10_000)
+    p_layout.add_argument("--concurrency", type=int, default=100)
+    p_layout.add_argument("--splits", type=int, default=64)
+    p_layout.add_argument("--workers", type=int, default=16)
+    add_connection_args(p_layout)
+    add_backend_args(p_layout)
+    p_layout.set_defaults(func=bench_layout)
+
+    p_fetch = sub.add_parser("fetch", help="lista de dicts x buffers colunares (requer cluster)")
+    p_fetch.add_argument("--scan", choices=SCAN_MODES, default="partition")
+    p_fetch.add_argument("--workers", type=int, default=16)
+    add_connection_args(p_fetch)
+    p_fetch.set_defaults(func=bench_fetch)
+
+    p_rollup = sub.add_parser("rollup", help="análise via scan x via rollups (requer cluster)")
+    p_rollup.add_argument("--scan", choices=SCAN_MODES, default="partition")
+    p_rollup.add_argument("--workers", type=int, default=16)
+    add_connection_args(p_rollup)
+    p_rollup.set_defaults(func=bench_rollup)
+
+    p_cache = sub.add_parser("cache", help="scan completo x snapshot Parquet local")
+    p_cache.add_argument("--input", type=Path, default=DEFAULT_INPUT,
+                         help="Parquet carregado no backend fake")
+    p_cache.add_argument("--rows", type=int, default=None)
+    p_cache.add_argument("--table", choices=sorted(SALES_TABLES), default="base")
+    p_cache.add_argument("--workers", type=int, default=16)
+    add_connection_args(p_cache)
+    add_backend_args(p_cache)
+    p_cache.set_defaults(func=bench_cache)
+
+    p_plots = sub.add_parser("plots", help="renderização sequencial x pool x densidade")
+    p_plots.add_argument("--products", type=int, default=1_000_000)
+    p_plots.add_argument("--workers", type=int, default=3)
+    p_plots.add_argument("--density-threshold", type=int, default=DENSITY_THRESHOLD)
+    p_plots.add_argument("--dpi", type=int, default=300)
+    p_plots.set_defaults(func=bench_plots)
+
+    p_lookup = sub.add_parser("lookup", help="consultas por produto/cliente: sequencial x paralelo")
+    p_lookup.add_argument("--input", type=Path, default=DEFAULT_INPUT,
+                          help="Parquet de onde saem as chaves (e carregado no backend fake)")
+    p_lookup.add_argument("--rows", type=int, default=None)
+    p_lookup.add_argument("--lookups", type=int, default=10_000)
+    p_lookup.add_argument("--sequential", type=int, default=1_000,
+                          help="consultas da linha de base sequencial")
+    p_lookup.add_argument("--concurrency", type=int, default=128)
+    add_connection_args(p_lookup)
+    add_backend_args(p_lookup)
+    p_lookup.set_defaults(func=bench_lookup)
+
+    p_sketch = sub.add_parser("sketches", help="clientes distintos e quantis: pandas exato x sketches")
+    p_sketch.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    p_sketch.add_argument("--batch-size", type=int, default=READ_BATCH_ROWS)
+    p_sketch.set_defaults(func=bench_sketches)
+
+    p_query = sub.add_parser("queries", help="teste de carga do serviço de consultas (query_service.py)")
+    p_query.add_argument("--queries", type=int, default=200_000)
+    p_query.add_argument("--http-queries", type=int, default=20_000)
+    p_query.add_argument("--cache-size", type=int, default=4096)
+    p_query.set_defaults(func=bench_queries)
+
+    p_session = sub.add_parser("session", help="Cluster padrão do driver x sessão ajustada (requer cluster)")
+    p_session.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    p_session.add_argument("--rows", type=int, default=200_000)
+    p_session.add_argument("--batch-size", type=int, default=10_000)
+    p_session.add_argument("--concurrency", type=int, default=100)
+    p_session.add_argument("--scan", choices=SCAN_MODES, default="partition")
+    p_session.add_argument("--splits", type=int, default=64)
+    p_session.add_argument("--workers", type=int, default=16)
+    add_connection_args(p_session)
+    p_session.set_defaults(func=bench_session)
+
+    p_async = sub.add_parser("async", help="carga + scans em sequência x no mesmo event loop")
+    p_async.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    p_async.add_argument("--rows", type=int, default=200_000)
+    p_async.add_argument("--batch-size", type=int, default=10_000)
+    p_async.add_argument("--concurrency", type=int, default=100)
+    p_async.add_argument("--scans", type=int, default=3)
+    p_async.add_argument("--workers", type=int, default=16)
+    add_connection_args(p_async)
+    add_backend_args(p_async)
+    p_async.set_defaults(func=bench_async)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
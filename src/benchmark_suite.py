@@ -0,0 +1,322 @@
+import argparse
+import io
+import json
+import multiprocessing as mp
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from cassandra_session import add_connection_args, connect_cluster, load_connection_config
+from dataset_sintetico import SEED, size_label, write_parquet
+from etl_analysis import build_scan_tasks, columnar_profile, scan_sales_pages
+from etl_cassandra import (
+    BATCH_MAX_ROWS,
+    iter_parquet_batches,
+    load_pipelined,
+    prepare_targets,
+    stream_encoded_chunks,
+)
+from fake_cassandra import add_backend_args, fake_options, preload_parquet
+from metrics import fmt_mb, peak_rss_mb
+from plots_marketplace import render_plots
+from sales_aggregates import SalesAggregator
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+BENCH_DIR = BASE_DIR / "data" / "benchmarks"
+
+STAGES = ("generate", "load", "scan", "aggregate", "plot")
+
+# Direção de cada métrica no gate de regressão: +1 = maior é melhor
+METRIC_DIRECTIONS = {
+    "rows_per_s": +1,
+    "latency_p50_ms": -1,
+    "latency_p99_ms": -1,
+    "peak_rss_mb": -1,
+}
+
+# Nomes dos CSVs gerados pela análise (os mesmos de data/processed)
+CSV_NAMES = ("receita_estado_categoria", "preco_rating_por_produto", "vendas_por_mes")
+
+
+def parse_size(value):
+    """Converte '10k', '1M' ou '250000' em número de linhas."""
+    value = value.strip()
+    factor = {"k": 1_000, "m": 1_000_000}.get(value[-1:].lower())
+    return int(float(value[:-1]) * factor) if factor else int(value)
+
+
+class TimedSession:
+    """
+    Envolve uma sessão do driver (ou do FakeCluster) e mede a latência de
+    cada requisição, do execute_async até o callback. Para as consultas
+    paginadas, vale a latência da primeira página.
+    """
+
+    def __init__(self, session):
+        object.__setattr__(self, "_session", session)
+        object.__setattr__(self, "latencies", [])
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._session, name, value)
+
+    def execute_async(self, *args, **kwargs):
+        start = time.perf_counter()
+        future = self._session.execute_async(*args, **kwargs)
+        future.add_callbacks(self._done, self._done,
+                             callback_args=(start,), errback_args=(start,))
+        return future
+
+    def execute(self, *args, **kwargs):
+        return self.execute_async(*args, **kwargs).result()
+
+    def _done(self, _result, start):
+        self.latencies.append(time.perf_counter() - start)
+
+
+def latency_stats(latencies):
+    if not latencies:
+        return {}
+    p50, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 99])
+    return {"requests": len(latencies), "latency_p50_ms": float(p50), "latency_p99_ms": float(p99)}
+
+
+def _connect(config, role):
+    connection = config["connection"]
+    cluster = connect_cluster(backend=config["backend"], fake_options=config["fake_options"],
+                              config=connection, role=role)
+    return cluster, cluster.connect(connection["keyspace"])
+
+
+def _stage_generate(config, n_rows, work_dir):
+    write_parquet(work_dir / "dataset.parquet", n_rows, seed=config["seed"])
+    return {}
+
+
+def _stage_load(config, n_rows, work_dir):
+    cluster, session = _connect(config, "write")
+    try:
+        timed = TimedSession(session)
+        stats = load_pipelined(
+            timed, prepare_targets(timed, "base"),
+            stream_encoded_chunks(work_dir / "dataset.parquet", config["batch_size"]),
+            concurrency=config["concurrency"],
+            batch_rows=BATCH_MAX_ROWS if config["mode"] == "partition-batch" else None,
+            report=lambda progress: None,
+        )
+    finally:
+        cluster.shutdown()
+    return {"errors": len(stats["errors"]), **latency_stats(timed.latencies)}
+
+
+def _stage_scan(config, n_rows, work_dir):
+    cluster, session = _connect(config, "scan")
+    try:
+        if config["backend"] == "fake":
+            # o FakeCluster começa vazio a cada processo: carrega antes de medir
+            preload_parquet(session, work_dir / "dataset.parquet")
+        start = time.perf_counter()
+        timed = TimedSession(session)
+        tasks = build_scan_tasks(timed, "partition")
+        rows = 0
+        for page in scan_sales_pages(timed, tasks, config["scan_workers"],
+                                     execution_profile=columnar_profile(timed)):
+            rows += len(page[0]) if page else 0
+    finally:
+        cluster.shutdown()
+    return {"rows": rows, "elapsed_s": time.perf_counter() - start,
+            **latency_stats(timed.latencies)}
+
+
+def _stage_aggregate(config, n_rows, work_dir):
+    aggregator = SalesAggregator()
+    for record_batch in iter_parquet_batches(work_dir / "dataset.parquet"):
+        aggregator.update({name: record_batch[name] for name in record_batch.schema.names})
+    processed_dir = work_dir / "processed"
+    processed_dir.mkdir(exist_ok=True)
+    for name, df in zip(CSV_NAMES, aggregator.results()):
+        df.to_csv(processed_dir / f"{name}.csv", index=False)
+    return {}
+
+
+def _stage_plot(config, n_rows, work_dir):
+    render_plots(work_dir / "processed", work_dir / "img",
+                 BASE_DIR / "assets" / "img" / "Infnet-Logo.png")
+    return {}
+
+
+def _run_stage(stage, config, n_rows, work_dir):
+    """
+    Executado em processo separado, para que o pico de RSS seja o da etapa.
+    A saída das funções do pipeline é descartada; só as métricas voltam.
+    """
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        result = globals()[f"_stage_{stage}"](config, n_rows, Path(work_dir))
+    result.setdefault("rows", n_rows)
+    result.setdefault("elapsed_s", time.perf_counter() - start)
+    result["rows_per_s"] = result["rows"] / result["elapsed_s"]
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def run_suite(sizes, stages, config, repeat=1):
+    """
+    Roda as etapas em cada tamanho de dataset (cada etapa num processo novo)
+    e devolve {tamanho: {etapa: métricas}}. Com repeat > 1, fica a execução
+    de tempo mediano.
+    """
+    ctx = mp.get_context("spawn")
+    results = {}
+    for n_rows in sizes:
+        label = size_label(n_rows)
+        results[label] = {}
+        with tempfile.TemporaryDirectory(prefix=f"bench_{label}_") as work_dir:
+            for stage in ("generate",) + tuple(s for s in stages if s != "generate"):
+                if stage == "plot" and "aggregate" not in stages:
+                    continue  # os gráficos dependem dos CSVs da agregação
+                runs = []
+                for _ in range(repeat if stage in stages else 1):
+                    # ProcessPoolExecutor: o processo não é daemon, então a etapa
+                    # pode abrir os próprios processos (ex.: pool dos gráficos)
+                    with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                        runs.append(pool.submit(_run_stage, stage, config, n_rows, work_dir).result())
+                if stage not in stages:
+                    continue  # a geração roda sempre, mas só é medida se pedida
+                runs.sort(key=lambda r: r["elapsed_s"])
+                metrics = runs[len(runs) // 2]
+                results[label][stage] = metrics
+                print(f"[BENCH] {label:>5} {stage:<9}: {fmt_rate(metrics['rows_per_s'])} linhas/s "
+                      f"| {metrics['elapsed_s']:7.2f}s | pico RSS: {fmt_mb(metrics['peak_rss_mb'])}"
+                      + (f" | p50 {metrics['latency_p50_ms']:.2f} ms"
+                         f" | p99 {metrics['latency_p99_ms']:.2f} ms"
+                         if "latency_p50_ms" in metrics else ""))
+    return results
+
+
+def fmt_rate(value):
+    return f"{int(value):>10,}".replace(",", ".")
+
+
+def compare(results, baseline, threshold):
+    """
+    Compara cada métrica com a do baseline e devolve a lista de regressões
+    (métrica pior que o baseline por mais de `threshold`, em fração).
+    """
+    regressions = []
+    for label, stages in results.items():
+        for stage, metrics in stages.items():
+            base_metrics = baseline.get(label, {}).get(stage)
+            if not base_metrics:
+                continue
+            for name, direction in METRIC_DIRECTIONS.items():
+                current, base = metrics.get(name), base_metrics.get(name)
+                if current is None or not base:
+                    continue
+                change = (current - base) / base
+                if -direction * change > threshold:
+                    regressions.append((label, stage, name, base, current, change))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Suíte de benchmarks ponta a ponta (geração, carga, scan, agregação e "
+                    "gráficos) com baseline e gate de regressão."
+    )
+    parser.add_argument("--sizes", default="10k,100k,1M",
+                        help="tamanhos de dataset, separados por vírgula")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"etapas medidas (de {', '.join(STAGES)})")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="execuções por etapa; vale a de tempo mediano")
+    parser.add_argument("--output", type=Path, default=BENCH_DIR / "results.json",
+                        help="arquivo JSON com os resultados desta execução")
+    parser.add_argument("--baseline", type=Path, default=BENCH_DIR / "baseline.json",
+                        help="resultados de referência para o gate de regressão")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="piora máxima tolerada por métrica, em fração (0.15 = 15%%)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="grava os resultados desta execução como o novo baseline")
+    parser.add_argument("--mode", choices=["pipeline", "partition-batch"], default="pipeline",
+                        help="modo de carga medido")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--scan-workers", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=SEED)
+    add_connection_args(parser)
+    add_backend_args(parser)
+    # sem cluster por padrão: Cassandra em processo com 1 ms de latência
+    parser.set_defaults(backend="fake", fake_latency_ms=1.0, fake_jitter_ms=0.5)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    stages = tuple(s.strip() for s in args.stages.split(","))
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        print(f"[ERRO] Etapas desconhecidas: {', '.join(sorted(unknown))}")
+        sys.exit(2)
+
+    config = {
+        "backend": args.backend, "fake_options": fake_options(args),
+        "connection": load_connection_config(args.cassandra_config), "seed": args.seed,
+        "mode": args.mode, "batch_size": args.batch_size, "concurrency": args.concurrency,
+        "scan_workers": args.scan_workers,
+    }
+    print("=" * 80)
+    print(f"[BENCH] Tamanhos: {', '.join(size_label(n) for n in sizes)} | "
+          f"etapas: {', '.join(stages)} | backend: {args.backend}")
+    results = run_suite(sizes, stages, config, args.repeat)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {**config, "repeat": args.repeat},
+        "results": results,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"[BENCH] Resultados gravados em {args.output}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2, ensure_ascii=False),
+                                 encoding="utf-8")
+        print(f"[BENCH] Baseline atualizado: {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"[BENCH] Sem baseline em {args.baseline}; rode com --save-baseline para criar.")
+        return
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline.get("config") != report["config"]:
+        print("[ALERTA] O baseline foi gerado com outra configuração; "
+              "a comparação pode não ser válida.")
+    regressions = compare(results, baseline["results"], args.threshold)
+    print("-" * 80)
+    if not regressions:
+        print(f"[BENCH] Nenhuma métrica piorou mais de {args.threshold:.0%} "
+              f"em relação ao baseline ({baseline['created_at']}).")
+        return
+    for label, stage, name, base, current, change in regressions:
+        print(f"[REGRESSÃO] {label} {stage} {name}: {base:.2f} -> {current:.2f} "
+              f"({change:+.1%})")
+    print(f"[ERRO] {len(regressions)} métrica(s) pioraram mais de {args.threshold:.0%}.")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import json
+import os
+import weakref
+from pathlib import Path
+
+from cassandra import ConsistencyLevel
+from cassandra.cluster import EXEC_PROFILE_DEFAULT, Cluster, ExecutionProfile
+from cassandra.connection import locally_supported_compressions
+from cassandra.policies import (
+    ConstantSpeculativeExecutionPolicy,
+    DCAwareRoundRobinPolicy,
+    FallthroughRetryPolicy,
+    HostDistance,
+    RetryPolicy,
+    TokenAwarePolicy,
+)
+
+# Configuração da conexão. Um arquivo JSON (--cassandra-config ou a variável
+# CASSANDRA_CONFIG) sobrescreve estas chaves; as variáveis CASSANDRA_* de
+# ENV_OVERRIDES têm a palavra final.
+CONNECTION_DEFAULTS = {
+    "hosts": ["127.0.0.1"],
+    "port": 9042,
+    "keyspace": "marketplace_ks",
+    # DC local do DCAwareRoundRobinPolicy (None: o DC do primeiro contact point)
+    "local_dc": None,
+    # None: negociada com o cluster (a maior suportada pelos dois lados)
+    "protocol_version": None,
+    # "lz4" | "snappy" | true (a que houver) | false
+    "compression": "lz4",
+    # threads do driver que processam as respostas e os callbacks
+    "executor_threads": 2,
+    "connect_timeout": 5.0,
+    # Conexões por host: só valem com protocol_version 1 ou 2. Do protocolo 3
+    # em diante o driver usa uma conexão por host, com até 32k requisições
+    # simultâneas multiplexadas nela.
+    "core_connections_per_host": None,
+    "max_connections_per_host": None,
+    # Perfis de execução por papel (role em connect_cluster). Chaves de cada
+    # perfil: request_timeout (s), consistency (nome do ConsistencyLevel ou
+    # null para o padrão do driver), retry ("default" | "fallthrough") e
+    # speculative_delay_ms / speculative_attempts (null desliga). Execução
+    # especulativa só vale para statements idempotentes (prepare_cached marca
+    # SELECT e INSERT); na carga ela dobraria as escritas lentas, então fica
+    # desligada no perfil "write".
+    "profiles": {
+        "default": {"request_timeout": 10.0, "consistency": None, "retry": "default",
+                    "speculative_delay_ms": 50.0, "speculative_attempts": 2},
+        "write": {"request_timeout": 20.0, "speculative_delay_ms": None},
+        "scan": {"request_timeout": 60.0, "speculative_delay_ms": None},
+        "lookup": {"request_timeout": 2.0, "speculative_delay_ms": 20.0},
+    },
+}
+
+# Variáveis de ambiente -> (chave, conversão)
+ENV_OVERRIDES = {
+    "CASSANDRA_HOSTS": ("hosts", lambda v: [h.strip() for h in v.split(",") if h.strip()]),
+    "CASSANDRA_PORT": ("port", int),
+    "CASSANDRA_KEYSPACE": ("keyspace", str),
+    "CASSANDRA_LOCAL_DC": ("local_dc", str),
+    "CASSANDRA_PROTOCOL_VERSION": ("protocol_version", int),
+    "CASSANDRA_COMPRESSION": ("compression", lambda v: {"true": True, "false": False}.get(v.lower(), v)),
+}
+
+RETRY_POLICIES = {"default": RetryPolicy, "fallthrough": FallthroughRetryPolicy}
+
+
+def load_connection_config(path=None):
+    """
+    Configuração efetiva: CONNECTION_DEFAULTS, depois o JSON em `path` (ou
+    em $CASSANDRA_CONFIG), depois as variáveis de ENV_OVERRIDES. Os perfis
+    do arquivo são mesclados chave a chave com os padrões.
+    """
+    config = json.loads(json.dumps(CONNECTION_DEFAULTS))
+    path = path or os.environ.get("CASSANDRA_CONFIG")
+    if path:
+        with open(Path(path), encoding="utf-8") as f:
+            data = json.load(f)
+        unknown = set(data) - set(CONNECTION_DEFAULTS)
+        if unknown:
+            raise ValueError(f"chaves desconhecidas em {path}: {', '.join(sorted(unknown))}")
+        for role, profile in data.pop("profiles", {}).items():
+            config["profiles"].setdefault(role, {}).update(profile)
+        config.update(data)
+    for name, (key, convert) in ENV_OVERRIDES.items():
+        if os.environ.get(name):
+            config[key] = convert(os.environ[name])
+    return config
+
+
+def add_connection_args(parser):
+    """Opção --cassandra-config dos scripts (o padrão vem de $CASSANDRA_CONFIG)."""
+    parser.add_argument("--cassandra-config", type=Path, default=None,
+                        help="JSON com hosts, política de balanceamento, compressão, "
+                             "timeouts e execução especulativa (padrão: $CASSANDRA_CONFIG)")
+
+
+def profile_settings(config, role="default"):
+    """Perfil do papel `role`, completado pelo perfil "default"."""
+    settings = dict(config["profiles"]["default"])
+    settings.update(config["profiles"].get(role, {}))
+    return settings
+
+
+def execution_profile(config, role="default"):
+    """ExecutionProfile do papel: token-aware sobre DC-aware, timeout, retry e especulação."""
+    settings = profile_settings(config, role)
+    speculative = None
+    if settings.get("speculative_delay_ms"):
+        speculative = ConstantSpeculativeExecutionPolicy(
+            settings["speculative_delay_ms"] / 1000, settings.get("speculative_attempts") or 1
+        )
+    kwargs = {}
+    if settings.get("consistency"):
+        kwargs["consistency_level"] = ConsistencyLevel.name_to_value[settings["consistency"].upper()]
+    return ExecutionProfile(
+        load_balancing_policy=TokenAwarePolicy(DCAwareRoundRobinPolicy(local_dc=config["local_dc"])),
+        retry_policy=RETRY_POLICIES[settings.get("retry") or "default"](),
+        request_timeout=settings["request_timeout"],
+        speculative_execution_policy=speculative,
+        **kwargs,
+    )
+
+
+def _compression(config):
+    compression = config["compression"]
+    if isinstance(compression, str) and compression not in locally_supported_compressions:
+        print(f"[ALERTA] Compressão {compression} indisponível (pip install {compression}); "
+              "usando a padrão do driver.")
+        return True
+    return compression
+
+
+def connect_cluster(hosts=None, port=None, backend="cassandra", fake_options=None,
+                    config=None, role="default"):
+    """
+    Cria o Cluster a partir da configuração (load_connection_config quando
+    `config` é None), com o perfil de execução do papel `role` ("write" na
+    carga, "scan" na análise, "lookup" nas consultas por chave) como padrão
+    da sessão. O balanceamento token-aware manda cada requisição direto
+    para uma réplica da partição, sem salto extra pelo coordenador.
+    hosts/port, quando informados, têm precedência sobre a configuração.
+
+    Com backend="fake" devolve um FakeCluster em processo (fake_cassandra.py),
+    configurado por fake_options; as opções do driver não se aplicam a ele.
+    """
+    if backend == "fake":
+        # import local: o backend fake só é carregado quando pedido
+        from fake_cassandra import FakeCluster
+
+        return FakeCluster(**(fake_options or {}))
+    config = config or load_connection_config()
+    kwargs = {}
+    if config["protocol_version"]:
+        kwargs["protocol_version"] = config["protocol_version"]
+    cluster = Cluster(
+        hosts or config["hosts"],
+        port=port or config["port"],
+        compression=_compression(config),
+        executor_threads=config["executor_threads"],
+        connect_timeout=config["connect_timeout"],
+        execution_profiles={EXEC_PROFILE_DEFAULT: execution_profile(config, role)},
+        **kwargs,
+    )
+    if config["protocol_version"] and config["protocol_version"] < 3:
+        if config["core_connections_per_host"]:
+            cluster.set_core_connections_per_host(HostDistance.LOCAL, config["core_connections_per_host"])
+        if config["max_connections_per_host"]:
+            cluster.set_max_connections_per_host(HostDistance.LOCAL, config["max_connections_per_host"])
+    return cluster
+
+
+# statements preparados por sessão: session -> {cql: PreparedStatement}
+_PREPARED = weakref.WeakKeyDictionary()
+
+
+def prepare_cached(session, cql):
+    """
+    session.prepare com cache por sessão: o mesmo CQL só é preparado (uma
+    ida ao cluster) na primeira vez. SELECTs e INSERTs sem IF (LWT) saem
+    marcados como idempotentes, o que libera a execução especulativa e o
+    reenvio pelo driver; UPDATEs de counter nunca são idempotentes.
+    """
+    statements = _PREPARED.setdefault(session, {})
+    statement = statements.get(cql)
+    if statement is None:
+        statement = session.prepare(cql)
+        words = cql.split()
+        statement.is_idempotent = bool(words) and (
+            words[0].upper() == "SELECT"
+            or (words[0].upper() == "INSERT" and "IF" not in (w.upper() for w in words))
+        )
+        statements[cql] = statement
+    return statement
@@ -1,11 +1,35 @@
+import argparse
+import json
+import multiprocessing as mp
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
 import numpy as np
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
 # -----------------------------
 # Configurações
 # -----------------------------
-np.random.seed(42)
-N_ROWS = 1_000_000 
+SEED = 42
+N_ROWS = 1_000_000
+
+# Linhas geradas por vez; cada bloco vira um row group do Parquet, então a
+# memória usada não depende do total de linhas
+CHUNK_ROWS = 250_000
+
+SAMPLE_ROWS = 30
+
+# Particionamento opcional da saída: nome da pasta de cada partição
+PARTITION_COLUMNS = {"state": "state", "month": "year_month"}
+
+# IDs de cliente e produto sorteados em [1, N_CUSTOMERS) e [1, N_PRODUCTS)
+N_CUSTOMERS = 300_000
+N_PRODUCTS = 50_000
 
 # -----------------------------
 # Valores possíveis
@@ -15,6 +39,7 @@ categories = [
     "Beleza", "Brinquedos", "Pet Shop", "Mercado", "Informática",
     "Móveis", "Automotivo"
 ]
+category_p = [0.13, 0.08, 0.12, 0.07, 0.08, 0.07, 0.07, 0.06, 0.12, 0.08, 0.06, 0.06]
 
 states = [
     "SP", "RJ", "MG", "ES", "PR", "SC", "RS", "BA", "PE", "CE",
@@ -28,42 +53,10 @@ cities = [
 ]
 
 payment_methods = ["cartao_credito", "pix", "boleto", "carteira_digital"]
-device_types = ["desktop", "mobile", "tablet"]
-
-# Datas entre 2019-01-01 e 2024-12-31
-start_date = np.datetime64("2019-01-01")
-end_date = np.datetime64("2024-12-31")
-date_range_days = int((end_date - start_date).astype(int))
-
-# -----------------------------
-# Geração dos dados
-# -----------------------------
-print("Gerando dados sintéticos...")
-
-transaction_id = [f"T{i:09d}" for i in range(1, N_ROWS + 1)]
-customer_id = [f"C{np.random.randint(1, 300_000):06d}" for _ in range(N_ROWS)]
-product_id = [f"P{np.random.randint(1, 50_000):07d}" for _ in range(N_ROWS)]
-
-category = np.random.choice(
-    categories,
-    size=N_ROWS,
-    p=[0.13, 0.08, 0.12, 0.07, 0.08, 0.07, 0.07, 0.06, 0.12, 0.08, 0.06, 0.06]
-)
-
-state = np.random.choice(states, size=N_ROWS)
-city = np.random.choice(cities, size=N_ROWS)
+payment_p = [0.45, 0.30, 0.15, 0.10]
 
-payment_method = np.random.choice(
-    payment_methods,
-    size=N_ROWS,
-    p=[0.45, 0.30, 0.15, 0.10]
-)
-
-device_type = np.random.choice(
-    device_types,
-    size=N_ROWS,
-    p=[0.30, 0.60, 0.10]
-)
+device_types = ["desktop", "mobile", "tablet"]
+device_p = [0.30, 0.60, 0.10]
 
 # Regras de preço por categoria (mais realista)
 base_price = {
@@ -80,75 +73,482 @@ base_price = {
     "Móveis": (150, 5000),
     "Automotivo": (50, 2500),
 }
+price_low = np.array([base_price[cat][0] for cat in categories], dtype=np.float64)
+price_high = np.array([base_price[cat][1] for cat in categories], dtype=np.float64)
+
+# Datas entre 2019-01-01 e 2024-12-31
+start_date = np.datetime64("2019-01-01")
+end_date = np.datetime64("2024-12-31")
+date_range_days = int((end_date - start_date).astype(int))
+
+# -----------------------------
+# Perfis de distribuição
+# -----------------------------
+# "uniform" reproduz a geração original (tudo uniforme). "realistic" imita o
+# que se vê em produção: SP concentra a maior fatia das vendas (e, como
+# sales_transactions é particionada só por state, a maior partição), cauda
+# longa Zipf de produtos e clientes, sazonalidade com pico na Black Friday
+# e no fim de ano, crescimento ao longo dos anos e picos de horário.
+# Pesos ausentes (None) significam sorteio uniforme.
+PROFILES = {
+    "uniform": {
+        "state_weights": None,
+        "city_weights": None,
+        "product_zipf": None,
+        "customer_zipf": None,
+        "seasonality": None,
+    },
+    "realistic": {
+        "state_weights": {
+            "SP": 0.34, "RJ": 0.12, "MG": 0.10, "PR": 0.07, "RS": 0.07, "SC": 0.05,
+            "BA": 0.05, "DF": 0.03, "PE": 0.03, "CE": 0.03, "GO": 0.03, "ES": 0.02,
+            "MT": 0.02, "MS": 0.015, "AM": 0.01, "PA": 0.015,
+        },
+        "city_weights": {
+            "São Paulo": 0.30, "Rio de Janeiro": 0.14, "Belo Horizonte": 0.08,
+            "Curitiba": 0.07, "Porto Alegre": 0.07, "Salvador": 0.06, "Fortaleza": 0.05,
+            "Recife": 0.05, "Brasília": 0.05, "Campinas": 0.04, "Niterói": 0.02,
+            "Santos": 0.02, "Florianópolis": 0.02, "Vitória": 0.01, "Goiania": 0.01,
+            "Manaus": 0.01,
+        },
+        # expoente s da Zipf: a probabilidade do k-ésimo ID é proporcional a k**-s
+        "product_zipf": 0.8,
+        "customer_zipf": 0.6,
+        "seasonality": {
+            # intensidade relativa de jan a dez
+            "month": [0.85, 0.80, 0.90, 0.90, 1.00, 0.95, 1.00, 1.00, 0.95, 1.00, 1.30, 1.40],
+            # crescimento anual do volume de vendas
+            "yearly_growth": 0.20,
+            # multiplicador do dia da Black Friday; o fim de semana seguinte e a
+            # Cyber Monday recebem metade do pico
+            "black_friday": 8.0,
+            # intensidade relativa de cada hora do dia (0h a 23h)
+            "hour": [0.3, 0.2, 0.1, 0.1, 0.1, 0.2, 0.4, 0.6, 0.8, 1.0, 1.1, 1.2,
+                     1.3, 1.2, 1.1, 1.1, 1.1, 1.2, 1.3, 1.5, 1.7, 1.8, 1.5, 0.9],
+        },
+    },
+}
+
+# Esquema do arquivo (mesma ordem de colunas da versão original)
+SCHEMA = pa.schema([
+    ("transaction_id", pa.string()),
+    ("customer_id", pa.string()),
+    ("product_id", pa.string()),
+    ("category", pa.string()),
+    ("price", pa.float64()),
+    ("quantity", pa.int64()),
+    ("total_value", pa.float64()),
+    ("purchase_date", pa.timestamp("ns")),
+    ("city", pa.string()),
+    ("state", pa.string()),
+    ("payment_method", pa.string()),
+    ("device_type", pa.string()),
+    ("rating", pa.float64()),
+])
+
+
+# -----------------------------
+# Geração dos dados
+# -----------------------------
+def chunk_rng(seed, chunk_index):
+    """
+    Gerador aleatório do bloco chunk_index. Equivale ao filho chunk_index de
+    SeedSequence(seed).spawn(), sem precisar criar os anteriores: cada bloco
+    tem um fluxo independente e reproduzível, qualquer que seja a ordem em
+    que os blocos são gerados.
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index,)))
+
+
+def format_ids(prefix, values, width):
+    """IDs no formato prefixo + número com zeros à esquerda (ex.: T000000001), via pyarrow."""
+    digits = pc.utf8_lpad(pc.cast(pa.array(values), pa.string()), width=width, padding="0")
+    return pc.binary_join_element_wise(prefix, digits, "")
+
+
+def take_values(values, indices):
+    """Coluna de texto a partir dos índices sorteados (sem strings Python por linha)."""
+    return pc.take(pa.array(values), pa.array(indices))
+
+
+def load_profile(name="uniform", path=None):
+    """
+    Monta o perfil de distribuição: o perfil nomeado de PROFILES, com as
+    chaves do JSON em `path` (se houver) sobrepostas. Os pesos são
+    validados contra as listas de valores possíveis.
+    """
+    if name not in PROFILES:
+        raise ValueError(f"perfil desconhecido: {name} (opções: {', '.join(PROFILES)})")
+    profile = dict(PROFILES[name])
+    if path is not None:
+        with open(path, encoding="utf-8") as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(profile)
+        if unknown:
+            raise ValueError(f"chaves desconhecidas no perfil: {', '.join(sorted(unknown))}")
+        profile.update(overrides)
+    for key, values in (("state_weights", states), ("city_weights", cities)):
+        weights = profile[key]
+        if weights is not None and not set(weights) <= set(values):
+            raise ValueError(f"{key}: valores desconhecidos "
+                             f"{', '.join(sorted(set(weights) - set(values)))}")
+    return profile
+
+
+def weights_to_p(weights, values):
+    """Probabilidades na ordem de `values` (valores sem peso ficam com zero)."""
+    p = np.array([weights.get(value, 0.0) for value in values], dtype=np.float64)
+    return p / p.sum()
+
+
+@lru_cache(maxsize=None)
+def zipf_cdf(n_values, exponent):
+    """Distribuição acumulada de uma Zipf limitada a n_values posições."""
+    weights = np.arange(1, n_values + 1, dtype=np.float64) ** -exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def sample_ids(rng, n_ids, size, exponent=None):
+    """
+    Sorteia IDs em [1, n_ids]: uniforme, ou Zipf (ID 1 o mais frequente)
+    quando exponent é informado, por inversão da acumulada.
+    """
+    if exponent is None:
+        return rng.integers(1, n_ids + 1, size=size)
+    return np.searchsorted(zipf_cdf(n_ids, exponent), rng.random(size), side="right") + 1
+
 
-price = np.empty(N_ROWS)
+def black_friday_offsets():
+    """Dias (a partir de start_date) de cada Black Friday: a sexta após a 4ª quinta de novembro."""
+    offsets = []
+    for year in range(start_date.astype(object).year, end_date.astype(object).year + 1):
+        nov_1 = np.datetime64(f"{year}-11-01")
+        # 1970-01-01 foi quinta-feira: (dias + 3) % 7 dá 0 = segunda ... 3 = quinta
+        weekday = (int(nov_1.astype(int)) + 3) % 7
+        friday = nov_1 + np.timedelta64((3 - weekday) % 7 + 21 + 1, "D")
+        offsets.append(int((friday - start_date).astype(int)))
+    return offsets
 
-for cat, (low, high) in base_price.items():
-    mask = (category == cat)
-    price[mask] = np.round(
-        np.random.uniform(low, high, size=mask.sum()),
-        2
+
+def day_weights(seasonality):
+    """Intensidade relativa de cada dia do intervalo de datas."""
+    days = start_date + np.arange(date_range_days + 1).astype("timedelta64[D]")
+    months = days.astype("datetime64[M]").astype(int) % 12
+    weights = np.asarray(seasonality["month"], dtype=np.float64)[months]
+    weights *= (1 + seasonality["yearly_growth"]) ** (np.arange(len(days)) / 365.25)
+    peak = seasonality["black_friday"]
+    for offset in black_friday_offsets():
+        weights[offset] *= peak
+        # sábado, domingo e Cyber Monday
+        weights[offset + 1:offset + 4] *= max(peak / 2, 1.0)
+    return weights
+
+
+def sample_purchase_dates(rng, n_rows, seasonality=None):
+    """Datas de compra (com hora/segundo), uniformes ou com a sazonalidade do perfil."""
+    if seasonality is None:
+        random_days = rng.integers(0, date_range_days + 1, size=n_rows)
+        random_seconds = rng.integers(0, 24 * 60 * 60, size=n_rows)
+    else:
+        day_cdf = np.cumsum(day_weights(seasonality))
+        random_days = np.searchsorted(day_cdf / day_cdf[-1], rng.random(n_rows), side="right")
+        hour_p = np.asarray(seasonality["hour"], dtype=np.float64)
+        hours = rng.choice(24, size=n_rows, p=hour_p / hour_p.sum())
+        random_seconds = hours * 3600 + rng.integers(0, 3600, size=n_rows)
+    return (
+        start_date
+        + random_days.astype("timedelta64[D]")
+        + random_seconds.astype("timedelta64[s]")
+    ).astype("datetime64[ns]")
+
+
+def sample_index(rng, values, n_rows, weights=None):
+    """Índices em `values`, uniformes ou segundo os pesos do perfil."""
+    if weights is None:
+        return rng.integers(0, len(values), size=n_rows)
+    return rng.choice(len(values), size=n_rows, p=weights_to_p(weights, values))
+
+
+def generate_chunk(seed, chunk_index, start_row, n_rows, profile=None):
+    """
+    Gera as linhas [start_row, start_row + n_rows) como uma pa.Table.
+    Tudo é vetorizado: os sorteios saem do NumPy em arrays inteiros e os
+    textos são montados pelo pyarrow. profile=None equivale ao perfil
+    "uniform".
+    """
+    profile = profile or PROFILES["uniform"]
+    rng = chunk_rng(seed, chunk_index)
+
+    transaction_id = format_ids("T", np.arange(start_row + 1, start_row + n_rows + 1), 9)
+    customer_id = format_ids(
+        "C", sample_ids(rng, N_CUSTOMERS - 1, n_rows, profile["customer_zipf"]), 6
+    )
+    product_id = format_ids(
+        "P", sample_ids(rng, N_PRODUCTS - 1, n_rows, profile["product_zipf"]), 7
     )
 
-quantity = np.random.randint(1, 6, size=N_ROWS)
-total_value = np.round(price * quantity, 2)
+    category_idx = rng.choice(len(categories), size=n_rows, p=category_p)
+    state_idx = sample_index(rng, states, n_rows, profile["state_weights"])
+    city_idx = sample_index(rng, cities, n_rows, profile["city_weights"])
+    payment_idx = rng.choice(len(payment_methods), size=n_rows, p=payment_p)
+    device_idx = rng.choice(len(device_types), size=n_rows, p=device_p)
 
-# Datas aleatórias (com hora/segundo)
-random_days = np.random.randint(0, date_range_days + 1, size=N_ROWS)
-random_seconds = np.random.randint(0, 24 * 60 * 60, size=N_ROWS)
+    # Preço uniforme na faixa da categoria de cada linha
+    low = price_low[category_idx]
+    high = price_high[category_idx]
+    price = np.round(low + (high - low) * rng.random(n_rows), 2)
 
-purchase_date = (
-    start_date
-    + random_days.astype("timedelta64[D]")
-    + random_seconds.astype("timedelta64[s]")
-).astype("datetime64[ns]")
+    quantity = rng.integers(1, 6, size=n_rows)
+    total_value = np.round(price * quantity, 2)
 
-# Ratings (avaliação) com leve viés para cima
-rating = np.clip(
-    np.random.normal(loc=4.1, scale=0.6, size=N_ROWS),
-    1.0,
-    5.0
-)
-rating = np.round(rating, 1)
+    purchase_date = sample_purchase_dates(rng, n_rows, profile["seasonality"])
 
-# -----------------------------
-# Monta DataFrame
-# -----------------------------
-df = pd.DataFrame({
-    "transaction_id": transaction_id,
-    "customer_id": customer_id,
-    "product_id": product_id,
-    "category": category,
-    "price": price,
-    "quantity": quantity,
-    "total_value": total_value,
-    "purchase_date": purchase_date,
-    "city": city,
-    "state": state,
-    "payment_method": payment_method,
-    "device_type": device_type,
-    "rating": rating,
-})
-
-print("Exemplo de linhas geradas:")
-print(df.head())
+    # Ratings (avaliação) com leve viés para cima
+    rating = np.round(np.clip(rng.normal(loc=4.1, scale=0.6, size=n_rows), 1.0, 5.0), 1)
 
-# -----------------------------
-# Salvar arquivos
-# -----------------------------
-print("\nSalvando marketplace_bigdata_1M.parquet ...")
-try:
-    df.to_parquet("marketplace_bigdata_1M.parquet", index=False)
-except Exception as e:
-    print("Erro ao salvar Parquet. Verifique se o 'pyarrow' está instalado.")
-    print("Instale com: pip install pyarrow")
-    raise e
-
-print("Salvando marketplace_sample_30.csv ...")
-sample_df = df.sample(30, random_state=42)
-sample_df.to_csv("marketplace_sample_30.csv", index=False)
-
-print("\nConcluído!")
-print("Arquivos gerados:")
-print(" - marketplace_bigdata_1M.parquet")
-print(" - marketplace_sample_30.csv")
+    return pa.Table.from_arrays([
+        transaction_id,
+        customer_id,
+        product_id,
+        take_values(categories, category_idx),
+        pa.array(price),
+        pa.array(quantity),
+        pa.array(total_value),
+        pa.array(purchase_date),
+        take_values(cities, city_idx),
+        take_values(states, state_idx),
+        take_values(payment_methods, payment_idx),
+        take_values(device_types, device_idx),
+        pa.array(rating),
+    ], schema=SCHEMA)
+
+
+def iter_chunk_specs(n_rows, chunk_rows=CHUNK_ROWS):
+    """Gera (índice do bloco, primeira linha, quantidade de linhas) de cada bloco."""
+    for chunk_index, start_row in enumerate(range(0, n_rows, chunk_rows)):
+        yield chunk_index, start_row, min(chunk_rows, n_rows - start_row)
+
+
+def partition_values(table, partition_by):
+    """Valor da partição de cada linha: o state ou o mês (AAAA-MM) da compra."""
+    if partition_by == "state":
+        return table["state"]
+    return pc.strftime(table["purchase_date"], format="%Y-%m")
+
+
+def write_partitions(table, out_dir, partition_by, chunk_index):
+    """
+    Grava um bloco particionado: as linhas de cada partição vão para
+    <out_dir>/<coluna>=<valor>/part-<bloco>.parquet. O nome depende só do
+    bloco e da partição, então o resultado não muda com o número de workers.
+    Retorna {valor da partição: linhas gravadas}.
+    """
+    column = PARTITION_COLUMNS[partition_by]
+    encoded = pc.dictionary_encode(partition_values(table, partition_by)).combine_chunks()
+    codes = encoded.indices.to_numpy()
+    # ordem estável: dentro de cada partição as linhas mantêm a ordem do bloco
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=len(encoded.dictionary))
+
+    written = {}
+    offset = 0
+    for code, value in enumerate(encoded.dictionary.to_pylist()):
+        rows = order[offset:offset + counts[code]]
+        offset += counts[code]
+        part_dir = Path(out_dir) / f"{column}={value}"
+        part_dir.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table.take(rows), part_dir / f"part-{chunk_index:05d}.parquet")
+        written[value] = int(counts[code])
+    return written
+
+
+def _generate_task(seed, profile, chunk_index, start_row, size, out_dir=None,
+                   partition_by=None):
+    """
+    Tarefa de um worker: gera o bloco e devolve a tabela (saída em arquivo
+    único, gravada pelo processo pai) ou grava as partições do bloco e
+    devolve a contagem por partição.
+    """
+    table = generate_chunk(seed, chunk_index, start_row, size, profile)
+    if partition_by is None:
+        return table
+    return write_partitions(table, out_dir, partition_by, chunk_index)
+
+
+def iter_generated(specs, seed, profile=None, workers=1, out_dir=None, partition_by=None):
+    """
+    Executa _generate_task para cada bloco e entrega (spec, resultado) na
+    ordem dos blocos. Com workers > 1 usa um pool de processos, mantendo no
+    máximo 2 * workers blocos em andamento para limitar a memória.
+    """
+    if workers <= 1:
+        for spec in specs:
+            yield spec, _generate_task(seed, profile, *spec, out_dir, partition_by)
+        return
+
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        pending = deque()
+        for spec in specs:
+            future = pool.submit(_generate_task, seed, profile, *spec, out_dir, partition_by)
+            pending.append((spec, future))
+            if len(pending) >= 2 * workers:
+                spec_done, future = pending.popleft()
+                yield spec_done, future.result()
+        while pending:
+            spec_done, future = pending.popleft()
+            yield spec_done, future.result()
+
+
+def _print_progress(chunk_index, num_chunks, done, start):
+    rate = done / (time.perf_counter() - start)
+    print(f"Bloco {chunk_index + 1}/{num_chunks}: {done:,} linhas "
+          f"({rate:,.0f} linhas/s)".replace(",", "."))
+
+
+def write_parquet(path, n_rows, chunk_rows=CHUNK_ROWS, seed=SEED, workers=1, profile=None):
+    """
+    Gera o dataset bloco a bloco e grava cada bloco como um row group,
+    sem nunca manter o arquivo inteiro em memória. Com workers > 1 os
+    blocos são gerados em paralelo, mas gravados sempre na ordem: o arquivo
+    é idêntico byte a byte ao gerado com um único processo.
+    Retorna {state: linhas}, o tamanho de cada partição de sales_transactions.
+    """
+    num_chunks = -(-n_rows // chunk_rows)
+    totals = {}
+    start = time.perf_counter()
+    with pq.ParquetWriter(path, SCHEMA) as writer:
+        specs = iter_chunk_specs(n_rows, chunk_rows)
+        for (chunk_index, start_row, size), table in iter_generated(
+                specs, seed, profile, workers):
+            writer.write_table(table, row_group_size=size)
+            for item in pc.value_counts(table["state"]).to_pylist():
+                totals[item["values"]] = totals.get(item["values"], 0) + item["counts"]
+            _print_progress(chunk_index, num_chunks, start_row + size, start)
+    return dict(sorted(totals.items()))
+
+
+def write_partitioned(out_dir, n_rows, partition_by, chunk_rows=CHUNK_ROWS, seed=SEED,
+                      workers=1, profile=None):
+    """
+    Gera o dataset particionado por state ou por mês (um arquivo por bloco
+    em cada partição). Os workers gravam os próprios arquivos; o processo
+    pai só acompanha o progresso. Retorna {partição: linhas}.
+    """
+    out_dir = Path(out_dir)
+    # remove partes de uma geração anterior (ex.: com mais blocos)
+    for old_part in out_dir.glob(f"{PARTITION_COLUMNS[partition_by]}=*/part-*.parquet"):
+        old_part.unlink()
+
+    num_chunks = -(-n_rows // chunk_rows)
+    totals = {}
+    start = time.perf_counter()
+    specs = iter_chunk_specs(n_rows, chunk_rows)
+    for (chunk_index, start_row, size), written in iter_generated(
+            specs, seed, profile, workers, out_dir, partition_by):
+        for value, rows in written.items():
+            totals[value] = totals.get(value, 0) + rows
+        _print_progress(chunk_index, num_chunks, start_row + size, start)
+    return dict(sorted(totals.items()))
+
+
+def size_label(n_rows):
+    """Rótulo do tamanho usado no nome do arquivo (ex.: 1M, 100M, 250k)."""
+    for factor, suffix in ((1_000_000, "M"), (1_000, "k")):
+        if n_rows >= factor and n_rows % factor == 0:
+            return f"{n_rows // factor}{suffix}"
+    return str(n_rows)
+
+
+def parse_args():
+    base_dir = Path(__file__).resolve().parents[1]
+    parser = argparse.ArgumentParser(description="Gera o dataset sintético do marketplace.")
+    parser.add_argument("--rows", type=int, default=N_ROWS, help="total de linhas")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                        help="linhas por bloco (e por row group do Parquet)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processos de geração (o resultado não depende desse número)")
+    parser.add_argument("--partition-by", choices=sorted(PARTITION_COLUMNS), default=None,
+                        help="grava uma pasta com partições por state ou por mês "
+                             "em vez de um arquivo único")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="uniform",
+                        help="perfil de distribuição (realistic: SP concentrado, Zipf de "
+                             "produtos/clientes, sazonalidade e Black Friday)")
+    parser.add_argument("--profile-file", type=Path, default=None,
+                        help="JSON com chaves do perfil a sobrepor (ex.: product_zipf)")
+    parser.add_argument("--output-dir", type=Path, default=base_dir / "data" / "raw",
+                        help="pasta de saída dos arquivos")
+    return parser.parse_args()
+
+
+def print_partition_sizes(totals, column):
+    """Resumo do desbalanceamento entre partições (maior, menor e razão maior/média)."""
+    largest = max(totals, key=totals.get)
+    smallest = min(totals, key=totals.get)
+    total = sum(totals.values())
+    mean = total / len(totals)
+    print(f"Partições por {column}: {len(totals)} | maior: {largest} com "
+          f"{totals[largest]:,} linhas".replace(",", ".")
+          + f" ({totals[largest] / total:.1%})"
+          + " | " + f"menor: {smallest} com {totals[smallest]:,} linhas".replace(",", ".")
+          + f" | maior/média: {totals[largest] / mean:.2f}x")
+
+
+def main():
+    args = parse_args()
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        profile = load_profile(args.profile, args.profile_file)
+    except ValueError as e:
+        print(f"Perfil inválido: {e}")
+        raise SystemExit(1)
+    label = size_label(args.rows)
+    if args.profile != "uniform" or args.profile_file is not None:
+        label += f"_{args.profile_file.stem if args.profile_file else args.profile}"
+    sample_path = args.output_dir / f"marketplace_sample_{SAMPLE_ROWS}.csv"
+
+    # -----------------------------
+    # Geração + gravação em streaming
+    # -----------------------------
+    print(f"Gerando dados sintéticos: {args.rows:,} linhas em blocos de "
+          f"{args.chunk_rows:,}".replace(",", ".")
+          + f" ({args.workers} worker(s), perfil {args.profile})...")
+    if args.partition_by is None:
+        output_path = args.output_dir / f"marketplace_bigdata_{label}.parquet"
+        print(f"\nSalvando {output_path.name} ...")
+        totals = write_parquet(output_path, args.rows, args.chunk_rows, args.seed,
+                               args.workers, profile)
+        print_partition_sizes(totals, "state")
+    else:
+        output_path = args.output_dir / f"marketplace_bigdata_{label}_by_{args.partition_by}"
+        print(f"\nSalvando partições em {output_path.name}/ ...")
+        totals = write_partitioned(output_path, args.rows, args.partition_by,
+                                   args.chunk_rows, args.seed, args.workers, profile)
+        print_partition_sizes(totals, PARTITION_COLUMNS[args.partition_by])
+
+    # -----------------------------
+    # Amostra em CSV (sorteada do primeiro bloco)
+    # -----------------------------
+    first_chunk = generate_chunk(args.seed, 0, 0, min(args.chunk_rows, args.rows), profile)
+    rng = np.random.default_rng(args.seed)
+    sample_idx = np.sort(rng.choice(first_chunk.num_rows,
+                                    size=min(SAMPLE_ROWS, first_chunk.num_rows),
+                                    replace=False))
+    sample_df = first_chunk.take(sample_idx).to_pandas()
+
+    print("\nExemplo de linhas geradas:")
+    print(sample_df.head())
+
+    print(f"\nSalvando {sample_path.name} ...")
+    sample_df.to_csv(sample_path, index=False)
+
+    print("\nConcluído!")
+    print("Arquivos gerados:")
+    print(f" - {output_path}")
+    print(f" - {sample_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,120 +1,546 @@
+import argparse
 import sys
+import time
+from datetime import datetime
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-from cassandra.cluster import Cluster
+from cassandra.cluster import EXEC_PROFILE_DEFAULT
+
+from cassandra_session import (add_connection_args, connect_cluster, load_connection_config,
+                               prepare_cached)
+from fake_cassandra import add_backend_args, fake_options, preload_parquet
+from metrics import METRICS, add_metrics_args, configure_metrics, print_stage_summary
+from sales_aggregates import (
+    SalesAggregator,
+    aggregate_dataframe,
+    customers_tickets_dataframe,
+    factorize_into,
+    load_state,
+    save_state,
+)
+from snapshot_cache import DEFAULT_MAX_AGE, load_snapshot
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+
+# Colunas lidas de sales_transactions pela análise
+SALES_COLUMNS = [
+    "state",
+    "category",
+    "transaction_id",
+    "customer_id",
+    "product_id",
+    "price",
+    "quantity",
+    "total_value",
+    "purchase_date",
+    "rating",
+]
+
+# Layouts da tabela de transações: o original, particionado só por state, e o
+# com bucket mensal, particionado por (state, year_month). "fanout" é o modo
+# de scan que distribui a leitura entre as partições de cada layout.
+SALES_TABLES = {
+    "base": {
+        "name": "sales_transactions",
+        "partition_key": "state",
+        "fanout": "partition",
+    },
+    "bucketed": {
+        "name": "sales_transactions_by_month",
+        "partition_key": "state, year_month",
+        "fanout": "bucket",
+    },
+}
+
+# Limites do anel do Murmur3Partitioner. O Cassandra nunca atribui o
+# token mínimo a uma chave, então as faixas (início, fim] cobrem o anel todo.
+MIN_TOKEN = -(2 ** 63)
+MAX_TOKEN = 2 ** 63 - 1
+
+SCAN_MODES = ("serial", "token", "partition", "bucket")
+
+# Leitura das tabelas de rollup mantidas pelo loader (etl_cassandra.py --rollups)
+ROLLUP_QUERIES = {
+    "state_category": "SELECT state, category, revenue_cents, num_transactions "
+                      "FROM rollup_revenue_by_state_category",
+    "month": "SELECT year_month, revenue_cents, num_transactions FROM rollup_revenue_by_month",
+    "product": "SELECT product_id, price_cents, rating_cents, num_transactions "
+               "FROM rollup_product_stats",
+}
+
+# Tipo de cada coluna no buffer colunar: categóricas viram códigos inteiros
+CATEGORICAL_COLUMNS = ("state", "category", "product_id", "customer_id")
+FLOAT_COLUMNS = ("price", "quantity", "total_value", "rating")
+
+
+def token_ranges(n_splits):
+    """
+    Divide o anel de tokens em n_splits faixas contíguas (início, fim].
+    """
+    step = (MAX_TOKEN - MIN_TOKEN) // n_splits
+    bounds = [MIN_TOKEN + i * step for i in range(n_splits)] + [MAX_TOKEN]
+    return list(zip(bounds[:-1], bounds[1:]))
 
 
-def fetch_all_sales(session):
+def discover_partitions(session):
     """
-    Lê todos os registros da tabela sales_transactions do Cassandra
-    e retorna uma lista de dicionários, adequada para criar um DataFrame.
+    Lista as partições (state) existentes e, para cada uma, as categorias
+    presentes. As categorias são descobertas por "skip scan": cada consulta
+    pede a primeira categoria maior que a anterior (LIMIT 1), então o custo
+    é uma leitura por categoria, não por linha.
     """
-    query = """
-        SELECT
-            state,
-            category,
-            transaction_id,
-            product_id,
-            price,
-            quantity,
-            total_value,
-            purchase_date,
-            rating
-        FROM sales_transactions;
+    states = sorted(r.state for r in session.execute(
+        "SELECT DISTINCT state FROM sales_transactions"
+    ))
+    first = prepare_cached(
+        session,
+        "SELECT category FROM sales_transactions WHERE state = ? LIMIT 1"
+    )
+    after = prepare_cached(
+        session,
+        "SELECT category FROM sales_transactions WHERE state = ? AND category > ? LIMIT 1"
+    )
+
+    partitions = {}
+    for state in states:
+        categories = []
+        row = session.execute(first, (state,)).one()
+        while row is not None:
+            categories.append(row.category)
+            row = session.execute(after, (state, row.category)).one()
+        partitions[state] = categories
+    return partitions
+
+
+def discover_buckets(session, table="sales_transactions_by_month"):
     """
+    Lista as partições (state, year_month) da tabela com bucket mensal.
+    SELECT DISTINCT na chave de partição lê só os cabeçalhos das partições.
+    """
+    return sorted(
+        (r.state, r.year_month)
+        for r in session.execute(f"SELECT DISTINCT state, year_month FROM {table}")
+    )
 
-    # fetch_size controla quantas linhas vêm por página
-    session.default_fetch_size = 10_000
 
-    print("[ANALYTICS] Executando SELECT completo em sales_transactions ...")
-    rows = session.execute(query)
+def year_slices(years):
+    """
+    Fatias de purchase_date [início, fim) por ano, com faixas abertas nas
+    pontas para não perder registros fora do intervalo informado.
+    """
+    if not years:
+        return [(None, None)]
+    bounds = [datetime(y, 1, 1) for y in range(min(years), max(years) + 2)]
+    return [(None, bounds[0])] + list(zip(bounds[:-1], bounds[1:])) + [(bounds[-1], None)]
 
-    data = []
-    for i, r in enumerate(rows, start=1):
-        data.append(
-            {
-                "state": r.state,
-                "category": r.category,
-                "transaction_id": r.transaction_id,
-                "product_id": r.product_id,
-                "price": float(r.price) if r.price is not None else None,
-                "quantity": int(r.quantity) if r.quantity is not None else None,
-                "total_value": float(r.total_value) if r.total_value is not None else None,
-                "purchase_date": r.purchase_date,  # já vem como datetime
-                "rating": float(r.rating) if r.rating is not None else None,
-            }
-        )
-        if i % 100_000 == 0:
-            print(f"[ANALYTICS] Linhas lidas: {i:,}".replace(",", "."))
-
-    print(f"[ANALYTICS] Total de linhas lidas do Cassandra: {len(data):,}".replace(",", "."))
-    return data
 
+def build_scan_tasks(session, mode="partition", splits=64, years=None, since=None,
+                     table="base", states=None):
+    """
+    Monta a lista de tarefas (statement, parâmetros) que juntas cobrem a
+    tabela inteira, sem sobreposição:
+
+    - serial: um único SELECT completo (comportamento original);
+    - token: o anel dividido em `splits` faixas de token da chave de partição;
+    - partition (layout base): uma tarefa por (state, category),
+      opcionalmente fatiada por ano de purchase_date. Com apenas 16
+      partições, fatiar pelas colunas de clustering é o que de fato
+      distribui o trabalho;
+    - bucket (layout bucketed): uma tarefa por partição (state, year_month).
+      Os buckets já são pequenos e numerosos, então bastam para o paralelismo.
+
+    `since` (modos partition e bucket) mapeia state -> watermark: para esses
+    estados, só são lidas as linhas com purchase_date > watermark.
+    `states` (mesmos modos) restringe a leitura a esses estados.
+    """
+    layout = SALES_TABLES[table]
+    select_cql = f"SELECT {', '.join(SALES_COLUMNS)} FROM {layout['name']}"
+
+    if mode == "serial":
+        return [(select_cql, None)]
+
+    if mode == "token":
+        token = f"token({layout['partition_key']})"
+        stmt = prepare_cached(session, select_cql + f" WHERE {token} > ? AND {token} <= ?")
+        return [(stmt, (start, end)) for start, end in token_ranges(splits)]
+
+    if mode != layout["fanout"]:
+        raise ValueError(f"Modo de scan {mode!r} não se aplica à tabela {layout['name']} "
+                         f"(use serial, token ou {layout['fanout']})")
+
+    since = since or {}
+    if mode == "bucket":
+        return _bucket_scan_tasks(session, select_cql, layout["name"], since, states)
+
+    stmts = {}
+
+    def stmt_for(lower_op, has_upper):
+        # Prepara sob demanda cada combinação de limites de purchase_date
+        if (lower_op, has_upper) not in stmts:
+            cql = select_cql + " WHERE state = ? AND category = ?"
+            if lower_op:
+                cql += f" AND purchase_date {lower_op} ?"
+            if has_upper:
+                cql += " AND purchase_date < ?"
+            stmts[(lower_op, has_upper)] = prepare_cached(session, cql)
+        return stmts[(lower_op, has_upper)]
+
+    tasks = []
+    for state, categories in discover_partitions(session).items():
+        if states is not None and state not in states:
+            continue
+        watermark = since.get(state)
+        for category in categories:
+            for start, end in year_slices(years):
+                lower_op, lower = (">=", start) if start is not None else (None, None)
+                if watermark is not None:
+                    if end is not None and end <= watermark:
+                        continue  # fatia inteira já agregada
+                    if start is None or start <= watermark:
+                        lower_op, lower = ">", watermark
+                params = [state, category]
+                params += [d for d in (lower, end) if d is not None]
+                tasks.append((stmt_for(lower_op, end is not None), tuple(params)))
+    return tasks
+
+
+def _bucket_scan_tasks(session, select_cql, table_name, since, states=None):
+    """
+    Uma tarefa por bucket (state, year_month). Com watermark, os buckets de
+    meses anteriores ao dele são pulados e o do próprio mês é lido só a
+    partir do watermark: como category vem antes de purchase_date na chave
+    de clustering, o filtro usa ALLOW FILTERING, restrito a uma partição.
+    """
+    full = prepare_cached(session, select_cql + " WHERE state = ? AND year_month = ?")
+    partial = None
+    tasks = []
+    for state, year_month in discover_buckets(session, table_name):
+        if states is not None and state not in states:
+            continue
+        watermark = since.get(state)
+        if watermark is None or year_month > watermark.strftime("%Y-%m"):
+            tasks.append((full, (state, year_month)))
+        elif year_month == watermark.strftime("%Y-%m"):
+            if partial is None:
+                partial = prepare_cached(
+                    session,
+                    select_cql + " WHERE state = ? AND year_month = ? "
+                    "AND purchase_date > ? ALLOW FILTERING"
+                )
+            tasks.append((partial, (state, year_month, watermark)))
+    return tasks
+
+
+def scan_sales_pages(session, tasks, workers=16, fetch_size=10_000,
+                     execution_profile=EXEC_PROFILE_DEFAULT):
+    """
+    Executa as tarefas do scan em paralelo (até `workers` consultas ao mesmo
+    tempo) e gera as páginas de linhas na ordem em que chegam. É a versão
+    síncrona de async_sales.scan_sales, que roda num event loop em thread
+    própria; a fila até o consumidor é limitada, então a memória não cresce
+    se o consumidor for mais lento que o cluster.
+    O formato de cada página é o do row_factory do execution_profile.
+    """
+    # import local: async_sales importa este módulo
+    from async_sales import scan_sales, to_blocking
 
-def main():
-    # Descobre pasta raiz do projeto
-    base_dir = Path(__file__).resolve().parents[1]
+    return to_blocking(
+        scan_sales(session, tasks, workers, fetch_size, execution_profile), maxsize=workers * 2
+    )
 
-    processed_dir = base_dir / "data" / "processed"
-    processed_dir.mkdir(parents=True, exist_ok=True)
 
-    # -------------------------------------------------------------------------
-    # 1) Conectar ao Cassandra
-    # -------------------------------------------------------------------------
-    print("=" * 80)
-    print("[ANALYTICS] Conectando ao Cassandra (localhost:9042, keyspace marketplace_ks) ...")
+def columnar_page_factory(colnames, rows):
+    """
+    row_factory que devolve a página já transposta: uma tupla por coluna,
+    na ordem do SELECT. Evita criar um objeto (namedtuple/dict) por linha.
+    """
+    return list(zip(*rows))
 
-    cluster = Cluster(["127.0.0.1"], port=9042)
-    try:
-        session = cluster.connect("marketplace_ks")
-    except Exception as e:
-        print("[ERRO] Não foi possível conectar ao keyspace marketplace_ks:")
-        print(e)
-        cluster.shutdown()
-        sys.exit(1)
 
-    print("[ANALYTICS] Conexão estabelecida.")
+class _GrowableArray:
+    """Array NumPy pré-alocado que dobra de capacidade quando enche."""
 
-    # -------------------------------------------------------------------------
-    # 2) Ler todos os dados da tabela sales_transactions
-    # -------------------------------------------------------------------------
-    raw_data = fetch_all_sales(session)
+    def __init__(self, dtype, capacity):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
 
-    if not raw_data:
-        print("[ERRO] Nenhum dado foi retornado da tabela sales_transactions.")
-        cluster.shutdown()
-        sys.exit(1)
+    def extend(self, values):
+        end = self.size + len(values)
+        if end > len(self.data):
+            new_data = np.empty(max(end, 2 * len(self.data)), dtype=self.data.dtype)
+            new_data[:self.size] = self.data[:self.size]
+            self.data = new_data
+        self.data[self.size:end] = values
+        self.size = end
 
-    df = pd.DataFrame(raw_data)
-    print("[ANALYTICS] DataFrame principal criado.")
-    print("[ANALYTICS] Dimensão do DataFrame:", df.shape)
-    print("[ANALYTICS] Colunas:", list(df.columns))
+    def finish(self):
+        return self.data[:self.size]
 
-    # Garantir tipo datetime
-    df["purchase_date"] = pd.to_datetime(df["purchase_date"])
 
-    # -------------------------------------------------------------------------
-    # 3) Agregação 1: Receita por estado e categoria
-    # -------------------------------------------------------------------------
-    print("-" * 80)
-    print("[ANALYTICS] Calculando receita total por estado e categoria...")
+class SalesColumnBuffer:
+    """
+    Acumula páginas colunares do scan em arrays tipados, sem lista de
+    dicionários intermediária. state, category, product_id e customer_id
+    são guardados como códigos inteiros de um dicionário global (categóricas).
+    """
 
-    df_receita = (
-        df.groupby(["state", "category"], as_index=False)["total_value"]
-        .sum()
-        .rename(columns={"total_value": "total_revenue"})
+    def __init__(self, capacity=1 << 16):
+        self.columns = {}
+        self.vocab = {}
+        for name in SALES_COLUMNS:
+            if name in CATEGORICAL_COLUMNS:
+                self.columns[name] = _GrowableArray(np.int32, capacity)
+                self.vocab[name] = {}
+            elif name in FLOAT_COLUMNS:
+                self.columns[name] = _GrowableArray(np.float64, capacity)
+            elif name == "purchase_date":
+                self.columns[name] = _GrowableArray("datetime64[ms]", capacity)
+            else:
+                self.columns[name] = _GrowableArray(object, capacity)
+
+    def __len__(self):
+        return self.columns[SALES_COLUMNS[0]].size
+
+    def append_page(self, page):
+        """Recebe uma página no formato de columnar_page_factory."""
+        if not page:
+            return
+        for name, values in zip(SALES_COLUMNS, page):
+            buffer = self.columns[name]
+            if name in CATEGORICAL_COLUMNS:
+                buffer.extend(factorize_into(self.vocab[name], values))
+            elif name in FLOAT_COLUMNS:
+                buffer.extend(np.array(values, dtype=np.float64))
+            elif name == "purchase_date":
+                # Conversão de datetime -> datetime64 em C (np.array é ~15x mais lento)
+                buffer.extend(pd.DatetimeIndex(values).as_unit("ms").values)
+            else:
+                buffer.extend(np.array(values, dtype=object))
+
+    def to_dataframe(self):
+        """Monta o DataFrame final a partir dos buffers (sem cópia extra por linha)."""
+        data = {}
+        for name in SALES_COLUMNS:
+            values = self.columns[name].finish()
+            if name in CATEGORICAL_COLUMNS:
+                # Categorias em ordem alfabética para manter a ordenação do groupby;
+                # a chave None do vocabulário (nulos) vira o código -1 (NaN)
+                categories = np.array(list(self.vocab[name]), dtype=object)
+                present = np.array([c is not None for c in categories], dtype=bool)
+                order = np.flatnonzero(present)[np.argsort(categories[present])]
+                rank = np.full(len(categories), -1, dtype=np.int64)
+                rank[order] = np.arange(len(order))
+                values = pd.Categorical.from_codes(rank[values], categories=categories[order])
+            elif name == "quantity" and not np.isnan(values).any():
+                values = values.astype(np.int64)
+            data[name] = values
+        return pd.DataFrame(data)
+
+
+def columnar_profile(session):
+    """Execution profile do scan: igual ao padrão, com páginas colunares."""
+    return session.execution_profile_clone_update(
+        EXEC_PROFILE_DEFAULT, row_factory=columnar_page_factory
     )
 
-    # Variável nova: participação da categoria no total do estado (share)
-    df_receita["state_total_revenue"] = df_receita.groupby("state")["total_revenue"].transform("sum")
-    df_receita["share_in_state"] = df_receita["total_revenue"] / df_receita["state_total_revenue"]
-
-    # Ordenar para facilitar análise (por estado, depois receita desc)
-    df_receita = df_receita.sort_values(["state", "total_revenue"], ascending=[True, False])
 
+def fetch_scan_dataframe(session, tasks, workers=16):
+    """
+    Executa as tarefas de scan e monta o DataFrame da análise. As páginas
+    chegam transpostas pelo columnar_page_factory e vão direto para buffers
+    NumPy tipados.
+    """
+    buffer = SalesColumnBuffer()
+    next_report = 100_000
+    for page in scan_sales_pages(session, tasks, workers, execution_profile=columnar_profile(session)):
+        with METRICS.stage("buffer"):
+            buffer.append_page(page)
+        if len(buffer) >= next_report:
+            print(f"[ANALYTICS] Linhas lidas: {len(buffer):,}".replace(",", "."))
+            next_report += 100_000
+    return buffer.to_dataframe()
+
+
+def fetch_all_sales(session, mode=None, splits=64, workers=16, years=None, table="base"):
+    """
+    Lê todos os registros da tabela de transações do Cassandra e
+    retorna o DataFrame da análise (ver fetch_scan_dataframe).
+    A leitura é feita pelo motor de scan paralelo (ver build_scan_tasks);
+    mode=None usa o modo de fan-out do layout (partition ou bucket).
+    """
+    mode = mode or SALES_TABLES[table]["fanout"]
+    print(f"[ANALYTICS] Executando scan de {SALES_TABLES[table]['name']} (modo={mode}) ...")
+    start = time.perf_counter()
+    tasks = build_scan_tasks(session, mode, splits, years, table=table)
+    print(f"[ANALYTICS] Tarefas de scan: {len(tasks)} | consultas simultâneas: "
+          f"{min(workers, len(tasks))}")
+
+    df = fetch_scan_dataframe(session, tasks, workers)
+    elapsed = time.perf_counter() - start
+    print(f"[ANALYTICS] Total de linhas lidas do Cassandra: {len(df):,}".replace(",", "."))
+    print(f"[ANALYTICS] Tempo de scan: {elapsed:.1f}s "
+          f"({len(df) / max(elapsed, 1e-9):,.0f} linhas/s)".replace(",", "."))
+    return df
+
+
+def aggregate_sales_stream(session, mode=None, splits=64, workers=16, years=None,
+                           aggregator=None, table="base", sketches=False):
+    """
+    Lê a tabela de transações pelo scan paralelo e alimenta o SalesAggregator
+    página a página. Nenhuma linha é guardada: a memória depende só da
+    quantidade de chaves (estados, categorias, produtos, meses).
+
+    Se `aggregator` vier de uma execução anterior (modo incremental), só
+    são lidas as linhas posteriores ao watermark de cada state, e elas
+    são somadas ao estado existente. sketches=True liga os sketches de
+    clientes distintos e ticket num agregador novo.
+    """
+    layout = SALES_TABLES[table]
+    mode = mode or layout["fanout"]
+    since = aggregator.watermarks() if aggregator is not None else None
+    if since:
+        # só o fan-out por partição/bucket permite fatiar por purchase_date
+        mode = layout["fanout"]
+        print("[ANALYTICS] Modo incremental: lendo apenas purchase_date > watermark de cada estado.")
+    print(f"[ANALYTICS] Agregando {layout['name']} em streaming (modo={mode}) ...")
+    start = time.perf_counter()
+    tasks = build_scan_tasks(session, mode, splits, years, since=since, table=table)
+    print(f"[ANALYTICS] Tarefas de scan: {len(tasks)} | consultas simultâneas: "
+          f"{min(workers, len(tasks))}")
+
+    if aggregator is None:
+        aggregator = SalesAggregator(sketches=sketches)
+    rows_before = aggregator.rows
+    next_report = rows_before + 100_000
+    for page in scan_sales_pages(session, tasks, workers, execution_profile=columnar_profile(session)):
+        with METRICS.stage("aggregate"):
+            aggregator.update_page(page, SALES_COLUMNS)
+        if aggregator.rows >= next_report:
+            print(f"[ANALYTICS] Linhas agregadas: {aggregator.rows - rows_before:,}".replace(",", "."))
+            next_report += 100_000
+
+    elapsed = time.perf_counter() - start
+    lidas = aggregator.rows - rows_before
+    print(f"[ANALYTICS] Total de linhas lidas do Cassandra: {lidas:,}".replace(",", "."))
+    print(f"[ANALYTICS] Tempo de scan + agregação: {elapsed:.1f}s "
+          f"({lidas / max(elapsed, 1e-9):,.0f} linhas/s)".replace(",", "."))
+    return aggregator
+
+
+def aggregate_from_rollups(session):
+    """
+    Monta o agregador a partir das tabelas de rollup (alguns milhares de
+    linhas) em vez de ler sales_transactions inteira.
+    """
+    print("[ANALYTICS] Lendo tabelas de rollup ...")
+    start = time.perf_counter()
+    tables = {
+        name: [tuple(r) for r in session.execute(cql)]
+        for name, cql in ROLLUP_QUERIES.items()
+    }
+    aggregator = SalesAggregator.from_rollup_rows(**tables)
+    print(f"[ANALYTICS] Linhas de rollup lidas: {sum(map(len, tables.values())):,}".replace(",", ".")
+          + f" | transações cobertas: {aggregator.rows:,}".replace(",", ".")
+          + f" | tempo: {time.perf_counter() - start:.2f}s")
+    return aggregator
+
+
+def fetch_all_sales_records(session, mode="partition", splits=64, workers=16, years=None):
+    """
+    Caminho anterior: um dicionário por linha, com casts por campo, depois
+    convertido em DataFrame. Mantido apenas para o benchmark de memória.
+    """
+    tasks = build_scan_tasks(session, mode, splits, years)
+    data = []
+    for page in scan_sales_pages(session, tasks, workers):
+        for r in page:
+            data.append(
+                {
+                    "state": r.state,
+                    "category": r.category,
+                    "transaction_id": r.transaction_id,
+                    "customer_id": r.customer_id,
+                    "product_id": r.product_id,
+                    "price": float(r.price) if r.price is not None else None,
+                    "quantity": int(r.quantity) if r.quantity is not None else None,
+                    "total_value": float(r.total_value) if r.total_value is not None else None,
+                    "purchase_date": r.purchase_date,  # já vem como datetime
+                    "rating": float(r.rating) if r.rating is not None else None,
+                }
+            )
+    df = pd.DataFrame(data)
+    df["purchase_date"] = pd.to_datetime(df["purchase_date"])
+    return df
+
+
+def parse_years(value):
+    """Converte '2019:2024' em range(2019, 2025)."""
+    start, _, end = value.partition(":")
+    return range(int(start), int(end or start) + 1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ETL analítico sobre sales_transactions.")
+    parser.add_argument("--source", choices=["scan", "rollup", "cache"], default="scan",
+                        help="lê sales_transactions (scan), as tabelas rollup_* do loader "
+                             "ou o snapshot Parquet local (cache), relendo só os estados "
+                             "que mudaram no cluster")
+    parser.add_argument("--engine", choices=["stream", "dataframe"], default="stream",
+                        help="agregação em streaming (padrão) ou DataFrame completo + groupby")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reaproveita o estado salvo e lê só transações novas (engine stream)")
+    parser.add_argument("--state-file", type=Path, default=None,
+                        help="arquivo de estado do modo incremental "
+                             "(padrão: data/state/analytics_state.json)")
+    parser.add_argument("--sketches", action="store_true",
+                        help="gera também clientes distintos e p50/p95 do ticket por estado "
+                             "e mês: aproximados (HyperLogLog/KLL) no engine stream, exatos "
+                             "com DataFrame (--engine dataframe, --source cache)")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="ignora o estado salvo e refaz a agregação completa")
+    parser.add_argument("--table", choices=sorted(SALES_TABLES), default="base",
+                        help="layout lido: sales_transactions (base) ou "
+                             "sales_transactions_by_month (bucketed)")
+    parser.add_argument("--scan", choices=SCAN_MODES, default=None,
+                        help="estratégia de leitura da tabela (padrão: partition no layout "
+                             "base, bucket no bucketed)")
+    parser.add_argument("--splits", type=int, default=64,
+                        help="número de faixas de token (modo token)")
+    parser.add_argument("--workers", type=int, default=16,
+                        help="consultas de scan simultâneas")
+    parser.add_argument("--split-years", type=parse_years, default=None,
+                        help="fatia cada (state, category) por ano, ex.: 2019:2024 (modo partition)")
+    add_connection_args(parser)
+    add_backend_args(parser)
+    parser.add_argument("--fake-input", type=Path,
+                        default=BASE_DIR / "data" / "raw" / "marketplace_bigdata_1M.parquet",
+                        help="Parquet carregado no backend fake antes da análise")
+    parser.add_argument("--fake-rows", type=int, default=None,
+                        help="limita as linhas carregadas no backend fake")
+    parser.add_argument("--cache-dir", type=Path, default=None,
+                        help="diretório do snapshot Parquet (--source cache; padrão: "
+                             "data/cache/<tabela>)")
+    parser.add_argument("--cache-max-age", type=float, default=DEFAULT_MAX_AGE,
+                        help="relê do cluster os estados com snapshot mais antigo que "
+                             "estes segundos, mesmo sem mudança detectada; a sondagem não "
+                             "vê inserções retroativas, updates nem deletes (padrão: 1 dia)")
+    parser.add_argument("--cache-offline", action="store_true",
+                        help="usa o snapshot como está, sem conectar ao cluster")
+    add_metrics_args(parser)
+    return parser.parse_args()
+
+
+def write_outputs(processed_dir, df_receita, df_preco_rating, df_vendas_mes):
+    """Grava os três CSVs em data/processed e mostra uma amostra de cada."""
+    # -------------------------------------------------------------------------
+    # 3) Agregação 1: Receita por estado e categoria
+    # -------------------------------------------------------------------------
+    print("-" * 80)
     receita_path = processed_dir / "receita_estado_categoria.csv"
-    df_receita.to_csv(receita_path, index=False)
+    with METRICS.stage("write_csv"):
+        df_receita.to_csv(receita_path, index=False)
 
     print("[ANALYTICS] Arquivo gerado:", receita_path)
     print("[ANALYTICS] Dimensão df_receita:", df_receita.shape)
@@ -125,19 +551,9 @@ def main():
     # 4) Agregação 2: Preço médio x rating médio por produto
     # -------------------------------------------------------------------------
     print("-" * 80)
-    print("[ANALYTICS] Calculando preço médio e rating médio por produto...")
-
-    df_preco_rating = (
-        df.groupby("product_id", as_index=False)
-        .agg(
-            avg_price=("price", "mean"),
-            avg_rating=("rating", "mean"),
-            num_transactions=("transaction_id", "count"),
-        )
-    )
-
     preco_rating_path = processed_dir / "preco_rating_por_produto.csv"
-    df_preco_rating.to_csv(preco_rating_path, index=False)
+    with METRICS.stage("write_csv"):
+        df_preco_rating.to_csv(preco_rating_path, index=False)
 
     print("[ANALYTICS] Arquivo gerado:", preco_rating_path)
     print("[ANALYTICS] Dimensão df_preco_rating:", df_preco_rating.shape)
@@ -148,31 +564,189 @@ def main():
     # 5) Agregação 3: Evolução temporal das vendas (por mês)
     # -------------------------------------------------------------------------
     print("-" * 80)
-    print("[ANALYTICS] Calculando evolução de vendas por mês (2019-2024)...")
-
-    df["year_month"] = df["purchase_date"].dt.to_period("M").astype(str)
-
-    df_vendas_mes = (
-        df.groupby("year_month", as_index=False)
-        .agg(
-            total_revenue=("total_value", "sum"),
-            num_transactions=("transaction_id", "count"),
-        )
-        .sort_values("year_month")
-    )
-
     vendas_mes_path = processed_dir / "vendas_por_mes.csv"
-    df_vendas_mes.to_csv(vendas_mes_path, index=False)
+    with METRICS.stage("write_csv"):
+        df_vendas_mes.to_csv(vendas_mes_path, index=False)
 
     print("[ANALYTICS] Arquivo gerado:", vendas_mes_path)
     print("[ANALYTICS] Dimensão df_vendas_mes:", df_vendas_mes.shape)
     print("[ANALYTICS] Amostra df_vendas_mes:")
     print(df_vendas_mes.head(12))
 
+
+def write_sketch_outputs(processed_dir, by_state_month, by_state, approximate):
+    """Grava os CSVs de clientes distintos e quantis do ticket."""
+    print("-" * 80)
+    origem = "sketches HyperLogLog/KLL" if approximate else "exato, DataFrame"
+    for name, df in (("clientes_ticket_estado_mes.csv", by_state_month),
+                     ("clientes_ticket_estado.csv", by_state)):
+        path = processed_dir / name
+        with METRICS.stage("write_csv"):
+            df.to_csv(path, index=False)
+        print(f"[ANALYTICS] Arquivo gerado ({origem}):", path)
+    print("[ANALYTICS] Amostra por estado:")
+    print(by_state.head(10))
+
+
+def read_snapshot(session, args):
+    """
+    Lê a análise do snapshot Parquet local (snapshot_cache.py). Com sessão,
+    antes compara cada state com o cluster e relê só os que mudaram; o
+    primeiro uso faz o scan completo. Retorna o DataFrame da análise.
+    """
+    cache_dir = args.cache_dir or BASE_DIR / "data" / "cache" / SALES_TABLES[args.table]["name"]
+    print(f"[ANALYTICS] Snapshot local: {cache_dir}")
+    snapshot, refreshed, refresh_s = load_snapshot(cache_dir, args.table, session,
+                                                   args.workers, args.cache_max_age)
+    if session is not None:
+        print(f"[ANALYTICS] Estados relidos do cluster: {len(refreshed)} de "
+              f"{len(snapshot.partitions)} ({refresh_s:.2f}s)"
+              + (f": {', '.join(refreshed)}" if 0 < len(refreshed) <= 10 else ""))
+    start = time.perf_counter()
+    with METRICS.stage("read"):
+        df = snapshot.read_dataframe()
+    print(f"[ANALYTICS] Snapshot lido: {len(df):,} linhas".replace(",", ".")
+          + f" em {time.perf_counter() - start:.2f}s (atualizado em {snapshot.updated_at}).")
+    return df
+
+
+def connect(args):
+    """
+    Conecta ao cluster (ou ao FakeCluster, já carregado com --fake-input) e
+    retorna (cluster, sessão). Encerra o processo se o keyspace não abrir.
+    """
+    connection = load_connection_config(args.cassandra_config)
+    keyspace = connection["keyspace"]
+    if args.backend == "fake":
+        print(f"[ANALYTICS] Usando o Cassandra em processo (fake, latência "
+              f"{args.fake_latency_ms} ms), carregado a partir de {args.fake_input} ...")
+    else:
+        print(f"[ANALYTICS] Conectando ao Cassandra ({','.join(connection['hosts'])}:"
+              f"{connection['port']}, keyspace {keyspace}) ...")
+    cluster = connect_cluster(backend=args.backend, fake_options=fake_options(args),
+                              config=connection, role="scan")
+    try:
+        session = cluster.connect(keyspace)
+    except Exception as e:
+        print(f"[ERRO] Não foi possível conectar ao keyspace {keyspace}:")
+        print(e)
+        cluster.shutdown()
+        sys.exit(1)
+
+    print("[ANALYTICS] Conexão estabelecida.")
+    if args.backend == "fake":
+        stats = preload_parquet(session, args.fake_input, args.fake_rows, table=args.table,
+                                rollups=args.source == "rollup")
+        print(f"[ANALYTICS] Backend fake carregado: {stats['rows_ok']:,} linhas".replace(",", ".")
+              + f" em {stats['elapsed']:.1f}s.")
+    return cluster, session
+
+
+def main():
+    args = parse_args()
+    if (args.incremental or args.full_refresh) and (args.engine != "stream" or args.source != "scan"):
+        print("[ERRO] --incremental e --full-refresh só funcionam com --engine stream e --source scan.")
+        sys.exit(2)
+
+    # Descobre pasta raiz do projeto
+    base_dir = BASE_DIR
+
+    processed_dir = base_dir / "data" / "processed"
+    processed_dir.mkdir(parents=True, exist_ok=True)
+
+    # -------------------------------------------------------------------------
+    # 1) Conectar ao Cassandra
+    # -------------------------------------------------------------------------
+    print("=" * 80)
+    if args.source == "cache" and args.cache_offline:
+        print("[ANALYTICS] Modo offline: só o snapshot local, sem conexão com o Cassandra.")
+        cluster = session = None
+    else:
+        cluster, session = connect(args)
+    # ligadas só depois da pré-carga do fake, que também passa pelo loader
+    if configure_metrics(args):
+        print(f"[ANALYTICS] Métricas em {args.metrics} (a cada {args.metrics_interval:g}s)")
+
+    # -------------------------------------------------------------------------
+    # 2) Ler sales_transactions e agregar
+    # -------------------------------------------------------------------------
+    scan_args = dict(mode=args.scan, splits=args.splits, workers=args.workers,
+                     years=args.split_years, table=args.table)
+
+    state_path = args.state_file or base_dir / "data" / "state" / "analytics_state.json"
+    if args.sketches and args.source == "rollup":
+        print("[ALERTA] As tabelas de rollup não têm clientes nem tickets; --sketches ignorado.")
+        args.sketches = False
+    df = None
+    if args.source == "rollup":
+        aggregator = aggregate_from_rollups(session)
+        n_rows = aggregator.rows
+    elif args.source == "cache":
+        df = read_snapshot(session, args)
+        n_rows = len(df)
+    elif args.engine == "stream":
+        previous = None
+        if args.incremental and not args.full_refresh:
+            try:
+                previous = load_state(state_path, table=SALES_TABLES[args.table]["name"])
+            except ValueError as e:
+                print(f"[ERRO] Estado incremental inválido ({state_path}): {e}. "
+                      "Use --full-refresh para recalcular.")
+                if cluster is not None:
+                    cluster.shutdown()
+                sys.exit(1)
+            if previous is None:
+                print(f"[ANALYTICS] Nenhum estado salvo em {state_path}; fazendo carga completa.")
+            else:
+                print(f"[ANALYTICS] Estado carregado: {previous.rows:,} linhas já agregadas.".replace(",", "."))
+            if previous is not None and args.sketches and previous.customers is None:
+                print("[ALERTA] O estado salvo não tem sketches; fazendo carga completa.")
+                previous = None
+        aggregator = aggregate_sales_stream(session, aggregator=previous,
+                                            sketches=args.sketches, **scan_args)
+        n_rows = aggregator.rows
+        if args.incremental or args.full_refresh:
+            save_state(state_path, aggregator, table=SALES_TABLES[args.table]["name"])
+            print("[ANALYTICS] Estado incremental salvo em:", state_path)
+    else:
+        df = fetch_all_sales(session, **scan_args)
+        n_rows = len(df)
+
+    if not n_rows:
+        print(f"[ERRO] Nenhum dado foi retornado da tabela {SALES_TABLES[args.table]['name']}.")
+        if cluster is not None:
+            cluster.shutdown()
+        sys.exit(1)
+
+    sketch_outputs = None
+    if df is None:
+        with METRICS.stage("aggregate"):
+            df_receita, df_preco_rating, df_vendas_mes = aggregator.results()
+            if args.sketches:
+                sketch_outputs = (aggregator.customers_tickets_by_state_month(),
+                                  aggregator.customers_tickets_by_state())
+    else:
+        print("[ANALYTICS] DataFrame principal criado.")
+        print("[ANALYTICS] Dimensão do DataFrame:", df.shape)
+        print("[ANALYTICS] Colunas:", list(df.columns))
+        print("[ANALYTICS] Memória do DataFrame:",
+              f"{df.memory_usage(deep=True).sum() / (1024 * 1024):.1f} MB")
+        with METRICS.stage("aggregate"):
+            df_receita, df_preco_rating, df_vendas_mes = aggregate_dataframe(df)
+            if args.sketches:
+                sketch_outputs = customers_tickets_dataframe(df)
+
+    write_outputs(processed_dir, df_receita, df_preco_rating, df_vendas_mes)
+    if sketch_outputs is not None:
+        write_sketch_outputs(processed_dir, *sketch_outputs, approximate=df is None)
+    print_stage_summary("[ANALYTICS]")
+    METRICS.close()
+
     # -------------------------------------------------------------------------
     # 6) Finalização
     # -------------------------------------------------------------------------
-    cluster.shutdown()
+    if cluster is not None:
+        cluster.shutdown()
     print("=" * 80)
     print("[ANALYTICS] ETL analítico concluído com sucesso.")
     print("=" * 80)
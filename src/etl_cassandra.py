@@ -1,10 +1,149 @@
+import argparse
+import asyncio
+import multiprocessing as mp
+import queue
 import sys
+import threading
+import time
+import traceback
+from collections import namedtuple
 from pathlib import Path
 from itertools import islice
+from operator import itemgetter
 
-import pandas as pd
-from cassandra.cluster import Cluster
+import numpy as np
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from cassandra import OperationTimedOut, ReadTimeout, WriteTimeout
 from cassandra.concurrent import execute_concurrent_with_args
+from cassandra.protocol import OverloadedErrorMessage
+
+from cassandra_session import (add_connection_args, connect_cluster, load_connection_config,
+                               prepare_cached)
+from fake_cassandra import add_backend_args, fake_options
+from load_checkpoint import LoadCheckpoint, unit_key
+from metrics import (METRICS, add_metrics_args, configure_metrics, fmt_mb, peak_rss_mb,
+                     print_stage_summary, worker_metrics_path)
+from sales_aggregates import SalesAggregator
+
+
+# Colunas na ordem do INSERT, com o tipo CQL de cada uma
+INSERT_COLUMNS = [
+    ("state", "text"),
+    ("category", "text"),
+    ("transaction_id", "text"),
+    ("customer_id", "text"),
+    ("product_id", "text"),
+    ("price", "double"),
+    ("quantity", "int"),
+    ("total_value", "double"),
+    ("purchase_date", "timestamp"),
+    ("city", "text"),
+    ("payment_method", "text"),
+    ("device_type", "text"),
+    ("rating", "double"),
+]
+
+INSERT_CQL = f"""
+    INSERT INTO sales_transactions (
+        {", ".join(name for name, _ in INSERT_COLUMNS)}
+    ) VALUES ({", ".join("?" for _ in INSERT_COLUMNS)})
+"""
+
+# Layout alternativo com bucket mensal: partição (state, year_month). As
+# tuplas levam year_month como última posição, depois das colunas do INSERT.
+BUCKETED_INSERT_CQL = f"""
+    INSERT INTO sales_transactions_by_month (
+        {", ".join(name for name, _ in INSERT_COLUMNS)}, year_month
+    ) VALUES ({", ".join("?" for _ in INSERT_COLUMNS)}, ?)
+"""
+
+# Tabelas de consulta por chave (--lookups): a venda inteira, particionada por
+# produto ou por cliente. As colunas seguem a ordem de INSERT_COLUMNS, então
+# o INSERT usa as primeiras posições da tupla, e a posição da chave na tupla
+# serve para agrupar os BATCHs por partição.
+LOOKUP_TABLES = {
+    "sales_by_product": INSERT_COLUMNS.index(("product_id", "text")),
+    "sales_by_customer": INSERT_COLUMNS.index(("customer_id", "text")),
+}
+
+LOOKUP_INSERT_CQL = {
+    name: f"""
+    INSERT INTO {name} (
+        {", ".join(col for col, _ in INSERT_COLUMNS)}
+    ) VALUES ({", ".join("?" for _ in INSERT_COLUMNS)})
+"""
+    for name in LOOKUP_TABLES
+}
+
+# Tabelas de destino aceitas por --table ("both" grava nas duas: dual-write
+# para a migração entre os layouts)
+TABLE_CHOICES = ("base", "bucketed", "both")
+
+# UPDATEs das tabelas de rollup (counters), na ordem de to_rollup_rows()
+ROLLUP_CQL = {
+    "state_category": """
+        UPDATE rollup_revenue_by_state_category
+        SET revenue_cents = revenue_cents + ?, num_transactions = num_transactions + ?
+        WHERE state = ? AND category = ?
+    """,
+    "month": """
+        UPDATE rollup_revenue_by_month
+        SET revenue_cents = revenue_cents + ?, num_transactions = num_transactions + ?
+        WHERE year_month = ?
+    """,
+    "product": """
+        UPDATE rollup_product_stats
+        SET price_cents = price_cents + ?, rating_cents = rating_cents + ?,
+            num_transactions = num_transactions + ?
+        WHERE product_id = ?
+    """,
+}
+
+# Linhas acumuladas em memória antes de descarregar os rollups
+ROLLUP_FLUSH_ROWS = 1_000_000
+
+# Posição do transaction_id na tupla do INSERT (usado para registrar falhas)
+TRANSACTION_ID_POS = 2
+
+# Limites padrão dos lotes UNLOGGED por partição. 5 KB acompanha o
+# batch_size_warn_threshold_in_kb padrão do Cassandra 4.x.
+BATCH_MAX_ROWS = 50
+BATCH_MAX_BYTES = 5 * 1024
+
+# Estimativa do tamanho serializado de uma linha: bytes das colunas texto
+# mais um valor fixo para doubles/int/timestamp e overhead de protocolo
+_TEXT_FIELDS = itemgetter(*[i for i, (_, t) in enumerate(INSERT_COLUMNS) if t == "text"])
+_FIXED_ROW_BYTES = 8 * 4 + 4 + 4 * len(INSERT_COLUMNS)
+
+# Quantidade de linhas convertidas de uma vez pelo encoder colunar
+ENCODE_CHUNK_ROWS = 100_000
+
+# Linhas por RecordBatch lido do Parquet em modo streaming
+READ_BATCH_ROWS = 10_000
+
+# Exemplos de erro que cada worker do modo --workers devolve ao processo pai
+WORKER_ERROR_SAMPLE = 100
+
+# Tentativas por requisição (a primeira + reenvios) e espera do 1º reenvio;
+# a espera dobra a cada nova tentativa
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.5
+
+# Controle adaptativo da concorrência (--adaptive): limites, latência alvo
+# (p90 de cada janela) e duração da janela de avaliação
+ADAPTIVE_MIN = 8
+ADAPTIVE_MAX = 4096
+ADAPTIVE_TARGET_LATENCY = 0.050
+ADAPTIVE_WINDOW = 0.25
+ADAPTIVE_INCREASE = 16
+ADAPTIVE_DECREASE = 0.7
+# Fração de timeouts numa janela tolerada sem reduzir a concorrência (falhas
+# esporádicas não indicam sobrecarga)
+ADAPTIVE_ERROR_TOLERANCE = 0.01
+
+# Erros que indicam cluster sobrecarregado: reduzem a concorrência
+OVERLOAD_ERRORS = (WriteTimeout, ReadTimeout, OperationTimedOut, OverloadedErrorMessage)
 
 
 def batched(iterable, n):
@@ -20,12 +159,815 @@ def batched(iterable, n):
         yield batch
 
 
-def main():
-    # Descobre a pasta raiz do projeto a partir deste arquivo
+def encode_column(values, cql_type):
+    """
+    Converte uma coluna inteira (Series do pandas ou Array do pyarrow) para
+    uma lista de valores Python no formato que o driver espera.
+    A conversão é feita de uma vez pelo NumPy, sem laço Python por célula.
+    """
+    arr = np.asarray(values)
+    if cql_type == "double":
+        return arr.astype(np.float64, copy=False).tolist()
+    if cql_type == "int":
+        return arr.astype(np.int64, copy=False).tolist()
+    if cql_type == "timestamp":
+        # datetime64[us].tolist() devolve datetime.datetime nativo
+        return arr.astype("datetime64[us]").tolist()
+    return arr.astype(object, copy=False).tolist()
+
+
+def year_month_values(frame):
+    """Bucket AAAA-MM de cada purchase_date (chave de sales_transactions_by_month)."""
+    months = np.asarray(frame["purchase_date"]).astype("datetime64[M]")
+    return np.datetime_as_string(months, unit="M").tolist()
+
+
+def encode_columns(frame, columns=INSERT_COLUMNS, year_month=False):
+    """
+    Codifica um bloco de dados (DataFrame, Table ou RecordBatch do pyarrow)
+    coluna a coluna e devolve um iterador de tuplas prontas para o INSERT.
+    Com year_month=True, cada tupla ganha o bucket mensal no fim.
+    """
+    encoded = [encode_column(frame[name], cql_type) for name, cql_type in columns]
+    if year_month:
+        encoded.append(year_month_values(frame))
+    return zip(*encoded)
+
+
+def iter_encoded_rows(df, chunk_rows=ENCODE_CHUNK_ROWS):
+    """
+    Percorre o DataFrame em blocos de chunk_rows linhas, codificando cada
+    bloco de forma colunar, e gera as tuplas uma a uma.
+    """
+    for start in range(0, len(df), chunk_rows):
+        yield from encode_columns(df.iloc[start:start + chunk_rows])
+
+
+def iter_parquet_batches(path, batch_size=READ_BATCH_ROWS, max_rows=None):
+    """
+    Lê o arquivo Parquet em RecordBatches de até batch_size linhas, apenas
+    com as colunas do INSERT. O arquivo nunca é carregado inteiro em memória:
+    o pico fica limitado ao lote em processamento e aos buffers do pyarrow.
+    """
+    parquet_file = pq.ParquetFile(path)
+    columns = [name for name, _ in INSERT_COLUMNS]
+    # use_threads=False evita que o pyarrow pré-carregue vários row groups
+    # em paralelo, o que quebraria o limite de memória
+    batches = parquet_file.iter_batches(
+        batch_size=batch_size, columns=columns, use_threads=False
+    )
+
+    remaining = max_rows
+    for record_batch in batches:
+        if remaining is not None:
+            if remaining <= 0:
+                break
+            record_batch = record_batch.slice(0, remaining)
+            remaining -= record_batch.num_rows
+        yield record_batch
+
+
+def stream_encoded_rows(path, batch_size=READ_BATCH_ROWS, max_rows=None):
+    """
+    Streaming completo do arquivo: lê cada RecordBatch, codifica de forma
+    colunar e gera as tuplas do INSERT, prontas para batched().
+    """
+    for record_batch in iter_parquet_batches(path, batch_size, max_rows):
+        yield from encode_columns(record_batch)
+
+
+def iter_parquet_units(path, batch_size=READ_BATCH_ROWS, max_rows=None, skip=None,
+                       shard=None):
+    """
+    Como iter_parquet_batches, mas percorre um row group por vez e gera pares
+    (chave, RecordBatch), com chave = unit_key(row group, lote no row group).
+    A chave não depende de quantas linhas já foram carregadas, então é a
+    mesma em todas as execuções com o mesmo arquivo e batch_size.
+    Blocos cujas chaves estão em `skip` não são entregues, e um row group
+    inteiramente concluído nem chega a ser lido.
+
+    shard=(índice, total) entrega só a parte de um worker: row groups
+    alternados quando há pelo menos um por worker; senão, lotes alternados
+    (cada worker lê o arquivo, mas só codifica e envia os seus lotes).
+    max_rows continua valendo para o arquivo como um todo.
+    """
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    columns = [name for name, _ in INSERT_COLUMNS]
+    skip = skip or ()
+    shard_index, shard_count = shard or (0, 1)
+    by_group = metadata.num_row_groups >= shard_count
+
+    remaining = max_rows
+    seq = 0  # posição global do lote, usada no shard por lotes
+    for row_group in range(metadata.num_row_groups):
+        if remaining is not None and remaining <= 0:
+            break
+        group_rows = metadata.row_group(row_group).num_rows
+        num_batches = -(-group_rows // batch_size)
+        if ((by_group and row_group % shard_count != shard_index)
+                or (skip and all(unit_key(row_group, j) in skip for j in range(num_batches)))):
+            if remaining is not None:
+                remaining -= group_rows
+            seq += num_batches
+            continue
+
+        batches = parquet_file.iter_batches(
+            batch_size=batch_size, row_groups=[row_group], columns=columns,
+            use_threads=False,
+        )
+        for batch_index, record_batch in enumerate(batches):
+            if remaining is not None:
+                if remaining <= 0:
+                    break
+                record_batch = record_batch.slice(0, remaining)
+                remaining -= record_batch.num_rows
+            key = unit_key(row_group, batch_index)
+            mine = by_group or (seq + batch_index) % shard_count == shard_index
+            if mine and key not in skip:
+                yield key, record_batch
+        seq += num_batches
+
+
+def stream_encoded_chunks(path, batch_size=READ_BATCH_ROWS, max_rows=None, skip=None,
+                          shard=None, year_month=False):
+    """
+    Igual a stream_encoded_rows, mas entrega cada RecordBatch já codificado
+    como um par (chave, lista de tuplas), a unidade de trabalho do pipeline
+    e do checkpoint. year_month=True acrescenta o bucket mensal às tuplas
+    (necessário para gravar sales_transactions_by_month).
+    """
+    units = iter_parquet_units(path, batch_size, max_rows, skip, shard)
+    while True:
+        with METRICS.stage("read"):
+            unit = next(units, None)
+        if unit is None:
+            return
+        key, record_batch = unit
+        with METRICS.stage("encode"):
+            rows = list(encode_columns(record_batch, year_month=year_month))
+        yield key, rows
+
+
+def row_generator_itertuples(df):
+    """
+    Gerador original, linha a linha via itertuples (uma conversão Python por
+    célula). Mantido apenas como referência para o benchmark do encoder.
+    """
+    for row in df.itertuples(index=False):
+        yield (
+            str(row.state),
+            str(row.category),
+            str(row.transaction_id),
+            str(row.customer_id),
+            str(row.product_id),
+            float(row.price),
+            int(row.quantity),
+            float(row.total_value),
+            row.purchase_date.to_pydatetime(),  # datetime nativo
+            str(row.city),
+            str(row.payment_method),
+            str(row.device_type),
+            float(row.rating),
+        )
+
+
+def estimate_row_bytes(params):
+    """Tamanho aproximado de uma linha do INSERT depois de serializada."""
+    return sum(map(len, _TEXT_FIELDS(params))) + _FIXED_ROW_BYTES
+
+
+def estimate_batch_bytes(record_batch, year_month=False):
+    """
+    Versão vetorizada de estimate_row_bytes para um RecordBatch inteiro:
+    devolve um array NumPy com o tamanho aproximado de cada linha.
+    """
+    sizes = np.full(record_batch.num_rows, _FIXED_ROW_BYTES, dtype=np.int64)
+    for name, cql_type in INSERT_COLUMNS:
+        if cql_type == "text":
+            sizes += pc.binary_length(record_batch.column(name)).to_numpy(zero_copy_only=False)
+    if year_month:
+        sizes += 7 + 4  # "AAAA-MM" + cabeçalho da coluna
+    return sizes
+
+
+def group_partition_batches(chunk, max_rows=BATCH_MAX_ROWS, max_bytes=BATCH_MAX_BYTES,
+                            partition_key=itemgetter(0)):
+    """
+    Agrupa as linhas de um bloco pela chave de partição (por padrão, state)
+    e divide cada grupo em sub-lotes de no máximo max_rows linhas e
+    max_bytes bytes. Cada sub-lote vira um BATCH UNLOGGED de partição única.
+    """
+    groups = {}
+    for params in chunk:
+        groups.setdefault(partition_key(params), []).append(params)
+
+    for rows in groups.values():
+        current, size = [], 0
+        for params in rows:
+            row_bytes = estimate_row_bytes(params)
+            if current and (len(current) >= max_rows or size + row_bytes > max_bytes):
+                yield current
+                current, size = [], 0
+            current.append(params)
+            size += row_bytes
+        if current:
+            yield current
+
+
+# Destino de uma escrita do pipeline: statement preparado, quantas posições
+# da tupla ele usa (None = todas) e como extrair a chave de partição
+WriteTarget = namedtuple("WriteTarget", "statement num_params partition_key")
+
+
+def prepare_targets(session, table="base", lookups=False):
+    """
+    Prepara os INSERTs de --table: a tabela original, a com bucket mensal
+    ou as duas (dual-write). Com "both", as tuplas trazem year_month no fim
+    e o INSERT original usa só as primeiras posições. lookups=True
+    acrescenta sales_by_product e sales_by_customer (LOOKUP_TABLES).
+    """
+    targets = []
+    if table in ("base", "both"):
+        targets.append(WriteTarget(
+            prepare_cached(session, INSERT_CQL),
+            len(INSERT_COLUMNS) if table == "both" else None,
+            itemgetter(0),
+        ))
+    if table in ("bucketed", "both"):
+        targets.append(WriteTarget(
+            prepare_cached(session, BUCKETED_INSERT_CQL), None, itemgetter(0, len(INSERT_COLUMNS)),
+        ))
+    if lookups:
+        num_params = len(INSERT_COLUMNS) if needs_year_month(table) else None
+        for name, key_pos in LOOKUP_TABLES.items():
+            targets.append(WriteTarget(
+                prepare_cached(session, LOOKUP_INSERT_CQL[name]), num_params, itemgetter(key_pos),
+            ))
+    return targets
+
+
+def needs_year_month(table):
+    return table in ("bucketed", "both")
+
+
+class AdaptiveConcurrency:
+    """
+    Controle AIMD do número de requisições em voo. A cada janela de
+    `window` segundos olha as respostas das requisições enviadas depois da
+    última redução:
+
+    - timeouts/overload acima de ADAPTIVE_ERROR_TOLERANCE, ou p90 da
+      latência acima de target_latency: limite *= decrease (redução
+      multiplicativa);
+    - senão, se o limite chegou a ser atingido na janela: limite +=
+      increase (aumento aditivo). Até a primeira redução o limite dobra a
+      cada janela ("slow start"), para achar a capacidade do cluster logo.
+
+    Ignorar as respostas de requisições enviadas antes da última redução
+    evita reduzir várias vezes pela mesma rajada de timeouts. As mudanças
+    ficam em `history` como (segundos, limite, p90 em ms, timeouts, motivo).
+    """
+
+    def __init__(self, initial=100, min_limit=ADAPTIVE_MIN, max_limit=ADAPTIVE_MAX,
+                 target_latency=ADAPTIVE_TARGET_LATENCY, window=ADAPTIVE_WINDOW,
+                 increase=ADAPTIVE_INCREASE, decrease=ADAPTIVE_DECREASE):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.window = window
+        self.increase = increase
+        self.decrease = decrease
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.slow_start = True
+        self.history = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._epoch = self._start
+        self._window_end = self._start + window
+        self._latencies = []
+        self._overloads = 0
+        self._saturated = False
+        self._record(self.limit, None, 0, "início")
+
+    def on_complete(self, started, latency, exc, in_flight):
+        """Registra uma resposta (chamado na thread de callback do driver)."""
+        overload = exc is not None and isinstance(exc, OVERLOAD_ERRORS)
+        with self._lock:
+            if in_flight >= self.limit:
+                self._saturated = True
+            if started >= self._epoch:
+                if overload:
+                    self._overloads += 1
+                elif exc is None:
+                    self._latencies.append(latency)
+            now = started + latency
+            if now >= self._window_end:
+                self._adjust(now)
+
+    def _adjust(self, now):
+        samples = len(self._latencies) + self._overloads
+        if samples:
+            self._latencies.sort()
+            p90 = self._latencies[int(len(self._latencies) * 0.9)] if self._latencies else None
+            if self._overloads > samples * ADAPTIVE_ERROR_TOLERANCE:
+                self._reduce(now, p90, "timeouts")
+            elif p90 is not None and p90 > self.target_latency:
+                self._reduce(now, p90, "latência")
+            elif self._saturated and self.limit < self.max_limit:
+                step = self.limit if self.slow_start else self.increase
+                self.limit = min(self.max_limit, self.limit + step)
+                self._record(self.limit, p90, self._overloads, "aumento")
+        self._latencies = []
+        self._overloads = 0
+        self._saturated = False
+        self._window_end = now + self.window
+
+    def _reduce(self, now, p90, reason):
+        self.slow_start = False
+        self.limit = max(self.min_limit, int(self.limit * self.decrease))
+        self._epoch = now
+        self._record(self.limit, p90, self._overloads, reason)
+
+    def _record(self, limit, p90, overloads, reason):
+        elapsed = time.perf_counter() - self._start
+        self.history.append((round(elapsed, 3), limit,
+                             None if p90 is None else round(p90 * 1000, 2), overloads, reason))
+        METRICS.set_gauge("etl_concurrency_limit", limit)
+
+    def summary(self):
+        """Limite final, mínimo, máximo e a quantidade de ajustes."""
+        limits = [entry[1] for entry in self.history]
+        return {"final": self.limit, "min": min(limits), "max": max(limits),
+                "changes": len(self.history) - 1}
+
+    def save_history(self, path):
+        """Grava o histórico do limite em CSV (para plotar a concorrência no tempo)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("elapsed_s,limit,p90_ms,timeouts,reason\n")
+            for elapsed, limit, p90, overloads, reason in self.history:
+                f.write(f"{elapsed},{limit},{'' if p90 is None else p90},{overloads},{reason}\n")
+
+
+class RollupWriter:
+    """
+    Mantém as tabelas de rollup durante a carga. As linhas de cada bloco
+    alimentam um SalesAggregator em memória; a cada flush_rows linhas (e no
+    fim) os totais acumulados viram UPDATEs de counter, um por chave. Assim
+    são alguns milhares de escritas por flush em vez de uma por linha.
+
+    Roda no event loop da carga: os UPDATEs saem por um AsyncWriter próprio
+    (até `concurrency` em voo), em paralelo com os INSERTs, sem parar o loop.
+
+    Counters não são idempotentes: uma carga repetida soma de novo, e por
+    isso os UPDATEs que falham não são reenviados na hora. Com um
+    checkpoint, os blocos de um flush são marcados como concluídos quando
+    o flush termina (as linhas já foram gravadas), e os UPDATEs que
+    falharam vão para checkpoint.rollup_pending com os seus incrementos:
+    o próximo flush (ou o --resume) reenvia só esses, nunca os que já
+    entraram. Resta a janela de uma queda no meio do flush, em que os
+    blocos ainda não marcados são somados de novo no --resume.
+    """
+
+    def __init__(self, session, concurrency=100, flush_rows=ROLLUP_FLUSH_ROWS,
+                 checkpoint=None):
+        self.session = session
+        self.concurrency = concurrency
+        self.flush_rows = flush_rows
+        self.statements = {name: prepare_cached(session, cql) for name, cql in ROLLUP_CQL.items()}
+        self.aggregator = SalesAggregator()
+        self.checkpoint = checkpoint
+        self._pending_units = []  # (chave, linhas) acumulados desde o último flush
+        self._flushes = set()  # flushes em andamento
+        self.updates = 0
+        self.errors = []
+
+    def add_chunk(self, chunk, key=None):
+        """
+        Acumula um bloco de tuplas do INSERT (key: chave do bloco no
+        checkpoint). Chamado no event loop; ao passar de flush_rows linhas,
+        agenda um flush sem esperar por ele.
+        """
+        if key is not None:
+            self._pending_units.append((key, len(chunk)))
+        if not chunk:
+            return
+        columns = dict(zip((name for name, _ in INSERT_COLUMNS), zip(*chunk)))
+        self.aggregator.update(columns)
+        if self.aggregator.rows >= self.flush_rows:
+            task = asyncio.ensure_future(self._flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def flush(self):
+        """Envia o que ainda está acumulado e espera os flushes em andamento."""
+        await self._flush()
+        while self._flushes:
+            await asyncio.gather(*self._flushes)
+
+    async def _flush(self):
+        """
+        Envia os totais acumulados (e os incrementos pendentes do checkpoint)
+        como UPDATEs de counter e zera o acumulador.
+        """
+        # import local: async_sales importa este módulo
+        from async_sales import AsyncWriter, LoadUnit
+
+        aggregator, units = self.aggregator, self._pending_units
+        self.aggregator, self._pending_units = SalesAggregator(), []
+        updates = []
+        if self.checkpoint is not None:
+            updates = [(name, tuple(params)) for name, params in self.checkpoint.rollup_pending]
+            self.checkpoint.rollup_pending = []
+        retried = len(updates)
+        if not aggregator.rows and not updates:
+            self._commit_units(units)
+            return
+        tables = aggregator.to_rollup_rows()
+        updates += [("state_category", (revenue, n, state, category))
+                    for state, category, revenue, n in tables["state_category"]]
+        updates += [("month", (revenue, n, year_month))
+                    for year_month, revenue, n in tables["month"]]
+        updates += [("product", (price, rating, n, product_id))
+                    for product_id, price, rating, n in tables["product"]]
+
+        writer = AsyncWriter(self.session, self.concurrency, max_attempts=1,
+                             labels={"writer": "rollup"})
+        unit = LoadUnit("rollups", None)
+        for name, params in updates:
+            await writer.submit(unit, self.statements[name], params, ((name, params),))
+        await writer.drain()
+
+        self.updates += writer.rows_ok
+        self.errors.extend(writer.errors)
+        print(f"[ETL] Rollups atualizados: {writer.rows_ok:,} chaves".replace(",", ".")
+              + f" ({aggregator.rows:,} linhas".replace(",", ".")
+              + (f", {retried} incrementos pendentes reenviados)" if retried else ")")
+              + (f" | erros: {len(writer.errors)}" if writer.errors else ""))
+        if self.checkpoint is not None:
+            # Só os incrementos que falharam voltam a ser enviados depois
+            self.checkpoint.rollup_pending.extend(
+                [name, list(params)] for (name, params), _exc in writer.errors
+            )
+        self._commit_units(units, force_save=bool(retried or writer.errors))
+
+    def _commit_units(self, units, force_save=False):
+        """Marca no checkpoint os blocos cujos rollups já foram enviados."""
+        if self.checkpoint is not None and (units or force_save):
+            for key, rows in units:
+                self.checkpoint.mark_done(key, rows)
+            self.checkpoint.save()
+
+
+def load_pipelined(session, targets, chunks, concurrency=100, queue_chunks=4,
+                   batch_rows=None, batch_bytes=BATCH_MAX_BYTES, rollups=None,
+                   checkpoint=None, max_attempts=MAX_ATTEMPTS,
+                   retry_base_delay=RETRY_BASE_DELAY, report=None, controller=None):
+    """
+    Carga em pipeline: uma thread produtora lê/codifica os blocos numa fila
+    limitada (queue_chunks blocos) enquanto o event loop de
+    async_sales.load_sales mantém sempre até `concurrency` requisições
+    assíncronas em voo. É a versão síncrona de load_sales, com checkpoint e
+    rollups. `chunks` gera pares (chave, lista de tuplas), como
+    stream_encoded_chunks.
+
+    `targets` é o INSERT preparado ou uma lista de WriteTarget (ver
+    prepare_targets); com mais de um destino cada linha é gravada em todos
+    e as contagens de linhas passam a contar escritas.
+
+    Com batch_rows=None cada linha é um INSERT. Com batch_rows definido, as
+    linhas de cada bloco são agrupadas por partição e enviadas como BATCH
+    UNLOGGED limitado a batch_rows linhas / batch_bytes bytes.
+
+    Requisições que falham são reenviadas com backoff exponencial, até
+    max_attempts tentativas. Um bloco só é dado como concluído quando todas
+    as suas requisições terminam com sucesso; aí ele alimenta os rollups
+    (RollupWriter) e é marcado no checkpoint (LoadCheckpoint). Blocos com
+    falhas definitivas ficam registrados no checkpoint com os
+    transaction_id, para o --resume refazê-los.
+
+    Com `controller` (AdaptiveConcurrency) o número de requisições em voo
+    se ajusta à latência e aos timeouts observados, a partir de
+    controller.limit; `concurrency` é ignorado.
+
+    report(progresso), se informado, recebe o progresso após cada bloco no
+    lugar do print (usado pelos workers do modo --workers).
+    Retorna um dicionário com linhas gravadas, erros e tempo decorrido.
+    """
+    # import local: async_sales importa este módulo
+    from async_sales import from_blocking, load_sales
+
+    start = time.perf_counter()
+
+    def on_chunk(key, chunk, failed_ids):
+        if failed_ids:
+            if checkpoint is not None:
+                checkpoint.mark_failed(key, failed_ids)
+        elif rollups is not None:
+            rollups.add_chunk(chunk, key)
+        elif checkpoint is not None:
+            checkpoint.mark_done(key, len(chunk))
+        if checkpoint is not None:
+            checkpoint.maybe_save()
+
+    def print_progress(progress):
+        print(f"[ETL] Bloco {progress['chunks']} ({progress['key']}) enviado. "
+              f"Enviadas: {progress['rows']:,}".replace(",", ".")
+              + f" | confirmadas: {progress['rows_ok']:,}".replace(",", ".")
+              + f" | reenvios: {progress['retries']:,}".replace(",", ".")
+              + f" | erros: {progress['errors']}"
+              + (f" | concorrência: {progress['concurrency']}" if controller is not None else ""))
+
+    async def run():
+        stats = await load_sales(
+            session, from_blocking(chunks, queue_chunks, gauge="etl_chunk_queue_length"),
+            targets, concurrency=concurrency, batch_rows=batch_rows, batch_bytes=batch_bytes,
+            controller=controller, max_attempts=max_attempts,
+            retry_base_delay=retry_base_delay, on_chunk=on_chunk,
+            report=report or print_progress,
+        )
+        if rollups is not None:
+            await rollups.flush()
+        return stats
+
+    stats = asyncio.run(run())
+    if checkpoint is not None:
+        checkpoint.save()
+    stats["elapsed"] = time.perf_counter() - start
+    return stats
+
+
+def _shard_worker(worker_id, num_workers, config, progress_queue):
+    """
+    Processo worker do modo --workers: abre o próprio Cluster/sessão e
+    carrega, com load_pipelined, apenas o seu shard do arquivo. O progresso
+    e o resultado (com os erros já convertidos em texto) vão para o
+    processo pai pela progress_queue.
+    """
+    try:
+        if config.get("metrics") is not None:
+            path, fmt, interval = config["metrics"]
+            METRICS.enable(worker_metrics_path(path, worker_id), fmt, interval)
+        cluster = connect_cluster(backend=config["backend"], fake_options=config["fake_options"],
+                                  config=config["connection"], role="write")
+        try:
+            session = cluster.connect(config["connection"]["keyspace"])
+            targets = prepare_targets(session, config["table"], config.get("lookups", False))
+            checkpoint = None
+            if config["checkpoint"] is not None:
+                base = LoadCheckpoint(config["checkpoint"], config["source"])
+                checkpoint = LoadCheckpoint(base.part_path(worker_id), config["source"])
+            rollups = None
+            if config["rollups"]:
+                rollups = RollupWriter(session, config["concurrency"],
+                                       config["rollup_flush_rows"], checkpoint=checkpoint)
+            stats = load_pipelined(
+                session, targets,
+                stream_encoded_chunks(config["input"], config["batch_size"], config["max_rows"],
+                                      config["skip"], shard=(worker_id, num_workers),
+                                      year_month=needs_year_month(config["table"])),
+                concurrency=config["concurrency"],
+                controller=(AdaptiveConcurrency(**config["adaptive"])
+                            if config.get("adaptive") else None),
+                batch_rows=config["batch_rows"],
+                batch_bytes=config["batch_bytes"],
+                rollups=rollups,
+                checkpoint=checkpoint,
+                max_attempts=config["max_attempts"],
+                retry_base_delay=config["retry_delay"],
+                report=lambda progress: progress_queue.put(("progress", worker_id, progress)),
+            )
+        finally:
+            cluster.shutdown()
+        stats["error_count"] = len(stats["errors"])
+        stats["errors"] = [(row_id, str(exc))
+                           for row_id, exc in stats["errors"][:WORKER_ERROR_SAMPLE]]
+        stats["rollup_errors"] = len(rollups.errors) if rollups is not None else 0
+        METRICS.close()
+        progress_queue.put(("done", worker_id, stats))
+    except Exception:
+        progress_queue.put(("failed", worker_id, traceback.format_exc()))
+
+
+def load_sharded(config, workers):
+    """
+    Carga multiprocesso: divide o arquivo em `workers` shards (por row group,
+    ou por lote se houver menos row groups que workers) e roda um processo
+    por shard, cada um com seu Cluster, para que a serialização do driver
+    não fique presa ao GIL de um único núcleo. O processo pai só acompanha:
+    soma o progresso dos workers e junta os resultados no mesmo formato de
+    load_pipelined (com `error_count` e uma amostra de `errors`).
+
+    `config` reúne os parâmetros da carga (ver main); os processos são
+    criados com spawn, então tudo nele precisa ser serializável.
+    """
+    start = time.perf_counter()
+    ctx = mp.get_context("spawn")
+    progress_queue = ctx.Queue()
+    procs = [
+        ctx.Process(target=_shard_worker, args=(i, workers, config, progress_queue), daemon=True)
+        for i in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+
+    progress = {}
+    results = {}
+    failures = {}
+    last_print = 0.0
+    while len(results) + len(failures) < workers:
+        try:
+            kind, worker_id, payload = progress_queue.get(timeout=1.0)
+        except queue.Empty:
+            for worker_id, proc in enumerate(procs):
+                if (not proc.is_alive() and worker_id not in results
+                        and worker_id not in failures):
+                    failures[worker_id] = f"processo terminou com código {proc.exitcode}"
+            continue
+
+        if kind == "progress":
+            progress[worker_id] = payload
+            now = time.perf_counter()
+            if now - last_print >= 1.0:
+                last_print = now
+                total = {k: sum(p[k] for p in progress.values())
+                         for k in ("chunks", "rows", "rows_ok", "retries", "errors")}
+                print(f"[ETL] {len(progress)}/{workers} workers | blocos: {total['chunks']}"
+                      + f" | enviadas: {total['rows']:,}".replace(",", ".")
+                      + f" | confirmadas: {total['rows_ok']:,}".replace(",", ".")
+                      + f" | reenvios: {total['retries']:,}".replace(",", ".")
+                      + f" | erros: {total['errors']}"
+                      + (f" | concorrência: {sum(p['concurrency'] for p in progress.values())}"
+                         if config.get("adaptive") else "")
+                      + f" | {total['rows_ok'] / (now - start):,.0f} linhas/s".replace(",", "."))
+        elif kind == "done":
+            results[worker_id] = payload
+        else:
+            failures[worker_id] = payload
+
+    for proc in procs:
+        proc.join()
+
+    for worker_id, detail in sorted(failures.items()):
+        print(f"[ERRO] Worker {worker_id} falhou:\n{detail}")
+
+    stats = {
+        "rows": 0, "rows_ok": 0, "errors": [], "error_count": 0, "retries": 0,
+        "failed_units": 0, "rollup_errors": 0,
+    }
+    for worker_stats in results.values():
+        for name in ("rows", "rows_ok", "error_count", "retries", "failed_units",
+                     "rollup_errors"):
+            stats[name] += worker_stats[name]
+        stats["errors"].extend(worker_stats["errors"])
+    if config.get("adaptive"):
+        summaries = [w["concurrency"] for w in results.values()]
+        stats["concurrency"] = {
+            "final": sum(c["final"] for c in summaries),
+            "min": sum(c["min"] for c in summaries),
+            "max": sum(c["max"] for c in summaries),
+            "changes": sum(c["changes"] for c in summaries),
+        } if summaries else None
+    stats["worker_failures"] = len(failures)
+    stats["elapsed"] = time.perf_counter() - start
+    return stats
+
+
+def load_batch_and_wait(session, prepared, rows, batch_size=10_000, concurrency=100):
+    """
+    Carga original: monta um lote de batch_size linhas, envia com
+    execute_concurrent_with_args e espera o lote inteiro terminar antes de
+    montar o próximo. Mantida para comparação com load_pipelined.
+    """
+    start = time.perf_counter()
+    total_inseridos = 0
+    errors = []
+    for batch_num, batch in enumerate(batched(rows, batch_size), start=1):
+        # execute_concurrent_with_args retorna lista de (success, result/exception)
+        results = execute_concurrent_with_args(
+            session,
+            prepared,
+            batch,
+            concurrency=concurrency,
+            raise_on_first_error=False,
+        )
+
+        # Checar rapidamente se houve algum erro grave no lote
+        erros = [
+            (params[TRANSACTION_ID_POS], r[1])
+            for params, r in zip(batch, results) if not r[0]
+        ]
+        if erros:
+            print(f"[ALERTA] Foram encontrados {len(erros)} erros no lote {batch_num}. "
+                  f"Exemplo do primeiro erro: {erros[0][1]}")
+            errors.extend(erros)
+
+        total_inseridos += len(batch)
+        print(f"[ETL] Lote {batch_num} inserido. Total acumulado: {total_inseridos:,}".replace(",", ".")
+              + f" | pico RSS: {fmt_mb(peak_rss_mb())}")
+
+    return {
+        "rows": total_inseridos,
+        "rows_ok": total_inseridos - len(errors),
+        "errors": errors,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def print_load_report(stats):
+    """Resumo da carga: volume, erros, vazão e pico de memória."""
+    rows_per_s = stats["rows_ok"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    print(f"[ETL] Linhas enviadas: {stats['rows']:,}".replace(",", ".")
+          + f" | gravadas: {stats['rows_ok']:,}".replace(",", ".")
+          + f" | erros: {stats.get('error_count', len(stats['errors']))}")
+    if stats.get("retries"):
+        print(f"[ETL] Reenvios: {stats['retries']:,}".replace(",", ".")
+              + f" | blocos com falha definitiva: {stats['failed_units']}")
+    print(f"[ETL] Tempo: {stats['elapsed']:.1f}s | vazão: {rows_per_s:,.0f} linhas/s".replace(",", "."))
+    if stats.get("concurrency"):
+        c = stats["concurrency"]
+        print(f"[ETL] Concorrência adaptativa: final {c['final']} | mínima {c['min']} "
+              f"| máxima {c['max']} | {c['changes']} ajustes")
+    if stats["errors"]:
+        row_id, exc = stats["errors"][0]
+        print(f"[ALERTA] Exemplo de erro (transaction_id={row_id}): {exc}")
+    print(f"[ETL] Pico de memória do processo (RSS): {fmt_mb(peak_rss_mb())}")
+
+
+def parse_args():
     base_dir = Path(__file__).resolve().parents[1]
+    parser = argparse.ArgumentParser(description="Carga do Parquet do marketplace no Cassandra.")
+    parser.add_argument(
+        "--input", type=Path,
+        default=base_dir / "data" / "raw" / "marketplace_bigdata_1M.parquet",
+        help="arquivo Parquet de entrada",
+    )
+    parser.add_argument(
+        "--mode", choices=["pipeline", "partition-batch", "batch"], default="pipeline",
+        help="pipeline contínuo com INSERTs individuais (padrão), pipeline com "
+             "BATCH UNLOGGED por partição, ou lote-e-espera (modo original)",
+    )
+    parser.add_argument("--table", choices=TABLE_CHOICES, default="base",
+                        help="sales_transactions (base), sales_transactions_by_month "
+                             "(bucketed, partição state + year_month) ou as duas (both, "
+                             "dual-write para migração)")
+    parser.add_argument("--batch-size", type=int, default=10_000,
+                        help="linhas por lote de leitura/envio")
+    parser.add_argument("--concurrency", type=int, default=100,
+                        help="requisições simultâneas em voo (com --adaptive, o valor inicial)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="ajusta a concorrência (AIMD) pela latência e pelos timeouts "
+                             "observados (modos pipeline)")
+    parser.add_argument("--min-concurrency", type=int, default=ADAPTIVE_MIN,
+                        help="limite inferior da concorrência adaptativa")
+    parser.add_argument("--max-concurrency", type=int, default=ADAPTIVE_MAX,
+                        help="limite superior da concorrência adaptativa")
+    parser.add_argument("--target-latency-ms", type=float, default=ADAPTIVE_TARGET_LATENCY * 1000,
+                        help="p90 de latência acima do qual a concorrência é reduzida")
+    parser.add_argument("--concurrency-log", type=Path, default=None,
+                        help="CSV com a evolução da concorrência adaptativa (sem --workers)")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_MAX_ROWS,
+                        help="máximo de linhas por BATCH UNLOGGED (modo partition-batch)")
+    parser.add_argument("--batch-kb", type=float, default=BATCH_MAX_BYTES / 1024,
+                        help="tamanho máximo estimado por BATCH UNLOGGED, em KB")
+    parser.add_argument("--lookups", action="store_true",
+                        help="grava também sales_by_product e sales_by_customer, para "
+                             "consultas por produto/cliente (modos pipeline)")
+    parser.add_argument("--rollups", action="store_true",
+                        help="mantém as tabelas rollup_* durante a carga (modos pipeline)")
+    parser.add_argument("--rollup-flush-rows", type=int, default=ROLLUP_FLUSH_ROWS,
+                        help="linhas acumuladas em memória entre descargas dos rollups")
+    parser.add_argument("--max-rows", type=int, default=None,
+                        help="limita a quantidade de linhas carregadas")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processos de carga, cada um com seu Cluster (modos pipeline)")
+    parser.add_argument("--checkpoint", type=Path, default=None,
+                        help="arquivo de checkpoint (padrão: data/state/load_<arquivo>.json)")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                        help="não grava checkpoint (modos pipeline)")
+    parser.add_argument("--resume", action="store_true",
+                        help="retoma uma carga interrompida, pulando os blocos já concluídos")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS,
+                        help="tentativas por requisição antes de registrar a falha")
+    parser.add_argument("--retry-delay", type=float, default=RETRY_BASE_DELAY,
+                        help="espera do primeiro reenvio, em segundos (dobra a cada tentativa)")
+    add_connection_args(parser)
+    add_backend_args(parser)
+    add_metrics_args(parser)
+    args = parser.parse_args()
+    if args.checkpoint is None:
+        args.checkpoint = base_dir / "data" / "state" / f"load_{args.input.stem}.json"
+    if args.backend == "fake":
+        # os dados do backend fake somem com o processo: não há o que retomar
+        args.no_checkpoint = True
+    return args
+
 
-    # Caminho do arquivo Parquet com 1M de registros
-    data_path = base_dir / "data" / "raw" / "marketplace_bigdata_1M.parquet"
+def main():
+    args = parse_args()
+    data_path = args.input
 
     print("=" * 80)
     print(f"[ETL] Iniciando carga para o Cassandra")
@@ -34,29 +976,36 @@ def main():
     if not data_path.exists():
         print(f"[ERRO] Arquivo não encontrado: {data_path}")
         sys.exit(1)
+    if configure_metrics(args):
+        print(f"[ETL] Métricas em {args.metrics} (a cada {args.metrics_interval:g}s)")
 
     # -------------------------------------------------------------------------
-    # 1) Leitura do arquivo Parquet
+    # 1) Metadados do arquivo Parquet (os dados são lidos em streaming)
     # -------------------------------------------------------------------------
-    print("[ETL] Lendo arquivo Parquet...")
-    df = pd.read_parquet(data_path)
-
-    print(f"[ETL] Registros carregados do arquivo: {len(df):,}".replace(",", "."))
-    print("[ETL] Colunas disponíveis:", list(df.columns))
+    parquet_file = pq.ParquetFile(data_path)
+    total_arquivo = parquet_file.metadata.num_rows
 
-    # Garantir tipos corretos
-    df["purchase_date"] = pd.to_datetime(df["purchase_date"])
+    print(f"[ETL] Registros no arquivo: {total_arquivo:,}".replace(",", "."))
+    print(f"[ETL] Row groups: {parquet_file.metadata.num_row_groups}")
+    print("[ETL] Colunas disponíveis:", parquet_file.schema_arrow.names)
 
     # -------------------------------------------------------------------------
     # 2) Conexão com Cassandra
     # -------------------------------------------------------------------------
-    print("[ETL] Conectando ao cluster Cassandra em localhost:9042 ...")
-    cluster = Cluster(["127.0.0.1"], port=9042)
+    connection = load_connection_config(args.cassandra_config)
+    keyspace = connection["keyspace"]
+    if args.backend == "fake":
+        print(f"[ETL] Usando o Cassandra em processo (fake, latência {args.fake_latency_ms} ms) ...")
+    else:
+        print(f"[ETL] Conectando ao cluster Cassandra em "
+              f"{','.join(connection['hosts'])}:{connection['port']} ...")
+    cluster = connect_cluster(backend=args.backend, fake_options=fake_options(args),
+                              config=connection, role="write")
 
     try:
-        session = cluster.connect("marketplace_ks")
+        session = cluster.connect(keyspace)
     except Exception as e:
-        print("[ERRO] Não foi possível conectar ao keyspace marketplace_ks:")
+        print(f"[ERRO] Não foi possível conectar ao keyspace {keyspace}:")
         print(e)
         cluster.shutdown()
         sys.exit(1)
@@ -64,91 +1013,172 @@ def main():
     print("[ETL] Conexão estabelecida com sucesso.")
 
     # -------------------------------------------------------------------------
-    # 3) Preparar statement de INSERT
+    # 3) Preparar statement(s) de INSERT
     # -------------------------------------------------------------------------
-    insert_cql = """
-        INSERT INTO sales_transactions (
-            state,
-            category,
-            transaction_id,
-            customer_id,
-            product_id,
-            price,
-            quantity,
-            total_value,
-            purchase_date,
-            city,
-            payment_method,
-            device_type,
-            rating
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """
-
-    prepared = session.prepare(insert_cql)
-    print("[ETL] Statement de INSERT preparado.")
+    if args.mode == "batch" and args.table != "base":
+        print("[ALERTA] --table só é suportado nos modos pipeline; usando a tabela original.")
+        args.table = "base"
+    if args.mode == "batch" and args.lookups:
+        print("[ALERTA] --lookups só é suportado nos modos pipeline; ignorado no modo batch.")
+        args.lookups = False
+    targets = prepare_targets(session, args.table, args.lookups)
+    prepared = targets[0].statement
+    print(f"[ETL] Statement(s) de INSERT preparado(s) (--table {args.table}"
+          + (", sales_by_product, sales_by_customer" if args.lookups else "") + ").")
+    if args.table == "both":
+        print("[ETL] Dual-write: cada linha é gravada em sales_transactions e "
+              "sales_transactions_by_month (as contagens abaixo são de escritas).")
+    if args.lookups:
+        print("[ETL] Cada linha é gravada também em sales_by_product e sales_by_customer "
+              "(as contagens abaixo são de escritas).")
 
     # -------------------------------------------------------------------------
-    # 4) Montar os dados como lista de tuplas
+    # 4) Leitura em streaming + inserção
     # -------------------------------------------------------------------------
-    print("[ETL] Montando tuplas para inserção...")
-
-    def row_generator():
-        for row in df.itertuples(index=False):
-            yield (
-                str(row.state),
-                str(row.category),
-                str(row.transaction_id),
-                str(row.customer_id),
-                str(row.product_id),
-                float(row.price),
-                int(row.quantity),
-                float(row.total_value),
-                row.purchase_date.to_pydatetime(),  # datetime nativo
-                str(row.city),
-                str(row.payment_method),
-                str(row.device_type),
-                float(row.rating),
-            )
+    print(f"[ETL] Lendo o Parquet em streaming (lotes de {args.batch_size} linhas, "
+          f"encoder colunar)...")
+    print(f"[ETL] Iniciando inserção no modo '{args.mode}' "
+          f"(concorrência={args.concurrency})...")
 
-    total_inseridos = 0
-    batch_size = 10_000     # quantidade de linhas por lote
-    concurrency = 100       # número de requisições concorrentes por lote
+    if args.mode in ("pipeline", "partition-batch"):
+        checkpoint = None
+        if not args.no_checkpoint:
+            source = LoadCheckpoint.describe_source(data_path, total_arquivo, args.batch_size)
+            source["max_rows"] = args.max_rows
+            source["table"] = args.table
+            if args.lookups:
+                source["lookups"] = True
+            if args.resume:
+                try:
+                    checkpoint = LoadCheckpoint.load(args.checkpoint, source)
+                    # parciais de uma execução anterior com --workers
+                    checkpoint.merge_parts()
+                except ValueError as e:
+                    print(f"[ERRO] Checkpoint inválido ({args.checkpoint}): {e}")
+                    cluster.shutdown()
+                    sys.exit(1)
+                print(f"[ETL] Retomando a partir de {args.checkpoint}: "
+                      f"{len(checkpoint.completed)} blocos concluídos "
+                      f"({checkpoint.rows_done:,} linhas)".replace(",", ".")
+                      + f", {len(checkpoint.failed)} blocos com falha a refazer"
+                      + (f", {len(checkpoint.rollup_pending)} incrementos de rollup pendentes."
+                         if checkpoint.rollup_pending else "."))
+            else:
+                if args.checkpoint.exists():
+                    print(f"[ALERTA] Checkpoint existente será sobrescrito: {args.checkpoint} "
+                          "(use --resume para retomar)")
+                checkpoint = LoadCheckpoint(args.checkpoint, source)
+                checkpoint.discard_parts()
+                checkpoint.save()
+            print(f"[ETL] Checkpoint: {args.checkpoint}")
 
-    print(f"[ETL] Iniciando inserção em lotes de {batch_size} registros "
-          f"(concorrência={concurrency})...")
+        if args.rollups:
+            print("[ETL] Rollups habilitados (flush a cada "
+                  f"{args.rollup_flush_rows:,} linhas).".replace(",", "."))
+        skip = frozenset(checkpoint.completed) if checkpoint is not None else None
+        batch_rows = args.batch_rows if args.mode == "partition-batch" else None
+        adaptive = None
+        if args.adaptive:
+            adaptive = {"initial": args.concurrency, "min_limit": args.min_concurrency,
+                        "max_limit": args.max_concurrency,
+                        "target_latency": args.target_latency_ms / 1000}
+            print(f"[ETL] Concorrência adaptativa: começa em {args.concurrency}, entre "
+                  f"{args.min_concurrency} e {args.max_concurrency}, "
+                  f"p90 alvo de {args.target_latency_ms:g} ms.")
 
-    for batch_num, batch in enumerate(batched(row_generator(), batch_size), start=1):
-        # execute_concurrent_with_args retorna lista de (success, result/exception)
-        results = execute_concurrent_with_args(
-            session,
-            prepared,
-            batch,
-            concurrency=concurrency,
-            raise_on_first_error=False,
+        if args.workers > 1:
+            num_row_groups = parquet_file.metadata.num_row_groups
+            if num_row_groups < args.workers:
+                print(f"[ALERTA] Só {num_row_groups} row group(s) para {args.workers} workers: "
+                      "o arquivo será dividido por lotes e cada worker o lerá inteiro.")
+            print(f"[ETL] Carga multiprocesso: {args.workers} workers "
+                  f"(concorrência={args.concurrency} por worker).")
+            if args.rollups and checkpoint is not None and checkpoint.rollup_pending:
+                # Os parciais dos workers começam vazios: os incrementos
+                # pendentes da execução anterior saem daqui, antes da carga
+                asyncio.run(RollupWriter(session, args.concurrency, checkpoint=checkpoint).flush())
+            stats = load_sharded({
+                "connection": connection, "input": data_path, "table": args.table, "lookups": args.lookups,
+                "backend": args.backend, "fake_options": fake_options(args),
+                "batch_size": args.batch_size, "max_rows": args.max_rows, "skip": skip,
+                "concurrency": args.concurrency, "adaptive": adaptive,
+                "batch_rows": batch_rows, "batch_bytes": int(args.batch_kb * 1024),
+                "rollups": args.rollups, "rollup_flush_rows": args.rollup_flush_rows,
+                "checkpoint": checkpoint.path if checkpoint is not None else None,
+                "source": checkpoint.source if checkpoint is not None else None,
+                "max_attempts": args.max_attempts, "retry_delay": args.retry_delay,
+                "metrics": ((args.metrics, METRICS._format, args.metrics_interval)
+                            if METRICS.enabled else None),
+            }, args.workers)
+            if checkpoint is not None:
+                checkpoint.merge_parts()
+            if stats["rollup_errors"]:
+                print(f"[ALERTA] {stats['rollup_errors']} atualizações de rollup falharam.")
+            if stats["worker_failures"]:
+                print(f"[ALERTA] {stats['worker_failures']} worker(s) falharam; "
+                      "rode novamente com --resume para completar a carga.")
+        else:
+            rollups = None
+            if args.rollups:
+                rollups = RollupWriter(session, args.concurrency, args.rollup_flush_rows,
+                                       checkpoint=checkpoint)
+            controller = AdaptiveConcurrency(**adaptive) if adaptive else None
+            stats = load_pipelined(
+                session, targets,
+                stream_encoded_chunks(data_path, args.batch_size, args.max_rows, skip,
+                                      year_month=needs_year_month(args.table)),
+                concurrency=args.concurrency,
+                batch_rows=batch_rows,
+                batch_bytes=int(args.batch_kb * 1024),
+                rollups=rollups,
+                checkpoint=checkpoint,
+                max_attempts=args.max_attempts,
+                retry_base_delay=args.retry_delay,
+                controller=controller,
+            )
+            if controller is not None and args.concurrency_log is not None:
+                controller.save_history(args.concurrency_log)
+                print(f"[ETL] Evolução da concorrência gravada em {args.concurrency_log}")
+            if rollups is not None and rollups.errors:
+                print(f"[ALERTA] {len(rollups.errors)} atualizações de rollup falharam. "
+                      f"Exemplo: {rollups.errors[0][1]}")
+        if checkpoint is not None and checkpoint.failed:
+            print(f"[ALERTA] {len(checkpoint.failed)} blocos "
+                  f"({checkpoint.failed_rows():,} linhas) falharam após "
+                  f"{args.max_attempts} tentativas; ".replace(",", ".")
+                  + f"transaction_id registrados em {args.checkpoint}. "
+                  "Rode novamente com --resume para refazê-los.")
+    else:
+        if args.rollups:
+            print("[ALERTA] --rollups só é suportado nos modos pipeline; ignorado no modo batch.")
+        if args.resume or args.workers > 1:
+            print("[ALERTA] --resume e --workers só são suportados nos modos pipeline; "
+                  "ignorados no modo batch.")
+        stats = load_batch_and_wait(
+            session, prepared,
+            stream_encoded_rows(data_path, args.batch_size, args.max_rows),
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
         )
 
-        # Checar rapidamente se houve algum erro grave no lote
-        erros = [r for r in results if not r[0]]
-        if erros:
-            print(f"[ALERTA] Foram encontrados {len(erros)} erros no lote {batch_num}. "
-                  f"Exemplo do primeiro erro: {erros[0][1]}")
-            # Para um TCC, logar o erro já é suficiente; não vamos abortar tudo.
-
-        total_inseridos += len(batch)
-        print(f"[ETL] Lote {batch_num} inserido. Total acumulado: {total_inseridos:,}".replace(",", "."))
-
     print("=" * 80)
-    print(f"[ETL] Carga concluída. Total final inserido (estimado): {total_inseridos:,}".replace(",", "."))
+    print("[ETL] Carga concluída.")
+    print_load_report(stats)
+    print_stage_summary("[ETL]")
+    METRICS.close()
 
     # -------------------------------------------------------------------------
     # 5) Validação: SELECT LIMIT 5
     # -------------------------------------------------------------------------
     print("[ETL] Executando SELECT de validação (LIMIT 5)...")
 
+    validation_table = (
+        "sales_transactions_by_month" if args.table == "bucketed" else "sales_transactions"
+    )
     rows = session.execute(
-        """
+        f"""
         SELECT state, category, transaction_id, total_value, purchase_date
-        FROM sales_transactions
+        FROM {validation_table}
         LIMIT 5;
         """
     )
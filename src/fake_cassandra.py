@@ -0,0 +1,909 @@
+import hashlib
+import heapq
+import random
+import re
+import threading
+import time
+import traceback
+from copy import copy
+from itertools import islice
+from operator import itemgetter
+from pathlib import Path
+
+from cassandra import InvalidRequest, OperationTimedOut, ReadTimeout, WriteTimeout
+from cassandra import cqltypes
+from cassandra.cluster import EXEC_PROFILE_DEFAULT, ExecutionProfile, ResultSet
+from cassandra.metadata import Murmur3Token
+from cassandra.protocol import ColumnMetadata
+from cassandra.query import (
+    BatchStatement,
+    BoundStatement,
+    PreparedStatement,
+    named_tuple_factory,
+)
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+SCHEMA_PATH = BASE_DIR / "docker" / "marketplace_schema.cql"
+
+PROTOCOL_VERSION = 4
+
+# Tipo do driver usado para serializar cada tipo CQL do schema
+CQL_TYPES = {
+    "text": cqltypes.UTF8Type,
+    "varchar": cqltypes.UTF8Type,
+    "ascii": cqltypes.AsciiType,
+    "int": cqltypes.Int32Type,
+    "bigint": cqltypes.LongType,
+    "counter": cqltypes.CounterColumnType,
+    "double": cqltypes.DoubleType,
+    "float": cqltypes.FloatType,
+    "boolean": cqltypes.BooleanType,
+    "timestamp": cqltypes.DateType,
+    "uuid": cqltypes.UUIDType,
+}
+
+# Tamanho de página padrão do driver (Session.default_fetch_size)
+DEFAULT_FETCH_SIZE = 5000
+
+_CREATE_TABLE_RE = re.compile(
+    r"CREATE TABLE (?:IF NOT EXISTS )?(\w+) \((.*?)\)(?: WITH CLUSTERING ORDER BY \((.*)\))?$",
+    re.IGNORECASE,
+)
+_INSERT_RE = re.compile(r"INSERT INTO (\w+) \((.*?)\) VALUES \((.*?)\)$", re.IGNORECASE)
+_UPDATE_RE = re.compile(r"UPDATE (\w+) SET (.*?) WHERE (.*)$", re.IGNORECASE)
+_SELECT_RE = re.compile(
+    r"SELECT (DISTINCT )?(.*?) FROM (\w+)(?: WHERE (.*?))?(?: LIMIT (\d+))?( ALLOW FILTERING)?$",
+    re.IGNORECASE,
+)
+_CONDITION_RE = re.compile(r"(token\((.*?)\)|\w+) (=|>=|<=|>|<) (.+)$", re.IGNORECASE)
+_COUNTER_SET_RE = re.compile(r"(\w+) = (\w+) \+ \?$")
+
+
+def _normalize(cql):
+    """Remove comentários, quebras de linha e espaços repetidos de um comando CQL."""
+    cql = re.sub(r"--[^\n]*", "", cql)
+    cql = re.sub(r"\s+", " ", cql).strip().rstrip(";").strip()
+    return re.sub(r"\( ", "(", re.sub(r" \)", ")", cql))
+
+
+def _split_top_level(text, sep=","):
+    """Divide por `sep` ignorando separadores dentro de parênteses."""
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == sep and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+
+def _names(text):
+    return [name.strip() for name in text.split(",") if name.strip()]
+
+
+def _literal(text):
+    """Valor literal de uma condição CQL ('texto', inteiro ou decimal)."""
+    if text.startswith("'") and text.endswith("'"):
+        return text[1:-1].replace("''", "'")
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+class _TableSchema:
+    """Colunas, chave de partição e clustering (com a direção) de uma tabela."""
+
+    def __init__(self, name, columns, partition_key, clustering, descending):
+        self.name = name
+        self.columns = columns  # nome -> tipo CQL, na ordem do CREATE TABLE
+        self.column_names = list(columns)
+        self.position = {name: i for i, name in enumerate(self.column_names)}
+        self.partition_key = partition_key
+        self.clustering = clustering
+        self.descending = tuple(name in descending for name in clustering)
+        self.counters = {name for name, t in columns.items() if t == "counter"}
+        self.pk_getter = self._getter(partition_key)
+        self.ck_getter = self._getter(clustering)
+
+    def _getter(self, names):
+        positions = [self.position[name] for name in names]
+        if not positions:
+            return lambda row: ()
+        if len(positions) == 1:
+            return lambda row, i=positions[0]: (row[i],)
+        return itemgetter(*positions)
+
+    def cql_type(self, name):
+        return CQL_TYPES[self.columns[name]]
+
+
+def parse_schema(path=SCHEMA_PATH):
+    """
+    Lê o arquivo .cql e devolve {keyspace: {tabela: _TableSchema}}. Entende
+    o subconjunto usado no projeto: CREATE KEYSPACE, USE e CREATE TABLE com
+    PRIMARY KEY composta e CLUSTERING ORDER BY.
+    """
+    keyspaces = {}
+    current = None
+    for statement in Path(path).read_text(encoding="utf-8").split(";"):
+        cql = _normalize(statement)
+        keyspace = re.match(r"CREATE KEYSPACE (?:IF NOT EXISTS )?(\w+)", cql, re.IGNORECASE)
+        use = re.match(r"USE (\w+)$", cql, re.IGNORECASE)
+        table = _CREATE_TABLE_RE.match(cql)
+        if keyspace:
+            keyspaces.setdefault(keyspace.group(1), {})
+        elif use:
+            current = keyspaces.setdefault(use.group(1), {})
+        elif table:
+            if current is None:
+                raise ValueError(f"CREATE TABLE {table.group(1)} antes de USE <keyspace>")
+            name, body, order = table.groups()
+            columns, primary_key = {}, None
+            for item in _split_top_level(body):
+                if item.upper().startswith("PRIMARY KEY"):
+                    primary_key = _split_top_level(item[item.index("(") + 1:item.rindex(")")])
+                else:
+                    column, cql_type = item.split()[:2]
+                    columns[column] = cql_type.lower()
+            partition = _names(primary_key[0].strip("()"))
+            descending = set()
+            for item in _split_top_level(order or ""):
+                column, direction = item.split()
+                if direction.upper() == "DESC":
+                    descending.add(column)
+            current[name] = _TableSchema(name, columns, partition, primary_key[1:], descending)
+    return keyspaces
+
+
+def _compare(key, probe, descending):
+    """Compara o início de uma chave de clustering com `probe` na ordem da tabela."""
+    for i, value in enumerate(probe):
+        current = key[i]
+        if current == value:
+            continue
+        less = current < value
+        if descending[i]:
+            less = not less
+        return -1 if less else 1
+    return 0
+
+
+def _search(keys, probe, descending, after):
+    """
+    Busca binária na lista ordenada de chaves: primeira posição cuja chave
+    vem depois de `probe` (after=True) ou não vem antes dele (after=False).
+    """
+    lo, hi = 0, len(keys)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        c = _compare(keys[mid], probe, descending)
+        if c < 0 or (after and c == 0):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class _Partition:
+    """
+    Linhas de uma partição, indexadas pela chave de clustering. A lista de
+    chaves é reordenada só quando alguma leitura precisa dela depois de
+    novas inserções (ordenação estável coluna a coluna, da última para a
+    primeira, com reverse nas colunas DESC).
+    """
+
+    __slots__ = ("token", "rows", "keys", "dirty")
+
+    def __init__(self, token):
+        self.token = token
+        self.rows = {}
+        self.keys = []
+        self.dirty = False
+
+    def sorted_keys(self, descending):
+        if self.dirty:
+            for i in reversed(range(len(descending))):
+                self.keys.sort(key=itemgetter(i), reverse=descending[i])
+            self.dirty = False
+        return self.keys
+
+
+class _Table:
+    """Armazenamento de uma tabela: partições por chave, em ordem de token."""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.partitions = {}
+        self._by_token = []
+        self._dirty = False
+        self._serializers = [schema.cql_type(name) for name in schema.partition_key]
+
+    def token(self, pk):
+        """Token Murmur3 da chave de partição, serializada como no Cassandra."""
+        parts = [t.serialize(v, PROTOCOL_VERSION) for t, v in zip(self._serializers, pk)]
+        if len(parts) == 1:
+            routing_key = parts[0]
+        else:
+            routing_key = b"".join(
+                len(p).to_bytes(2, "big") + p + b"\x00" for p in parts
+            )
+        return Murmur3Token.hash_fn(routing_key)
+
+    def partition(self, pk, create=False):
+        part = self.partitions.get(pk)
+        if part is None and create:
+            part = self.partitions[pk] = _Partition(self.token(pk))
+            self._dirty = True
+        return part
+
+    def upsert(self, values):
+        """INSERT: grava as colunas informadas, preservando as demais da linha."""
+        schema = self.schema
+        row = [None] * len(schema.column_names)
+        for name, value in values.items():
+            row[schema.position[name]] = value
+        row = tuple(row)
+        part = self.partition(schema.pk_getter(row), create=True)
+        ck = schema.ck_getter(row)
+        old = part.rows.get(ck)
+        if old is None:
+            part.keys.append(ck)
+            part.dirty = True
+        elif len(values) < len(row):
+            row = tuple(v if name in values else o
+                        for name, v, o in zip(schema.column_names, row, old))
+        part.rows[ck] = row
+
+    def increment(self, key_values, deltas):
+        """UPDATE de counters: soma os deltas na linha (criada com zeros)."""
+        schema = self.schema
+        row = [None] * len(schema.column_names)
+        for name, value in key_values.items():
+            row[schema.position[name]] = value
+        part = self.partition(schema.pk_getter(row), create=True)
+        ck = schema.ck_getter(row)
+        old = part.rows.get(ck)
+        if old is None:
+            part.keys.append(ck)
+            part.dirty = True
+        else:
+            row = list(old)
+        for name, delta in deltas.items():
+            i = schema.position[name]
+            row[i] = (row[i] or 0) + delta
+        part.rows[ck] = tuple(row)
+
+    def by_token(self):
+        if self._dirty:
+            self._by_token = sorted(self.partitions.items(), key=lambda item: item[1].token)
+            self._dirty = False
+        return self._by_token
+
+
+class _Query:
+    """Comando CQL já interpretado: tipo, tabela e as partes de cada comando."""
+
+    def __init__(self, kind, table, bind_names, **parts):
+        self.kind = kind
+        self.table = table
+        self.bind_names = bind_names  # (coluna, tipo CQL) de cada "?"
+        self.__dict__.update(parts)
+
+
+def _parse_conditions(text, schema, bind_names):
+    """WHERE a = ? AND token(b) > ? ... -> lista de (coluna ou ('token',), op, valor)."""
+    conditions = []
+    if not text:
+        return conditions
+    for item in re.split(r" AND ", text, flags=re.IGNORECASE):
+        match = _CONDITION_RE.match(item.strip())
+        if not match:
+            raise InvalidRequest(f"condição não suportada: {item}")
+        column, token_args, op, value = match.groups()
+        if token_args is not None:
+            if _names(token_args) != schema.partition_key:
+                raise InvalidRequest(f"token() deve receber a chave de partição de {schema.name}")
+            column, cql_type = "token", "bigint"
+        elif column not in schema.columns:
+            raise InvalidRequest(f"coluna desconhecida em {schema.name}: {column}")
+        else:
+            cql_type = schema.columns[column]
+        if value == "?":
+            conditions.append((column, op, len(bind_names)))
+            bind_names.append((column, cql_type))
+        else:
+            conditions.append((column, op, _Literal(_literal(value))))
+    return conditions
+
+
+class _Literal:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def parse_query(cql, tables):
+    """Interpreta INSERT, UPDATE de counters e SELECT no formato usado pelo ETL."""
+    cql = _normalize(cql)
+    insert = _INSERT_RE.match(cql)
+    update = _UPDATE_RE.match(cql)
+    select = _SELECT_RE.match(cql)
+    match = insert or update or select
+    if match is None:
+        raise InvalidRequest(f"comando não suportado pelo FakeCluster: {cql}")
+    table_name = match.group(1) if not select else match.group(3)
+    schema = tables.get(table_name)
+    if schema is None:
+        raise InvalidRequest(f"tabela desconhecida: {table_name}")
+
+    if insert:
+        columns = _names(insert.group(2))
+        if _names(insert.group(3)) != ["?"] * len(columns):
+            raise InvalidRequest("o FakeCluster só aceita INSERT com marcadores ?")
+        missing = set(schema.partition_key + schema.clustering) - set(columns)
+        if missing:
+            raise InvalidRequest(f"INSERT sem colunas da chave primária: {sorted(missing)}")
+        return _Query("insert", schema, [(c, schema.columns[c]) for c in columns], columns=columns)
+
+    if update:
+        bind_names, deltas = [], []
+        for item in _split_top_level(update.group(2)):
+            counter = _COUNTER_SET_RE.match(item)
+            if not counter or counter.group(1) != counter.group(2) \
+                    or counter.group(1) not in schema.counters:
+                raise InvalidRequest(f"o FakeCluster só aceita UPDATE de counter: {item}")
+            deltas.append(counter.group(1))
+            bind_names.append((counter.group(1), "counter"))
+        conditions = _parse_conditions(update.group(3), schema, bind_names)
+        key_columns = [c for c, op, _ in conditions if op == "="]
+        if sorted(key_columns) != sorted(schema.partition_key + schema.clustering):
+            raise InvalidRequest("UPDATE deve informar a chave primária completa com =")
+        return _Query("update", schema, bind_names, deltas=deltas, conditions=conditions)
+
+    distinct, columns, _, where, limit, allow_filtering = select.groups()
+    columns = schema.column_names if columns.strip() == "*" else _names(columns)
+    for column in columns:
+        if column not in schema.columns:
+            raise InvalidRequest(f"coluna desconhecida em {schema.name}: {column}")
+    if distinct and set(columns) - set(schema.partition_key):
+        raise InvalidRequest("SELECT DISTINCT só aceita colunas da chave de partição")
+    bind_names = []
+    conditions = _parse_conditions(where, schema, bind_names)
+    query = _Query("select", schema, bind_names, columns=columns, distinct=bool(distinct),
+                   conditions=conditions, limit=int(limit) if limit else None)
+    _plan_select(query, bool(allow_filtering))
+    return query
+
+
+def _plan_select(query, allow_filtering):
+    """
+    Separa as condições do SELECT como o Cassandra faz: chave de partição
+    completa (=), faixa de token, prefixo de clustering (=) seguido de uma
+    faixa na coluna seguinte; o que sobra é filtro linha a linha e exige
+    ALLOW FILTERING.
+    """
+    schema = query.table
+    by_column = {}
+    for column, op, value in query.conditions:
+        by_column.setdefault(column, []).append((op, value))
+
+    query.partition = None
+    if all(by_column.get(c, [("", None)])[0][0] == "=" for c in schema.partition_key):
+        query.partition = [by_column.pop(c)[0][1] for c in schema.partition_key]
+    query.token_bounds = by_column.pop("token", [])
+
+    query.prefix, query.slice_bounds = [], []
+    for column in schema.clustering:
+        restrictions = by_column.get(column)
+        if not restrictions:
+            break
+        if len(restrictions) == 1 and restrictions[0][0] == "=":
+            query.prefix.append(by_column.pop(column)[0][1])
+            continue
+        if all(op != "=" for op, _ in restrictions):
+            query.slice_bounds = by_column.pop(column)
+        break
+
+    query.filters = [(query.table.position[c], op, v)
+                     for c, restrictions in by_column.items() for op, v in restrictions]
+    needs_filtering = query.filters or (
+        query.partition is None and (query.prefix or query.slice_bounds)
+    )
+    if needs_filtering and not allow_filtering:
+        raise InvalidRequest(
+            "Cannot execute this query as it might involve data filtering and thus may "
+            "have unpredictable performance. If you want to execute this query despite "
+            "the performance unpredictability, use ALLOW FILTERING"
+        )
+
+
+_OPS = {
+    "=": lambda a, b: a == b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+
+
+def _value(value, params):
+    return value.value if isinstance(value, _Literal) else params[value]
+
+
+class FakeStore:
+    """Dados de todas as tabelas de um keyspace, protegidos por um lock."""
+
+    def __init__(self, schemas):
+        self.tables = {name: _Table(schema) for name, schema in schemas.items()}
+        self.schemas = schemas
+        self.lock = threading.RLock()
+
+    def apply(self, query, params):
+        """Executa INSERT/UPDATE; para SELECT devolve um iterador das linhas."""
+        if query.kind == "select":
+            return self._select(query, params)
+        table = self.tables[query.table.name]
+        with self.lock:
+            if query.kind == "insert":
+                table.upsert(dict(zip(query.columns, params)))
+            else:
+                n = len(query.deltas)
+                key_values = {column: _value(v, params) for column, _, v in query.conditions}
+                table.increment(key_values, dict(zip(query.deltas, params[:n])))
+        return None
+
+    def _select(self, query, params):
+        schema = query.table
+        table = self.tables[schema.name]
+        with self.lock:
+            if query.partition is not None:
+                pk = tuple(_value(v, params) for v in query.partition)
+                part = table.partition(pk)
+                partitions = [(pk, part)] if part is not None else []
+            else:
+                partitions = table.by_token()
+                for op, value in query.token_bounds:
+                    bound = _value(value, params)
+                    partitions = [(pk, p) for pk, p in partitions if _OPS[op](p.token, bound)]
+
+            if query.distinct:
+                getter = itemgetter(*[schema.partition_key.index(c) for c in query.columns])
+                rows = [getter(pk) if len(query.columns) > 1 else (getter(pk),)
+                        for pk, _ in partitions]
+                return iter(rows[:query.limit] if query.limit else rows)
+
+            # Faixa de cada partição decidida sob o lock; a leitura das linhas
+            # segue sobre cópias das listas de chaves
+            prefix = tuple(_value(v, params) for v in query.prefix)
+            bounds = [(op, _value(v, params)) for op, v in query.slice_bounds]
+            slices = []
+            for _, part in partitions:
+                keys = part.sorted_keys(schema.descending)
+                start, end = self._clustering_range(keys, prefix, bounds, schema.descending)
+                if start < end:
+                    slices.append((part.rows, keys[start:end]))
+
+        project = itemgetter(*[schema.position[c] for c in query.columns])
+        single = len(query.columns) == 1
+        filters = [(i, _OPS[op], _value(v, params)) for i, op, v in query.filters]
+
+        def rows():
+            for part_rows, keys in slices:
+                for key in keys:
+                    row = part_rows[key]
+                    if filters and not all(op(row[i], v) for i, op, v in filters):
+                        continue
+                    yield (project(row),) if single else project(row)
+
+        return islice(rows(), query.limit) if query.limit else rows()
+
+    @staticmethod
+    def _clustering_range(keys, prefix, bounds, descending):
+        """Posições [início, fim) das chaves com o prefixo e dentro da faixa."""
+        start, end = 0, len(keys)
+        if prefix:
+            start = _search(keys, prefix, descending, after=False)
+            end = _search(keys, prefix, descending, after=True)
+        k = len(prefix)
+        for op, value in bounds:
+            probe = prefix + (value,)
+            # em coluna DESC, "maior que" fica antes na ordem da partição
+            lower = (op in (">", ">=")) != descending[k]
+            after = op in (">", "<=") if not descending[k] else op in ("<", ">=")
+            position = _search(keys, probe, descending, after=after)
+            if lower:
+                start = max(start, position)
+            else:
+                end = min(end, position)
+        return start, end
+
+
+class _Reactor(threading.Thread):
+    """
+    Thread única que executa as requisições assíncronas no instante devido
+    (agora + latência) e dispara os callbacks, como o event loop do driver.
+    """
+
+    def __init__(self):
+        super().__init__(name="fake-cassandra-reactor", daemon=True)
+        self._heap = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def schedule(self, delay, fn):
+        with self._cond:
+            self._seq += 1
+            heapq.heappush(self._heap, (time.monotonic() + delay, self._seq, fn))
+            if self._heap[0][1] == self._seq:
+                self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if self._heap:
+                        delay = self._heap[0][0] - time.monotonic()
+                        if delay <= 0:
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+                if self._stopped:
+                    return
+                fn = heapq.heappop(self._heap)[2]
+            try:
+                fn()
+            except Exception:
+                # erro num callback do ETL: registra e mantém o reator vivo
+                traceback.print_exc()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+
+class FakeResponseFuture:
+    """
+    Equivalente ao ResponseFuture do driver: result(), callbacks e
+    paginação (has_more_pages / start_fetching_next_page).
+    """
+
+    _continuous_paging_session = None
+
+    def __init__(self, session, query, params, row_factory, fetch_size):
+        self.session = session
+        self.query = query
+        self.params = params
+        self.row_factory = row_factory
+        self.fetch_size = fetch_size
+        self._col_names = query.columns if query is not None and query.kind == "select" else None
+        self._col_types = None
+        self._rows = None
+        self._lookahead = None
+        self.has_more_pages = False
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._final_result = None
+        self._final_exception = None
+        self._callbacks = []
+        self._errbacks = []
+
+    def _run(self, operation, timed_out=False):
+        """Executa a operação no reator e entrega o resultado."""
+        self.session.cluster.finished()
+        try:
+            if timed_out:
+                if self.query is not None and self.query.kind == "select":
+                    raise ReadTimeout("FakeCluster sobrecarregado (timeout de leitura)")
+                raise WriteTimeout("FakeCluster sobrecarregado (timeout de escrita)")
+            if self.session.cluster.should_fail():
+                raise OperationTimedOut("falha injetada pelo FakeCluster")
+            result = operation()
+        except Exception as exc:
+            self._set_exception(exc)
+        else:
+            self._set_result(result)
+
+    def _first_page(self):
+        if self.query is None:
+            return None
+        rows = self.session.cluster.store.apply(self.query, self.params)
+        if rows is None:
+            return None
+        self._rows = rows
+        return self._next_page()
+
+    def _next_page(self):
+        page = []
+        if self._lookahead is not None:
+            page.append(self._lookahead)
+            self._lookahead = None
+        page.extend(islice(self._rows, self.fetch_size - len(page)))
+        self._lookahead = next(self._rows, None)
+        self.has_more_pages = self._lookahead is not None
+        return self.row_factory(self._col_names, page)
+
+    def start_fetching_next_page(self):
+        if not self.has_more_pages:
+            raise Exception("No more pages to fetch")
+        with self._lock:
+            self._event.clear()
+            self._final_result = None
+            self._final_exception = None
+        self.session.cluster.dispatch(self, self._next_page)
+
+    def _set_result(self, result):
+        with self._lock:
+            self._final_result = result
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for fn, args, kwargs in callbacks:
+            fn(result, *args, **kwargs)
+
+    def _set_exception(self, exc):
+        with self._lock:
+            self._final_exception = exc
+            self._event.set()
+            errbacks = list(self._errbacks)
+        for fn, args, kwargs in errbacks:
+            fn(exc, *args, **kwargs)
+
+    def result(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise OperationTimedOut("tempo esgotado esperando o FakeCluster")
+        if self._final_exception is not None:
+            raise self._final_exception
+        return ResultSet(self, self._final_result)
+
+    def add_callback(self, fn, *args, **kwargs):
+        with self._lock:
+            self._callbacks.append((fn, args, kwargs))
+            done = self._event.is_set() and self._final_exception is None
+        if done:
+            fn(self._final_result, *args, **kwargs)
+        return self
+
+    def add_errback(self, fn, *args, **kwargs):
+        with self._lock:
+            self._errbacks.append((fn, args, kwargs))
+            failed = self._event.is_set() and self._final_exception is not None
+        if failed:
+            fn(self._final_exception, *args, **kwargs)
+        return self
+
+    def add_callbacks(self, callback, errback, callback_args=(), callback_kwargs=None,
+                      errback_args=(), errback_kwargs=None):
+        self.add_callback(callback, *callback_args, **(callback_kwargs or {}))
+        self.add_errback(errback, *errback_args, **(errback_kwargs or {}))
+
+    def clear_callbacks(self):
+        with self._lock:
+            self._callbacks = []
+            self._errbacks = []
+
+
+class FakeSession:
+    """Sessão do FakeCluster, com a mesma interface usada do driver."""
+
+    def __init__(self, cluster, keyspace):
+        self.cluster = cluster
+        self.keyspace = keyspace
+        self.default_fetch_size = DEFAULT_FETCH_SIZE
+        self._queries = {}  # query_id -> _Query dos statements preparados
+
+    def prepare(self, query):
+        parsed = parse_query(query, self.cluster.schemas)
+        query_id = hashlib.md5(_normalize(query).encode("utf-8")).digest()
+        self._queries[query_id] = parsed
+        column_metadata = [
+            ColumnMetadata(self.keyspace, parsed.table.name, name, CQL_TYPES[cql_type])
+            for name, cql_type in parsed.bind_names
+        ]
+        return PreparedStatement(column_metadata, query_id, None, query, self.keyspace,
+                                 PROTOCOL_VERSION, None, None)
+
+    def _resolve(self, statement, params):
+        """(query, parâmetros) de cada statement; BATCH vira uma lista deles."""
+        if isinstance(statement, str):
+            if params:
+                raise InvalidRequest("o FakeCluster só aceita parâmetros em statements preparados")
+            return parse_query(statement, self.cluster.schemas), ()
+        if isinstance(statement, PreparedStatement):
+            # bind como no driver real: serializa no cliente e valida os tipos
+            statement.bind(params)
+            return self._queries[statement.query_id], tuple(params)
+        if isinstance(statement, BoundStatement):
+            return self._bound(statement.prepared_statement.query_id, statement.values)
+        if isinstance(statement, BatchStatement):
+            return [
+                self._bound(query_id, values) if is_prepared
+                else (parse_query(query_id, self.cluster.schemas), ())
+                for is_prepared, query_id, values in statement._statements_and_parameters
+            ], None
+        return parse_query(statement.query_string, self.cluster.schemas), ()
+
+    def _bound(self, query_id, values):
+        query = self._queries[query_id]
+        params = tuple(
+            CQL_TYPES[cql_type].from_binary(value, PROTOCOL_VERSION)
+            for (_, cql_type), value in zip(query.bind_names, values)
+        )
+        return query, params
+
+    def _maybe_get_execution_profile(self, execution_profile):
+        if isinstance(execution_profile, ExecutionProfile):
+            return execution_profile
+        return self.cluster.profiles[execution_profile]
+
+    def execution_profile_clone_update(self, ep, **kwargs):
+        clone = copy(self._maybe_get_execution_profile(ep))
+        for attr, value in kwargs.items():
+            setattr(clone, attr, value)
+        return clone
+
+    def execute_async(self, query, parameters=None, timeout=None,
+                      execution_profile=EXEC_PROFILE_DEFAULT, **kwargs):
+        profile = self._maybe_get_execution_profile(execution_profile)
+        fetch_size = getattr(query, "fetch_size", None)
+        if not isinstance(fetch_size, int):  # statement sem fetch_size próprio
+            fetch_size = self.default_fetch_size
+        resolved, params = self._resolve(query, parameters)
+        if isinstance(resolved, list):
+            future = FakeResponseFuture(self, None, None, profile.row_factory, fetch_size)
+            store = self.cluster.store
+
+            def operation():
+                for batch_query, batch_params in resolved:
+                    store.apply(batch_query, batch_params)
+        else:
+            future = FakeResponseFuture(self, resolved, params, profile.row_factory, fetch_size)
+            operation = future._first_page
+        self.cluster.dispatch(future, operation)
+        return future
+
+    def execute(self, query, parameters=None, timeout=None,
+                execution_profile=EXEC_PROFILE_DEFAULT, **kwargs):
+        return self.execute_async(query, parameters, timeout, execution_profile).result()
+
+    def shutdown(self):
+        pass
+
+
+class FakeCluster:
+    """
+    Cassandra em processo, no lugar do cassandra.cluster.Cluster, para medir
+    e testar o ETL sem o cluster do docker-compose.yml. As tabelas vêm do
+    próprio marketplace_schema.cql e os SELECTs por partição, por faixa de
+    clustering e por faixa de token devolvem o mesmo que o cluster real.
+
+    As respostas saem de uma thread reator (o papel do event loop do
+    driver) depois de latency_ms + um jitter aleatório de até jitter_ms;
+    error_rate faz essa fração das requisições falhar com OperationTimedOut.
+
+    capacity simula um cluster saturado: acima de `capacity` requisições
+    pendentes a latência cresce na proporção (fila no coordenador), e a
+    requisição cuja espera passaria de timeout_ms falha nesse instante com
+    WriteTimeout/ReadTimeout, como o write_request_timeout do servidor.
+    O bind dos statements preparados continua no cliente, mas o "servidor"
+    divide o processo (e o GIL) com o ETL: as vazões servem para comparar
+    versões do código, não para estimar a vazão de produção.
+
+    Todas as sessões de um mesmo FakeCluster compartilham os dados; cada
+    processo tem o seu.
+    """
+
+    def __init__(self, schema_path=SCHEMA_PATH, latency_ms=0.0, jitter_ms=0.0,
+                 error_rate=0.0, seed=None, capacity=0, timeout_ms=2000.0):
+        self.keyspaces = parse_schema(schema_path)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.timeout = timeout_ms / 1000
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.profiles = {EXEC_PROFILE_DEFAULT: ExecutionProfile(row_factory=named_tuple_factory)}
+        self.schemas = None
+        self.store = None
+        self._stores = {}
+        self._reactor = _Reactor()
+        self._reactor.start()
+
+    def connect(self, keyspace=None):
+        if keyspace not in self.keyspaces:
+            raise InvalidRequest(f"Keyspace '{keyspace}' does not exist")
+        if keyspace not in self._stores:
+            self._stores[keyspace] = FakeStore(self.keyspaces[keyspace])
+        self.schemas = self.keyspaces[keyspace]
+        self.store = self._stores[keyspace]
+        return FakeSession(self, keyspace)
+
+    def delay(self):
+        if not self.jitter:
+            return self.latency
+        return self.latency + self._random.uniform(0, self.jitter)
+
+    def should_fail(self):
+        return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def dispatch(self, future, operation):
+        delay = self.delay()
+        with self._pending_lock:
+            self.pending += 1
+            pending = self.pending
+        if self.capacity and pending > self.capacity:
+            delay *= pending / self.capacity
+            if delay > self.timeout:
+                self._reactor.schedule(self.timeout, lambda: future._run(operation, True))
+                return
+        self._reactor.schedule(delay, lambda: future._run(operation))
+
+    def finished(self):
+        with self._pending_lock:
+            self.pending -= 1
+
+    def shutdown(self):
+        self._reactor.stop()
+
+
+def add_backend_args(parser):
+    """Opções de linha de comando para escolher o cluster real ou o FakeCluster."""
+    parser.add_argument("--backend", choices=("cassandra", "fake"), default="cassandra",
+                        help="cluster real ou Cassandra em processo (fake_cassandra.py)")
+    parser.add_argument("--fake-latency-ms", type=float, default=0.0,
+                        help="latência de cada requisição no backend fake")
+    parser.add_argument("--fake-jitter-ms", type=float, default=0.0,
+                        help="variação aleatória somada à latência no backend fake")
+    parser.add_argument("--fake-error-rate", type=float, default=0.0,
+                        help="fração de requisições que falham no backend fake")
+    parser.add_argument("--fake-capacity", type=int, default=0,
+                        help="requisições simultâneas que o backend fake atende sem "
+                             "aumentar a latência (0 = sem limite)")
+    parser.add_argument("--fake-timeout-ms", type=float, default=2000.0,
+                        help="espera acima da qual o backend fake sobrecarregado "
+                             "responde WriteTimeout/ReadTimeout")
+
+
+def fake_options(args):
+    """kwargs do FakeCluster a partir das opções de add_backend_args."""
+    return {
+        "latency_ms": args.fake_latency_ms,
+        "jitter_ms": args.fake_jitter_ms,
+        "error_rate": args.fake_error_rate,
+        "capacity": args.fake_capacity,
+        "timeout_ms": args.fake_timeout_ms,
+    }
+
+
+def preload_parquet(session, path, max_rows=None, table="base", rollups=False, lookups=False):
+    """
+    Carrega um Parquet no FakeCluster com o próprio loader (etl_cassandra),
+    para que a análise tenha o que ler (com lookups=True, também as tabelas
+    de consulta por produto e cliente). Devolve as estatísticas da carga.
+    """
+    from etl_cassandra import (
+        RollupWriter,
+        load_pipelined,
+        needs_year_month,
+        prepare_targets,
+        stream_encoded_chunks,
+    )
+
+    return load_pipelined(
+        session, prepare_targets(session, table, lookups),
+        stream_encoded_chunks(path, max_rows=max_rows, year_month=needs_year_month(table)),
+        rollups=RollupWriter(session) if rollups else None,
+        report=lambda progress: None,
+    )
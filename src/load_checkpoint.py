@@ -0,0 +1,161 @@
+import json
+import os
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+
+CHECKPOINT_VERSION = 1
+
+
+def unit_key(row_group, batch_index):
+    """Identificador estável de um bloco: row group do Parquet + índice do lote nele."""
+    return f"{row_group}:{batch_index}"
+
+
+class LoadCheckpoint:
+    """
+    Registro dos blocos já gravados de uma carga. Cada bloco é identificado
+    por unit_key(row_group, lote); como os INSERTs são upserts, refazer um
+    bloco é seguro, então só entram aqui os blocos confirmados por inteiro.
+    Blocos com linhas que falharam mesmo após os reenvios ficam em `failed`
+    (com os transaction_id) e são refeitos por completo no --resume.
+
+    Os rollups são incrementos de counter e não podem ser refeitos: os
+    UPDATEs que falham ficam em `rollup_pending` como [tabela, parâmetros]
+    e só eles são reenviados no --resume (ver RollupWriter).
+
+    O arquivo é JSON e identifica a entrada (nome, tamanho, linhas e
+    tamanho de lote): retomar com outro arquivo ou outro --batch-size
+    geraria chaves diferentes, e por isso é recusado.
+    """
+
+    def __init__(self, path, source, save_interval=5.0):
+        self.path = Path(path)
+        self.source = source
+        self.save_interval = save_interval
+        self.completed = set()
+        self.failed = {}
+        self.rollup_pending = []
+        self.rows_done = 0
+        self._last_save = time.monotonic()
+
+    @staticmethod
+    def describe_source(input_path, num_rows, batch_size):
+        """Metadados que amarram o checkpoint ao arquivo e ao tamanho de lote."""
+        input_path = Path(input_path)
+        return {
+            "input": input_path.name,
+            "input_bytes": input_path.stat().st_size,
+            "num_rows": num_rows,
+            "batch_size": batch_size,
+        }
+
+    @classmethod
+    def load(cls, path, source, save_interval=5.0):
+        """
+        Lê um checkpoint existente. Lança ValueError se ele foi gerado para
+        outra entrada; retorna um checkpoint vazio se o arquivo não existir.
+        """
+        checkpoint = cls(path, source, save_interval)
+        if not checkpoint.path.exists():
+            return checkpoint
+        with open(checkpoint.path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != CHECKPOINT_VERSION:
+            raise ValueError(f"versão de checkpoint não suportada: {data.get('version')}")
+        if data["source"] != source:
+            raise ValueError(
+                f"checkpoint gerado para outra entrada: {data['source']} (atual: {source})"
+            )
+        checkpoint.completed = set(data["completed"])
+        checkpoint.failed = {key: list(ids) for key, ids in data["failed"].items()}
+        checkpoint.rows_done = data["rows_done"]
+        checkpoint.rollup_pending = data.get("rollup_pending", [])
+        return checkpoint
+
+    def part_path(self, worker_id):
+        """Arquivo de checkpoint próprio de um worker do modo --workers."""
+        return self.path.with_name(f"{self.path.stem}.part{worker_id}{self.path.suffix}")
+
+    def merge_parts(self):
+        """
+        Incorpora ao checkpoint os arquivos parciais gravados pelos workers
+        (<nome>.part<N>.json) e os remove. Os parciais só contêm blocos
+        novos, então a união dos conjuntos basta; um bloco concluído num
+        parcial deixa de constar como falho. Os incrementos de rollup
+        pendentes de cada parcial são somados aos do checkpoint.
+        """
+        parts = self._part_paths()
+        for part_path in parts:
+            part = LoadCheckpoint.load(part_path, self.source)
+            self.completed |= part.completed
+            self.rows_done += part.rows_done
+            self.failed.update(part.failed)
+            self.rollup_pending.extend(part.rollup_pending)
+        for key in self.completed.intersection(self.failed):
+            del self.failed[key]
+        if parts:
+            self.save()
+            for part_path in parts:
+                part_path.unlink()
+        return len(parts)
+
+    def discard_parts(self):
+        """Remove parciais de uma carga anterior (usado ao recomeçar do zero)."""
+        for part_path in self._part_paths():
+            part_path.unlink()
+
+    def _part_paths(self):
+        return sorted(self.path.parent.glob(f"{self.path.stem}.part*{self.path.suffix}"))
+
+    def mark_done(self, key, rows):
+        if key not in self.completed:
+            self.completed.add(key)
+            self.rows_done += rows
+        self.failed.pop(key, None)
+
+    def mark_failed(self, key, row_ids):
+        self.failed[key] = list(row_ids)
+
+    def failed_rows(self):
+        return sum(len(ids) for ids in self.failed.values())
+
+    def save(self):
+        """Grava o checkpoint de forma atômica (arquivo temporário + os.replace)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+            "source": self.source,
+            "rows_done": self.rows_done,
+            "completed": sorted(self.completed),
+            "failed": self.failed,
+            "rollup_pending": self.rollup_pending,
+        }
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+
+    def maybe_save(self):
+        """Grava se já passou save_interval segundos desde a última gravação."""
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+
+class RetryBackoff:
+    """
+    Backoff exponencial dos reenvios: a tentativa n espera
+    base_delay * 2**(n-1) segundos (limitado a max_delay, com um pequeno
+    jitter para não reenviar tudo no mesmo instante).
+    """
+
+    def __init__(self, base_delay=0.5, max_delay=30.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay_for(self, attempt):
+        delay = min(self.max_delay, self.base_delay * 2 ** max(attempt - 1, 0))
+        return delay * random.uniform(1.0, 1.2)
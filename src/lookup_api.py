@@ -0,0 +1,176 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from cassandra.cluster import EXEC_PROFILE_DEFAULT
+
+from cassandra_session import prepare_cached
+from etl_analysis import columnar_page_factory
+from etl_cassandra import INSERT_COLUMNS, LOOKUP_TABLES
+
+# Colunas devolvidas pelas consultas (a venda inteira, na ordem do INSERT)
+LOOKUP_COLUMNS = [name for name, _ in INSERT_COLUMNS]
+_CQL_TYPES = dict(INSERT_COLUMNS)
+
+# Linhas por página nas partições grandes (produtos/clientes muito ativos)
+LOOKUP_FETCH_SIZE = 5000
+
+
+class SalesLookup:
+    """
+    Consultas por chave nas tabelas sales_by_product e sales_by_customer
+    (gravadas pelo loader com --lookups). Cada chave é uma leitura de uma
+    única partição; muitas chaves são consultadas ao mesmo tempo com
+    execute_async e statements preparados, mantendo até `concurrency`
+    consultas em voo. As páginas chegam transpostas (columnar_page_factory)
+    e o resultado volta como DataFrame com colunas NumPy tipadas.
+
+    Depois de cada chamada, `latencies` traz a latência de cada chave (em
+    segundos, da submissão à última página) e `errors` as chaves que
+    falharam, como (chave, exceção); elas ficam fora do resultado.
+    """
+
+    def __init__(self, session, concurrency=128, fetch_size=LOOKUP_FETCH_SIZE):
+        self.session = session
+        self.concurrency = concurrency
+        self.fetch_size = fetch_size
+        self.profile = session.execution_profile_clone_update(
+            EXEC_PROFILE_DEFAULT, row_factory=columnar_page_factory
+        )
+        self._statements = {}
+        self.latencies = np.empty(0)
+        self.errors = []
+
+    def product_sales(self, product_ids, since=None, until=None, limit=None):
+        """Vendas de cada produto, da mais recente para a mais antiga."""
+        return self.lookup("sales_by_product", product_ids, since, until, limit)
+
+    def customer_history(self, customer_ids, since=None, until=None, limit=None):
+        """Histórico de compras de cada cliente, da mais recente para a mais antiga."""
+        return self.lookup("sales_by_customer", customer_ids, since, until, limit)
+
+    def product_stats(self, product_ids, since=None, until=None):
+        """
+        Preço médio, rating médio, receita e número de vendas por produto,
+        calculados só com as partições pedidas (sem varrer a tabela de vendas).
+        """
+        df = self.product_sales(product_ids, since, until)
+        return (
+            df.groupby("product_id", sort=True)
+            .agg(avg_price=("price", "mean"), avg_rating=("rating", "mean"),
+                 total_revenue=("total_value", "sum"), num_transactions=("price", "size"))
+            .reset_index()
+        )
+
+    def lookup(self, table, keys, since=None, until=None, limit=None):
+        """
+        Lê a partição de cada chave de `table` (uma das LOOKUP_TABLES).
+        since/until limitam purchase_date ao intervalo [since, until) e
+        limit, as linhas por chave (as mais recentes).
+        """
+        if table not in LOOKUP_TABLES:
+            raise ValueError(f"tabela de consulta desconhecida: {table}")
+        statement = self._statement(table, since is not None, until is not None, limit)
+        extra = tuple(d for d in (since, until) if d is not None)
+        keys = list(keys)
+        pages = self._execute_many(statement, [(key,) + extra for key in keys])
+        return self._to_dataframe(pages)
+
+    def _statement(self, table, has_since, has_until, limit):
+        # Um statement preparado por combinação de filtros (o LIMIT vai no texto)
+        cache_key = (table, has_since, has_until, limit)
+        if cache_key not in self._statements:
+            key_column = LOOKUP_COLUMNS[LOOKUP_TABLES[table]]
+            cql = f"SELECT {', '.join(LOOKUP_COLUMNS)} FROM {table} WHERE {key_column} = ?"
+            if has_since:
+                cql += " AND purchase_date >= ?"
+            if has_until:
+                cql += " AND purchase_date < ?"
+            if limit is not None:
+                cql += f" LIMIT {int(limit)}"
+            statement = prepare_cached(self.session, cql)
+            statement.fetch_size = self.fetch_size
+            self._statements[cache_key] = statement
+        return self._statements[cache_key]
+
+    def _execute_many(self, statement, params_list):
+        """
+        Executa um SELECT por item de params_list com até `concurrency`
+        consultas em voo. Retorna, por item, a lista de páginas recebidas.
+        """
+        n = len(params_list)
+        pages = [[] for _ in range(n)]
+        latencies = np.full(n, np.nan)
+        errors = []
+        slots = threading.Semaphore(self.concurrency)
+        lock = threading.Lock()
+        done = threading.Event()
+        remaining = [n]
+
+        def finish(i, start):
+            latencies[i] = time.perf_counter() - start
+            slots.release()
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    done.set()
+
+        def on_page(page, future, i, start):
+            # Uma exceção aqui nunca chegaria a on_error e done.wait() não voltaria
+            try:
+                pages[i].append(page)
+                if future.has_more_pages:
+                    future.start_fetching_next_page()
+                    return
+            except Exception as exc:
+                # uma página que ainda chegue não pode fechar a chave de novo
+                future.clear_callbacks()
+                on_error(exc, future, i, start)
+                return
+            finish(i, start)
+
+        def on_error(exc, _future, i, start):
+            with lock:
+                errors.append((params_list[i][0], exc))
+            pages[i] = []
+            finish(i, start)
+
+        if not n:
+            done.set()
+        for i, params in enumerate(params_list):
+            slots.acquire()
+            start = time.perf_counter()
+            try:
+                future = self.session.execute_async(statement, params,
+                                                    execution_profile=self.profile)
+            except Exception as exc:
+                on_error(exc, None, i, start)
+                continue
+            future.add_callbacks(on_page, on_error,
+                                 callback_args=(future, i, start),
+                                 errback_args=(future, i, start))
+        done.wait()
+        self.latencies = latencies
+        self.errors = errors
+        return pages
+
+    @staticmethod
+    def _to_dataframe(pages):
+        columns = [[] for _ in LOOKUP_COLUMNS]
+        for key_pages in pages:
+            for page in key_pages:
+                for values, column in zip(page, columns):
+                    column.extend(values)
+        data = {}
+        for name, values in zip(LOOKUP_COLUMNS, columns):
+            cql_type = _CQL_TYPES[name]
+            if cql_type == "double":
+                data[name] = np.array(values, dtype=np.float64)
+            elif cql_type == "int":
+                data[name] = np.array(values, dtype=np.int64)
+            elif cql_type == "timestamp":
+                data[name] = pd.DatetimeIndex(values).as_unit("ms").values
+            else:
+                data[name] = np.array(values, dtype=object)
+        return pd.DataFrame(data)
@@ -0,0 +1,345 @@
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from pathlib import Path
+
+
+def peak_rss_mb(children=False):
+    """
+    Pico de memória residente (RSS) do processo atual, em MB.
+    Com children=True, o do maior processo filho já encerrado (ex.: um
+    pool de processos). Retorna None quando a plataforma não oferece essa
+    informação (ex.: Windows sem o pacote psutil).
+    """
+    try:
+        import resource
+    except ImportError:
+        if children:
+            return None
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux informa em KB; macOS em bytes
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def fmt_mb(value):
+    """Formata um valor em MB para os logs (ou 'n/d' se indisponível)."""
+    return "n/d" if value is None else f"{value:.1f} MB"
+
+
+# Limites (em segundos) dos buckets do histograma de latência, no estilo
+# do Prometheus: de 0,5 ms a 10 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_FORMATS = ("prometheus", "jsonl")
+
+
+class _Histogram:
+    """Contagem por bucket (não cumulativa), soma e total de observações."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimativa do quantil q por interpolação linear dentro do bucket."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= target and n:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (target - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+
+class _NullTimer:
+    """Context manager vazio devolvido por stage() com as métricas desligadas."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    __slots__ = ("registry", "name", "start")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.add_stage_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _prom_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    """
+    Métricas do ETL: tempo por etapa (read, encode, send, await, aggregate,
+    write_csv...), histogramas de latência alimentados pelos callbacks do
+    driver, gauges de requisições em voo e contadores de reenvios e erros.
+
+    Desligado (padrão), cada chamada só testa `enabled` e retorna; nos
+    pontos por requisição o chamador testa `enabled` antes de medir o
+    tempo, então o custo fica em um if. Ligado com enable(), um thread
+    exporta um snapshot a cada `interval` segundos para um arquivo no
+    formato texto do Prometheus (regravado, para o textfile collector do
+    node_exporter) ou JSON lines (uma linha por snapshot).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._gauge_fns = {}
+        self._path = None
+        self._format = None
+        self._stop = None
+        self._thread = None
+
+    def enable(self, path, fmt="prometheus", interval=10.0):
+        if fmt not in METRICS_FORMATS:
+            raise ValueError(f"formato de métricas desconhecido: {fmt}")
+        self._path = Path(path)
+        self._format = fmt
+        self.enabled = True
+        if interval:
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._export_loop, args=(interval,),
+                                            name="metrics-exporter", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Para o thread de exportação e grava o snapshot final."""
+        if not self.enabled:
+            return
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.export()
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def gauge_fn(self, name, fn, **labels):
+        """Gauge lido só na exportação (ex.: tamanho de uma fila): custo zero no caminho quente."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauge_fns[(name, _label_key(labels))] = fn
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def add_stage_time(self, stage, seconds):
+        if not self.enabled:
+            return
+        key = _label_key({"stage": stage})
+        with self._lock:
+            total = ("etl_stage_seconds_total", key)
+            calls = ("etl_stage_calls_total", key)
+            self._counters[total] = self._counters.get(total, 0.0) + seconds
+            self._counters[calls] = self._counters.get(calls, 0) + 1
+
+    def stage(self, name):
+        """Context manager que soma o tempo do bloco à etapa `name`."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, name)
+
+    def stage_times(self):
+        """{etapa: segundos} acumulados até agora."""
+        with self._lock:
+            return {
+                dict(labels)["stage"]: value
+                for (name, labels), value in self._counters.items()
+                if name == "etl_stage_seconds_total"
+            }
+
+    def quantile(self, name, q, **labels):
+        with self._lock:
+            histogram = self._histograms.get((name, _label_key(labels)))
+            return histogram.quantile(q) if histogram is not None else None
+
+    def _gauge_values(self):
+        values = dict(self._gauges)
+        for key, fn in self._gauge_fns.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                continue
+        return values
+
+    def to_prometheus(self):
+        """Snapshot no formato texto de exposição do Prometheus."""
+        lines = []
+        with self._lock:
+            gauges = self._gauge_values()
+            typed = set()
+            for kind, items in (("counter", self._counters.items()), ("gauge", gauges.items())):
+                for (name, labels), value in sorted(items):
+                    if name not in typed:
+                        lines.append(f"# TYPE {name} {kind}")
+                        typed.add(name)
+                    lines.append(f"{name}{_prom_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, n in zip(histogram.bounds + ("+Inf",), histogram.counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_prom_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_prom_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_prom_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        """Snapshot como dicionário (uma linha do arquivo JSON lines)."""
+        def named(key):
+            name, labels = key
+            return name + _prom_labels(labels)
+
+        with self._lock:
+            gauges = self._gauge_values()
+            return {
+                "ts": datetime.now().isoformat(timespec="milliseconds"),
+                "counters": {named(k): v for k, v in sorted(self._counters.items())},
+                "gauges": {named(k): v for k, v in sorted(gauges.items())},
+                "histograms": {
+                    named(k): {
+                        "count": h.count, "sum": h.sum,
+                        "p50": h.quantile(0.5), "p99": h.quantile(0.99),
+                        "buckets": dict(zip(map(str, h.bounds + ("+Inf",)), h.counts)),
+                    }
+                    for k, h in sorted(self._histograms.items())
+                },
+            }
+
+    def export(self):
+        if not self.enabled:
+            return
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        if self._format == "jsonl":
+            with open(self._path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.to_json(), ensure_ascii=False) + "\n")
+        else:
+            tmp_path = self._path.with_name(self._path.name + ".tmp")
+            tmp_path.write_text(self.to_prometheus(), encoding="utf-8")
+            os.replace(tmp_path, self._path)
+
+    def _export_loop(self, interval):
+        while not self._stop.wait(interval):
+            self.export()
+
+
+# Instância única do processo, desligada até enable() (ver configure_metrics)
+METRICS = MetricsRegistry()
+
+
+def add_metrics_args(parser):
+    """Opções de linha de comando da exportação de métricas."""
+    parser.add_argument("--metrics", type=Path, default=None,
+                        help="grava métricas (tempo por etapa, latência, em voo, "
+                             "reenvios e erros) neste arquivo")
+    parser.add_argument("--metrics-format", choices=METRICS_FORMATS, default=None,
+                        help="prometheus (texto, regravado) ou jsonl (uma linha por "
+                             "snapshot); padrão pela extensão (.jsonl/.json = jsonl)")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="segundos entre snapshots")
+
+
+def configure_metrics(args, path=None):
+    """Liga METRICS conforme add_metrics_args; `path` substitui --metrics (workers)."""
+    path = path or args.metrics
+    if path is None:
+        return False
+    fmt = args.metrics_format or ("jsonl" if Path(path).suffix in (".jsonl", ".json") else "prometheus")
+    METRICS.enable(path, fmt, args.metrics_interval)
+    return True
+
+
+def worker_metrics_path(path, worker_id):
+    """Arquivo de métricas próprio de um worker (<nome>.worker<N><ext>)."""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.worker{worker_id}{path.suffix}")
+
+
+def print_stage_summary(prefix):
+    """Imprime o tempo acumulado por etapa e o p50/p99 das requisições."""
+    if not METRICS.enabled:
+        return
+    for stage, seconds in sorted(METRICS.stage_times().items(), key=lambda item: -item[1]):
+        print(f"{prefix} Etapa {stage}: {seconds:.2f}s")
+    for name, outcome in (("etl_request_latency_seconds", "ok"),
+                          ("analytics_page_latency_seconds", "ok")):
+        p50 = METRICS.quantile(name, 0.5, outcome=outcome)
+        if p50 is not None:
+            p99 = METRICS.quantile(name, 0.99, outcome=outcome)
+            print(f"{prefix} Latência ({name}): p50 {p50 * 1000:.1f} ms | p99 {p99 * 1000:.1f} ms")
@@ -1,22 +1,50 @@
-import sys
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # só grava PNGs; também vale nos processos do pool
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
+from matplotlib.colors import LogNorm
 
+from metrics import fmt_mb, peak_rss_mb
 
-def add_logo_header(fig, axis_position, logo_path):
+# Acima desta quantidade de produtos a dispersão preço × rating é desenhada
+# como densidade pré-agregada em vez de um marcador por produto
+DENSITY_THRESHOLD = 100_000
+
+# Grade (preço, rating) da densidade
+DENSITY_BINS = (160, 80)
+
+
+def load_logo(logo_path):
     """
-    Adiciona o logo no topo à esquerda, ocupando uma faixa horizontal acima do gráfico.
+    Decodifica o PNG do logo uma única vez; o array é reaproveitado por
+    todos os gráficos (e enviado uma vez a cada processo do pool).
+    Retorna None se o arquivo não puder ser lido.
     """
     try:
-        logo = mpimg.imread(logo_path)
-        ax_logo = fig.add_axes(axis_position)  # left, bottom, width, height
-        ax_logo.imshow(logo)
-        ax_logo.axis("off")
+        return mpimg.imread(logo_path)
     except Exception as e:
         print(f"[PLOTS] Erro ao carregar logo: {e}")
+        return None
+
+
+def add_logo_header(fig, axis_position, logo):
+    """
+    Adiciona o logo (já decodificado por load_logo) no topo à esquerda,
+    ocupando uma faixa horizontal acima do gráfico.
+    """
+    if logo is None:
+        return
+    ax_logo = fig.add_axes(axis_position)  # left, bottom, width, height
+    ax_logo.imshow(logo)
+    ax_logo.axis("off")
 
 
 def add_footer(fig, text):
@@ -32,18 +60,8 @@ def add_footer(fig, text):
     )
 
 
-def main():
-    base_dir = Path(__file__).resolve().parents[1]
-
-    processed_dir = base_dir / "data" / "processed"
-    img_dir = base_dir / "img"
-    img_dir.mkdir(parents=True, exist_ok=True)
-
-    logo_path = base_dir / "assets" / "img" / "Infnet-Logo.png"
-
-    # -------------------------------------------------------------------------
-    # 1) Gráfico de Barras – Top 10 categorias do estado SP
-    # -------------------------------------------------------------------------
+def plot_bar(processed_dir, img_dir, logo, dpi=300, density_threshold=None):
+    """Gráfico de barras: top 10 categorias por receita no estado de SP."""
     print("[PLOTS] Gráfico de barras...")
 
     df_receita = pd.read_csv(processed_dir / "receita_estado_categoria.csv")
@@ -56,7 +74,7 @@ def main():
     add_logo_header(
         fig,
         axis_position=[0.02, 0.82, 0.18, 0.16],  # left, bottom, width, height
-        logo_path=logo_path
+        logo=logo
     )
 
     # Área do gráfico (abaixo do logo)
@@ -76,52 +94,76 @@ def main():
         "Projeto de Pós-Graduação — Engenharia de Dados — INFNET"
     )
 
-    out1 = img_dir / "grafico_barras_categoria_estado.png"
-    fig.savefig(out1, dpi=300, bbox_inches="tight")
-    plt.close()
-    print("[PLOTS] →", out1)
+    out = img_dir / "grafico_barras_categoria_estado.png"
+    fig.savefig(out, dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    print("[PLOTS] →", out)
+    return out
+
 
-    # -------------------------------------------------------------------------
-    # 2) Gráfico de Dispersão – Preço médio × Rating médio
-    # -------------------------------------------------------------------------
+def plot_scatter(processed_dir, img_dir, logo, dpi=300, density_threshold=DENSITY_THRESHOLD):
+    """
+    Dispersão preço médio × rating médio por produto. Acima de
+    density_threshold produtos (None = nunca), os pontos são agregados antes
+    numa grade 2D (np.histogram2d) e o gráfico mostra a densidade por
+    célula: o custo de desenho passa a depender do tamanho da grade, não
+    da quantidade de produtos.
+    """
     print("[PLOTS] Gráfico de dispersão...")
 
-    df_preco_rating = pd.read_csv(processed_dir / "preco_rating_por_produto.csv")
+    df_preco_rating = pd.read_csv(processed_dir / "preco_rating_por_produto.csv",
+                                  usecols=["avg_price", "avg_rating"])
 
     fig = plt.figure(figsize=(14, 8))
 
     add_logo_header(
         fig,
         axis_position=[0.02, 0.82, 0.18, 0.16],
-        logo_path=logo_path
+        logo=logo
     )
 
     ax = fig.add_axes([0.07, 0.12, 0.90, 0.68])
-    ax.scatter(
-        df_preco_rating["avg_price"],
-        df_preco_rating["avg_rating"],
-        color="#003366",
-        s=16,
-        alpha=0.5
-    )
+    if density_threshold is not None and len(df_preco_rating) > density_threshold:
+        counts, x_edges, y_edges = np.histogram2d(
+            df_preco_rating["avg_price"].to_numpy(),
+            df_preco_rating["avg_rating"].to_numpy(),
+            bins=DENSITY_BINS,
+        )
+        mesh = ax.pcolormesh(
+            x_edges, y_edges, np.ma.masked_equal(counts.T, 0),
+            cmap="Blues", norm=LogNorm()
+        )
+        fig.colorbar(mesh, ax=ax, pad=0.01).set_label("Produtos por célula")
+        legenda = ("Cor = quantidade de produtos em cada faixa de preço médio (X) "
+                   "e rating médio (Y).")
+    else:
+        ax.scatter(
+            df_preco_rating["avg_price"],
+            df_preco_rating["avg_rating"],
+            color="#003366",
+            s=16,
+            alpha=0.5
+        )
+        legenda = "Cada ponto representa um produto. Preço médio no eixo X e rating médio no eixo Y."
     ax.set_xlabel("Preço Médio (R$)")
     ax.set_ylabel("Rating Médio")
     ax.set_title("Dispersão: Preço Médio × Rating Médio por Produto")
 
     add_footer(
         fig,
-        "Cada ponto representa um produto. Preço médio no eixo X e rating médio no eixo Y.\n"
+        legenda + "\n"
         "Projeto de Pós-Graduação — Engenharia de Dados — INFNET"
     )
 
-    out2 = img_dir / "grafico_dispersao_preco_rating.png"
-    fig.savefig(out2, dpi=300, bbox_inches="tight")
-    plt.close()
-    print("[PLOTS] →", out2)
+    out = img_dir / "grafico_dispersao_preco_rating.png"
+    fig.savefig(out, dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    print("[PLOTS] →", out)
+    return out
 
-    # -------------------------------------------------------------------------
-    # 3) Gráfico de Linha – Evolução temporal
-    # -------------------------------------------------------------------------
+
+def plot_line(processed_dir, img_dir, logo, dpi=300, density_threshold=None):
+    """Gráfico de linha: evolução da receita mensal."""
     print("[PLOTS] Gráfico de linha...")
 
     df_vendas = pd.read_csv(processed_dir / "vendas_por_mes.csv")
@@ -131,7 +173,7 @@ def main():
     add_logo_header(
         fig,
         axis_position=[0.02, 0.82, 0.18, 0.16],
-        logo_path=logo_path
+        logo=logo
     )
 
     ax = fig.add_axes([0.07, 0.12, 0.90, 0.68])
@@ -152,12 +194,80 @@ def main():
         "Projeto de Pós-Graduação — Engenharia de Dados — INFNET"
     )
 
-    out3 = img_dir / "grafico_linha_vendas_tempo.png"
-    fig.savefig(out3, dpi=300, bbox_inches="tight")
-    plt.close()
-    print("[PLOTS] →", out3)
+    out = img_dir / "grafico_linha_vendas_tempo.png"
+    fig.savefig(out, dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    print("[PLOTS] →", out)
+    return out
+
+
+PLOTS = (plot_bar, plot_scatter, plot_line)
+
+# Logo decodificado, entregue a cada processo do pool pelo initializer
+_worker_logo = None
+
+
+def _init_worker(logo):
+    global _worker_logo
+    _worker_logo = logo
+
+
+def _render_worker(index, processed_dir, img_dir, dpi, density_threshold):
+    return PLOTS[index](processed_dir, img_dir, _worker_logo, dpi, density_threshold)
+
+
+def render_plots(processed_dir, img_dir, logo_path, workers=None,
+                 density_threshold=DENSITY_THRESHOLD, dpi=300):
+    """
+    Gera os três gráficos a partir dos CSVs de processed_dir e grava os
+    PNGs em img_dir. Retorna os caminhos gerados.
+
+    O logo é decodificado uma vez. Com workers > 1 (padrão: um processo
+    por gráfico, limitado aos núcleos) as figuras são renderizadas em
+    paralelo num pool de processos; workers=1 renderiza em sequência.
+    """
+    img_dir.mkdir(parents=True, exist_ok=True)
+    logo = load_logo(logo_path)
+    if workers is None:
+        workers = min(len(PLOTS), os.cpu_count() or 1)
+
+    if workers <= 1:
+        return [plot(processed_dir, img_dir, logo, dpi, density_threshold) for plot in PLOTS]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(logo,)) as pool:
+        futures = [
+            pool.submit(_render_worker, i, processed_dir, img_dir, dpi, density_threshold)
+            for i in range(len(PLOTS))
+        ]
+        return [future.result() for future in futures]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Gráficos do marketplace a partir dos CSVs processados.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processos de renderização (padrão: um por gráfico, até o nº de núcleos)")
+    parser.add_argument("--density-threshold", type=int, default=DENSITY_THRESHOLD,
+                        help="acima desta quantidade de produtos a dispersão vira mapa de densidade")
+    parser.add_argument("--dpi", type=int, default=300, help="resolução dos PNGs")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    base_dir = Path(__file__).resolve().parents[1]
+
+    processed_dir = base_dir / "data" / "processed"
+    img_dir = base_dir / "img"
+    logo_path = base_dir / "assets" / "img" / "Infnet-Logo.png"
+
+    start = time.perf_counter()
+    render_plots(processed_dir, img_dir, logo_path, args.workers, args.density_threshold, args.dpi)
 
     print("\n[PLOTS] Todos os gráficos foram atualizados com layout profissional.")
+    print(f"[PLOTS] Tempo de renderização: {time.perf_counter() - start:.1f}s "
+          f"| pico de memória (RSS): {fmt_mb(peak_rss_mb())}, "
+          f"maior processo do pool: {fmt_mb(peak_rss_mb(children=True))}")
 
 
 if __name__ == "__main__":
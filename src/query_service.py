@@ -0,0 +1,353 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+
+# Saídas do etl_analysis.py lidas pelo serviço
+PROCESSED_FILES = {
+    "revenue": "receita_estado_categoria.csv",
+    "products": "preco_rating_por_produto.csv",
+    "monthly": "vendas_por_mes.csv",
+}
+
+# Colunas aceitas como ordenação no ranking de produtos (sempre decrescente)
+PRODUCT_SORT_COLUMNS = ("avg_rating", "avg_price", "num_transactions")
+
+
+class ResultCache:
+    """
+    Cache LRU de resultados com validade (TTL) por entrada. Passando de
+    max_entries, sai a entrada usada há mais tempo; max_entries=0 desliga
+    o cache. Seguro para uso por várias threads (servidor HTTP).
+    """
+
+    def __init__(self, max_entries=4096, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Retorna (True, valor) se a chave está no cache e válida; senão (False, None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[1]
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _ProcessedData:
+    """
+    Os três CSVs carregados uma vez em estruturas indexadas para as
+    consultas:
+
+    - receita: registros por state, já na ordem do CSV (receita desc);
+    - produtos: arrays NumPy em ordem decrescente de cada coluna de
+      PRODUCT_SORT_COLUMNS (desempate por product_id), então o top-N é
+      ler o começo do array;
+    - meses: year_month ordenado + somas acumuladas, para o total de um
+      intervalo com duas buscas binárias.
+    """
+
+    def __init__(self, paths):
+        revenue = pd.read_csv(paths["revenue"])
+        self.revenue = {
+            state: group.drop(columns="state").to_dict("records")
+            for state, group in revenue.groupby("state", sort=True)
+        }
+
+        products = pd.read_csv(paths["products"])
+        self.product_ids = products["product_id"].to_numpy(dtype=object)
+        self.product_values = {
+            name: products[name].to_numpy() for name in ("avg_price", "avg_rating", "num_transactions")
+        }
+        self.product_order = {}
+        for name in PRODUCT_SORT_COLUMNS:
+            # lexsort: última chave é a principal
+            order = np.lexsort((self.product_ids, -self.product_values[name]))
+            self.product_order[name] = (order, self.product_values["num_transactions"][order])
+
+        monthly = pd.read_csv(paths["monthly"]).sort_values("year_month", ignore_index=True)
+        self.months = monthly["year_month"].to_numpy(dtype=str)
+        self.month_revenue = monthly["total_revenue"].to_numpy()
+        self.month_transactions = monthly["num_transactions"].to_numpy()
+        self.cum_revenue = np.concatenate([[0.0], np.cumsum(self.month_revenue)])
+        self.cum_transactions = np.concatenate([[0], np.cumsum(self.month_transactions)])
+
+        self.rows = len(revenue) + len(products) + len(monthly)
+
+
+class SalesQueryService:
+    """
+    Consultas sobre as saídas processadas do ETL (data/processed), com os
+    dados em memória e um cache LRU + TTL dos resultados.
+
+    A cada consulta (no máximo uma vez por check_interval segundos) o
+    serviço compara mtime e tamanho dos CSVs com os da última carga; se
+    algum mudou, recarrega tudo e esvazia o cache. Se a releitura falhar
+    (ex.: o ETL ainda está escrevendo o arquivo), continua com os dados
+    anteriores e tenta de novo na próxima verificação.
+
+    Os resultados são listas e dicionários prontos para JSON,
+    compartilhados pelo cache: quem chama não deve alterá-los.
+    """
+
+    def __init__(self, processed_dir, cache_size=4096, ttl=300.0, check_interval=1.0):
+        self.paths = {name: Path(processed_dir) / file for name, file in PROCESSED_FILES.items()}
+        self.cache = ResultCache(cache_size, ttl)
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._signature = self._file_signature()
+        self.data = _ProcessedData(self.paths)
+        self.loaded_at = time.time()
+
+    def _file_signature(self):
+        signature = []
+        for path in self.paths.values():
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _check_files(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            try:
+                signature = self._file_signature()
+                if signature == self._signature:
+                    return
+                data = _ProcessedData(self.paths)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[ALERTA] Falha ao recarregar {self.paths['revenue'].parent}: {e}")
+                return
+            self.data = data
+            self._signature = signature
+            self.loaded_at = time.time()
+            self.reloads += 1
+            self.cache.clear()
+
+    def _cached(self, name, compute, *params):
+        self._check_files()
+        # a geração dos dados na chave impede que um resultado calculado com
+        # os dados antigos, durante uma recarga, seja servido depois dela
+        # (lida antes de self.data, que a recarga troca antes de incrementar)
+        generation = self.reloads
+        data = self.data
+        key = (name, generation) + params
+        hit, value = self.cache.get(key)
+        if not hit:
+            value = compute(data, *params)
+            self.cache.put(key, value)
+        return value
+
+    def revenue_by_category(self, state, category=None):
+        """Receita do state por categoria (ou só de `category`), receita desc."""
+        return self._cached("revenue_by_category", _revenue_by_category, state, category)
+
+    def top_products(self, n=10, min_transactions=1, by="avg_rating"):
+        """Os n produtos com maior `by` entre os com pelo menos min_transactions vendas."""
+        if int(n) < 0:
+            raise ValueError(f"n deve ser >= 0: {n}")
+        if by not in PRODUCT_SORT_COLUMNS:
+            raise ValueError(f"ordenação inválida: {by} (use {', '.join(PRODUCT_SORT_COLUMNS)})")
+        return self._cached("top_products", _top_products, int(n), int(min_transactions), by)
+
+    def monthly_revenue(self, start=None, end=None):
+        """Receita e transações por mês em [start, end] (YYYY-MM, inclusivo) e o total."""
+        return self._cached("monthly_revenue", _monthly_revenue, start, end)
+
+    def stats(self):
+        total = self.cache.hits + self.cache.misses
+        return {
+            "rows": self.data.rows,
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at)),
+            "reloads": self.reloads,
+            "cache_entries": len(self.cache),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "cache_evictions": self.cache.evictions,
+            "hit_rate": self.cache.hits / total if total else None,
+        }
+
+
+def _revenue_by_category(data, state, category):
+    records = data.revenue.get(state, [])
+    if category is not None:
+        records = [r for r in records if r["category"] == category]
+    return records
+
+
+def _top_products(data, n, min_transactions, by):
+    order, counts = data.product_order[by]
+    # percorre o ranking em blocos crescentes até achar n produtos com o
+    # mínimo de transações (com filtro baixo, basta o primeiro bloco)
+    found = []
+    start, size = 0, max(4 * n, 256)
+    while start < len(order) and sum(map(len, found)) < n:
+        found.append(np.flatnonzero(counts[start:start + size] >= min_transactions) + start)
+        start += size
+        size *= 2
+    picked = order[np.concatenate(found)[:n]] if found else order[:0]
+    values = data.product_values
+    return [
+        {"product_id": product_id, "avg_price": price, "avg_rating": rating,
+         "num_transactions": count}
+        for product_id, price, rating, count in zip(
+            data.product_ids[picked].tolist(), values["avg_price"][picked].tolist(),
+            values["avg_rating"][picked].tolist(), values["num_transactions"][picked].tolist(),
+        )
+    ]
+
+
+def _monthly_revenue(data, start, end):
+    lo = 0 if start is None else int(np.searchsorted(data.months, start, side="left"))
+    hi = len(data.months) if end is None else int(np.searchsorted(data.months, end, side="right"))
+    hi = max(hi, lo)
+    return {
+        "months": [
+            {"year_month": month, "total_revenue": revenue, "num_transactions": count}
+            for month, revenue, count in zip(
+                data.months[lo:hi].tolist(), data.month_revenue[lo:hi].tolist(),
+                data.month_transactions[lo:hi].tolist(),
+            )
+        ],
+        "total_revenue": float(data.cum_revenue[hi] - data.cum_revenue[lo]),
+        "num_transactions": int(data.cum_transactions[hi] - data.cum_transactions[lo]),
+    }
+
+
+# Rotas HTTP: caminho -> (método do serviço, {parâmetro: conversão})
+ROUTES = {
+    "/revenue": ("revenue_by_category", {"state": str, "category": str}),
+    "/top-products": ("top_products", {"n": int, "min_transactions": int, "by": str}),
+    "/monthly-revenue": ("monthly_revenue", {"start": str, "end": str}),
+}
+
+
+def make_server(service, host="127.0.0.1", port=8765):
+    """
+    Servidor HTTP (ThreadingHTTPServer, uma thread por conexão, keep-alive)
+    que responde JSON. Ex.: /revenue?state=SP, /top-products?n=10&min_transactions=20,
+    /monthly-revenue?start=2023-01&end=2023-12, /stats.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # cabeçalho e corpo saem em writes separados: com Nagle, cada resposta
+        # em keep-alive esperaria o ACK atrasado do cliente (~40 ms)
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/stats":
+                return self._send(200, service.stats())
+            route = ROUTES.get(url.path)
+            if route is None:
+                return self._send(404, {"error": f"rota desconhecida: {url.path}"})
+            method, params = route
+            query = parse_qs(url.query)
+            try:
+                kwargs = {name: convert(query[name][-1])
+                          for name, convert in params.items() if name in query}
+                result = getattr(service, method)(**kwargs)
+            except (TypeError, ValueError) as e:
+                return self._send(400, {"error": str(e)})
+            self._send(200, result)
+
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Serviço de consultas sobre as saídas de data/processed."
+    )
+    parser.add_argument("--processed-dir", type=Path, default=BASE_DIR / "data" / "processed")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=4096,
+                        help="resultados guardados no cache LRU (0 desliga)")
+    parser.add_argument("--ttl", type=float, default=300.0,
+                        help="validade de cada resultado no cache, em segundos")
+    parser.add_argument("--check-interval", type=float, default=1.0,
+                        help="intervalo mínimo entre verificações de mudança nos CSVs, em segundos")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print("=" * 80)
+    try:
+        service = SalesQueryService(args.processed_dir, args.cache_size, args.ttl,
+                                    args.check_interval)
+    except FileNotFoundError as e:
+        print("[ERRO] Saídas processadas não encontradas (rode o etl_analysis.py antes):")
+        print(e)
+        raise SystemExit(1)
+    print(f"[QUERY] Dados carregados de {args.processed_dir}: "
+          f"{service.data.rows:,} linhas.".replace(",", "."))
+    server = make_server(service, args.host, args.port)
+    print(f"[QUERY] Servindo em http://{args.host}:{args.port} "
+          f"({', '.join(list(ROUTES) + ['/stats'])}). Ctrl+C encerra.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    print("[QUERY] Serviço encerrado.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,593 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sketches import KeyedHyperLogLog, KeyedKLL
+
+
+# Versão do formato do arquivo de estado persistido
+STATE_VERSION = 1
+
+# Quantis do ticket (total_value por transação) calculados com sketches
+TICKET_QUANTILES = (0.5, 0.95)
+
+
+def factorize_into(vocab, values):
+    """
+    Códigos inteiros globais de uma coluna de texto. O factorize é feito
+    por bloco (em C) e só os valores distintos do bloco passam pelo
+    dicionário global `vocab` (valor -> código), que é atualizado.
+
+    Nulos (None/NaN) recebem o código da chave None do vocabulário: o
+    factorize os marca com -1, que indexaria o último valor distinto.
+    """
+    local_codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    codes = [vocab.setdefault(u, len(vocab)) for u in uniques]
+    if len(local_codes) and local_codes.min() < 0:
+        codes.append(vocab.setdefault(None, len(vocab)))
+    return np.array(codes, dtype=np.int64)[local_codes]
+
+
+def to_datetime64(values):
+    """Converte uma coluna de datas (datetime, Series ou Array) em datetime64[ms]."""
+    if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+        return values.astype("datetime64[ms]")
+    return pd.DatetimeIndex(np.asarray(values)).as_unit("ms").values
+
+
+class KeyedSums:
+    """
+    Somas e contagens por chave inteira, em arrays que crescem conforme
+    aparecem chaves novas. A memória depende só da quantidade de chaves
+    distintas, nunca da quantidade de linhas processadas.
+
+    Valores monetários (2 casas) e ratings (1 casa) são somados de forma
+    exata, em inteiros de 1/scale (centavos), então o resultado não depende
+    da ordem em que as páginas chegam e bate com o groupby do pandas. Se
+    aparecer um valor com mais casas decimais, os acumuladores passam a
+    float64 a partir daquele ponto.
+
+    Valores nulos (NaN) ficam fora das somas. Além da contagem de linhas por
+    chave (`counts`), cada coluna tem a sua contagem de valores não nulos
+    (`nonnull`), que é o denominador das médias, como no mean do pandas.
+    """
+
+    def __init__(self, n_values, scale=100):
+        self.scale = scale
+        self.exact = True
+        self.slots = {}  # chave -> posição nos arrays
+        self.sums = np.zeros((n_values, 0), dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.nonnull = np.zeros((n_values, 0), dtype=np.int64)
+
+    def _grow(self, size):
+        if size > len(self.counts):
+            grow = size - len(self.counts)
+            self.sums = np.hstack([self.sums, np.zeros((len(self.sums), grow), dtype=self.sums.dtype)])
+            self.counts = np.concatenate([self.counts, np.zeros(grow, dtype=np.int64)])
+            self.nonnull = np.hstack([self.nonnull, np.zeros((len(self.nonnull), grow), dtype=np.int64)])
+
+    def _to_float(self):
+        self.sums = self.sums / self.scale
+        self.exact = False
+
+    def add(self, keys, *values):
+        keys = np.asarray(keys, dtype=np.int64)
+        if not len(keys):
+            return
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        slot_of = np.array(
+            [self.slots.setdefault(k, len(self.slots)) for k in uniq.tolist()],
+            dtype=np.int64,
+        )
+        slots = slot_of[inverse]
+        size = len(self.slots)
+        self._grow(size)
+
+        self.counts += np.bincount(slots, minlength=size)
+        for i, column in enumerate(values):
+            column = np.asarray(column, dtype=np.float64)
+            valid = np.isfinite(column)
+            if not valid.all():
+                column = np.where(valid, column, 0.0)
+            self.nonnull[i] += np.bincount(slots[valid], minlength=size)
+            if self.exact:
+                scaled = np.rint(column * self.scale)
+                if np.abs(column * self.scale - scaled).max() > 1e-6:
+                    self._to_float()
+                else:
+                    # Somas parciais inteiras < 2**53 são exatas em float64
+                    self.sums[i] += np.rint(
+                        np.bincount(slots, weights=scaled, minlength=size)
+                    ).astype(np.int64)
+                    continue
+            self.sums[i] += np.bincount(slots, weights=column, minlength=size)
+
+    def merge(self, other):
+        """Soma outro KeyedSums (ex.: de outra faixa do scan) neste."""
+        keys, sums, counts = other.items()
+        self.add_totals(keys, sums, counts, exact=other.exact, nonnull=other.nonnull)
+
+    def add_totals(self, keys, sums, counts, exact=True, nonnull=None):
+        """
+        Soma totais já agregados (somas na unidade 1/scale quando exact,
+        senão em float) nas chaves informadas. Sem `nonnull`, considera que
+        nenhum valor era nulo (contagem de cada coluna igual a `counts`).
+        """
+        if nonnull is None:
+            nonnull = np.tile(counts, (len(self.sums), 1))
+        if self.exact and not exact:
+            self._to_float()
+        if not self.exact and exact:
+            sums = sums / self.scale
+        slots = np.array(
+            [self.slots.setdefault(k, len(self.slots)) for k in np.asarray(keys).tolist()],
+            dtype=np.int64,
+        )
+        self._grow(len(self.slots))
+        np.add.at(self.counts, slots, counts)
+        for i in range(len(self.sums)):
+            np.add.at(self.sums[i], slots, sums[i])
+            np.add.at(self.nonnull[i], slots, nonnull[i])
+
+    def items(self):
+        """Chaves, somas (uma linha por valor, na unidade interna) e contagens."""
+        keys = np.fromiter(self.slots.keys(), dtype=np.int64, count=len(self.slots))
+        return keys, self.sums, self.counts
+
+    def totals(self):
+        """Chaves, somas em float (unidade original) e contagens."""
+        keys, sums, counts = self.items()
+        return keys, (sums / self.scale if self.exact else sums), counts
+
+    def to_dict(self):
+        keys, sums, counts = self.items()
+        return {
+            "scale": self.scale,
+            "exact": self.exact,
+            "keys": keys.tolist(),
+            "sums": sums.tolist(),
+            "counts": counts.tolist(),
+            "nonnull": self.nonnull.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls(len(data["sums"]), data["scale"])
+        obj.exact = data["exact"]
+        obj.slots = {k: i for i, k in enumerate(data["keys"])}
+        obj.sums = np.array(data["sums"], dtype=np.int64 if obj.exact else np.float64)
+        obj.sums = obj.sums.reshape(len(data["sums"]), len(data["keys"]))
+        obj.counts = np.array(data["counts"], dtype=np.int64)
+        # Estados gravados antes da contagem por coluna: sem nulos
+        obj.nonnull = np.array(data.get("nonnull", [data["counts"]] * len(data["sums"])), dtype=np.int64)
+        obj.nonnull = obj.nonnull.reshape(len(data["sums"]), len(data["keys"]))
+        return obj
+
+
+class SalesAggregator:
+    """
+    Agregador em streaming das três saídas do ETL analítico:
+
+    - receita por (state, category);
+    - preço e rating médios por product_id;
+    - receita e transações por mês (year_month).
+
+    Também guarda a maior purchase_date vista por state (watermark), usada
+    pela análise incremental para ler só o que chegou depois.
+
+    Com sketches=True, mantém ainda por (state, mês) um HyperLogLog de
+    customer_id (clientes distintos) e um KLL de total_value (p50/p95 do
+    ticket), aproximados e com memória fixa por chave (sketches.py). Eles
+    entram no merge e no estado persistido como os demais acumuladores.
+
+    Cada bloco de linhas (página do scan, RecordBatch etc.) atualiza os três
+    acumuladores de uma vez; nada das linhas fica guardado. As chaves de
+    texto viram códigos inteiros compactos via vocabulários globais.
+    """
+
+    # Deslocamento usado para combinar os códigos de state e category
+    _PAIR_SHIFT = 1 << 20
+
+    def __init__(self, sketches=False):
+        self.vocab = {"state": {}, "category": {}, "product_id": {}}
+        self.state_category = KeyedSums(1)   # total_value
+        self.product = KeyedSums(2)          # price, rating
+        self.month = KeyedSums(1)            # total_value
+        self.max_date_ms = np.zeros(0, dtype=np.int64)  # por código de state
+        self.rows = 0
+        # chaves state * _PAIR_SHIFT + mês, como em state_category
+        self.customers = KeyedHyperLogLog() if sketches else None  # customer_id
+        self.tickets = KeyedKLL() if sketches else None             # total_value
+
+    def update(self, columns):
+        """
+        Atualiza os acumuladores com um bloco. `columns` mapeia o nome da
+        coluna para a sequência de valores (lista, array NumPy ou pyarrow).
+        """
+        n = len(columns["state"])
+        if not n:
+            return
+        state = factorize_into(self.vocab["state"], columns["state"])
+        category = factorize_into(self.vocab["category"], columns["category"])
+        product = factorize_into(self.vocab["product_id"], columns["product_id"])
+        dates = to_datetime64(columns["purchase_date"])
+        months = dates.astype("datetime64[M]").astype(np.int64)
+        total_value = np.asarray(columns["total_value"], dtype=np.float64)
+
+        self.state_category.add(state * self._PAIR_SHIFT + category, total_value)
+        self.product.add(product, columns["price"], columns["rating"])
+        self.month.add(months, total_value)
+        if self.customers is not None:
+            state_month = state * self._PAIR_SHIFT + months
+            self.customers.add(state_month, columns["customer_id"])
+            self.tickets.add(state_month, total_value)
+        self._update_watermarks(state, dates.astype(np.int64))
+        self.rows += n
+
+    def _update_watermarks(self, state_codes, date_ms):
+        size = len(self.vocab["state"])
+        if size > len(self.max_date_ms):
+            missing = size - len(self.max_date_ms)
+            self.max_date_ms = np.concatenate(
+                [self.max_date_ms, np.full(missing, np.iinfo(np.int64).min)]
+            )
+        # NaT vira o menor int64 e nunca vence o máximo
+        np.maximum.at(self.max_date_ms, state_codes, date_ms)
+
+    def watermarks(self):
+        """Maior purchase_date já agregada por state, como datetime (UTC, ingênuo)."""
+        result = {}
+        for state, code in self.vocab["state"].items():
+            if code < len(self.max_date_ms) and self.max_date_ms[code] != np.iinfo(np.int64).min:
+                result[state] = np.datetime64(int(self.max_date_ms[code]), "ms").astype(datetime)
+        return result
+
+    def update_page(self, page, column_names):
+        """Atalho para páginas no formato de columnar_page_factory."""
+        if page:
+            self.update(dict(zip(column_names, page)))
+
+    def merge(self, other):
+        """
+        Junta o estado de outro agregador neste (ex.: um agregador por faixa
+        de token ou por processo). Os códigos do outro são traduzidos pelos
+        valores, então os vocabulários não precisam coincidir.
+        """
+        if (self.customers is None) != (other.customers is None):
+            raise ValueError("Só é possível juntar agregadores ambos com ou ambos sem sketches")
+        remap = {}
+        for name, vocab in other.vocab.items():
+            inverse = np.empty(len(vocab), dtype=object)
+            for value, code in vocab.items():
+                inverse[code] = value
+            remap[name] = factorize_into(self.vocab[name], inverse)
+
+        keys, sums, counts = other.state_category.items()
+        state = remap["state"][keys // self._PAIR_SHIFT]
+        category = remap["category"][keys % self._PAIR_SHIFT]
+        self.state_category.add_totals(
+            state * self._PAIR_SHIFT + category, sums, counts, other.state_category.exact,
+            other.state_category.nonnull,
+        )
+
+        keys, sums, counts = other.product.items()
+        self.product.add_totals(
+            remap["product_id"][keys], sums, counts, other.product.exact, other.product.nonnull
+        )
+
+        self.month.merge(other.month)
+
+        if self.customers is not None:
+            keys, _ = other.customers.items()
+            self.customers.merge(other.customers, self._remap_state_month(remap, keys))
+            keys, _ = other.tickets.items()
+            self.tickets.merge(other.tickets, self._remap_state_month(remap, keys))
+
+        if len(other.max_date_ms):
+            self._update_watermarks(remap["state"][:len(other.max_date_ms)], other.max_date_ms)
+        self.rows += other.rows
+
+    def _remap_state_month(self, remap, keys):
+        return remap["state"][keys // self._PAIR_SHIFT] * self._PAIR_SHIFT + keys % self._PAIR_SHIFT
+
+    def to_dict(self):
+        """Estado completo e serializável em JSON (vocabulários na ordem dos códigos)."""
+        return {
+            "version": STATE_VERSION,
+            "rows": self.rows,
+            "vocab": {name: list(vocab) for name, vocab in self.vocab.items()},
+            "state_category": self.state_category.to_dict(),
+            "product": self.product.to_dict(),
+            "month": self.month.to_dict(),
+            "max_date_ms": self.max_date_ms.tolist(),
+            "customers": self.customers.to_dict() if self.customers is not None else None,
+            "tickets": self.tickets.to_dict() if self.tickets is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"Versão de estado não suportada: {data.get('version')}")
+        obj = cls()
+        obj.rows = data["rows"]
+        obj.vocab = {name: {v: i for i, v in enumerate(values)} for name, values in data["vocab"].items()}
+        obj.state_category = KeyedSums.from_dict(data["state_category"])
+        obj.product = KeyedSums.from_dict(data["product"])
+        obj.month = KeyedSums.from_dict(data["month"])
+        obj.max_date_ms = np.array(data["max_date_ms"], dtype=np.int64)
+        if data.get("customers") is not None:
+            obj.customers = KeyedHyperLogLog.from_dict(data["customers"])
+            obj.tickets = KeyedKLL.from_dict(data["tickets"])
+        return obj
+
+    def _decode(self, name, codes):
+        values = np.empty(len(self.vocab[name]), dtype=object)
+        for value, code in self.vocab[name].items():
+            values[code] = value
+        return values[codes]
+
+    def revenue_by_state_category(self):
+        keys, sums, _ = self.state_category.totals()
+        df = pd.DataFrame({
+            "state": self._decode("state", keys // self._PAIR_SHIFT),
+            "category": self._decode("category", keys % self._PAIR_SHIFT),
+            "total_revenue": sums[0],
+        })
+        # Chaves nulas ficam fora das tabelas, como no groupby do pandas
+        return finish_revenue_by_state_category(df.dropna(subset=["state", "category"]))
+
+    def price_rating_by_product(self):
+        keys, sums, counts = self.product.totals()
+        # Produto sem nenhum preço (ou rating) não nulo fica com média NaN
+        with np.errstate(invalid="ignore"):
+            avg = sums / self.product.nonnull
+        df = pd.DataFrame({
+            "product_id": self._decode("product_id", keys),
+            "avg_price": avg[0],
+            "avg_rating": avg[1],
+            "num_transactions": counts,
+        })
+        return df.dropna(subset=["product_id"]).sort_values("product_id", ignore_index=True)
+
+    def sales_by_month(self):
+        keys, sums, counts = self.month.totals()
+        df = pd.DataFrame({
+            "year_month": keys.astype("datetime64[M]").astype(str),
+            "total_revenue": sums[0],
+            "num_transactions": counts,
+        })
+        return df.sort_values("year_month", ignore_index=True)
+
+    def _customers_tickets(self, customers, tickets, decode_key):
+        keys, distinct = customers.estimates()
+        df = pd.DataFrame({"key": keys, "distinct_customers": np.rint(distinct).astype(np.int64)})
+        keys, counts, values = tickets.quantiles(TICKET_QUANTILES)
+        quantiles = pd.DataFrame({"key": keys, "num_transactions": counts})
+        for q, column in zip(TICKET_QUANTILES, values.T):
+            quantiles[f"ticket_p{round(q * 100)}"] = column
+        df = df.merge(quantiles, on="key")
+        df = pd.concat([decode_key(df.pop("key").to_numpy()), df], axis=1)
+        return df.dropna(subset=["state"])
+
+    def customers_tickets_by_state_month(self):
+        """
+        Clientes distintos e quantis do ticket por (state, year_month), pelos
+        sketches (exige sketches=True). Mesmo formato de
+        customers_tickets_dataframe.
+        """
+        df = self._customers_tickets(self.customers, self.tickets, lambda keys: pd.DataFrame({
+            "state": self._decode("state", keys // self._PAIR_SHIFT),
+            "year_month": (keys % self._PAIR_SHIFT).astype("datetime64[M]").astype(str),
+        }))
+        return df.sort_values(["state", "year_month"], ignore_index=True)
+
+    def customers_tickets_by_state(self):
+        """
+        O mesmo por state: os sketches dos meses são unidos (a união do
+        HyperLogLog conta cada cliente uma vez, mesmo que compre em vários meses).
+        """
+        keys, _ = self.customers.items()
+        customers = self.customers.regroup(keys // self._PAIR_SHIFT)
+        keys, _ = self.tickets.items()
+        tickets = self.tickets.regroup(keys // self._PAIR_SHIFT)
+        df = self._customers_tickets(customers, tickets, lambda keys: pd.DataFrame({
+            "state": self._decode("state", keys),
+        }))
+        return df.sort_values("state", ignore_index=True)
+
+    def integer_totals(self, name):
+        """
+        Somas de um acumulador em inteiros de 1/scale (centavos), prontas
+        para tabelas counter. Se o acumulador saiu do modo exato, arredonda.
+        """
+        acc = getattr(self, name)
+        keys, sums, counts = acc.items()
+        if not acc.exact:
+            sums = np.rint(sums * acc.scale).astype(np.int64)
+        return keys, sums, counts
+
+    def to_rollup_rows(self):
+        """
+        Linhas das três tabelas de rollup, com valores inteiros:
+
+        - state_category: (state, category, revenue_cents, num_transactions)
+        - month: (year_month, revenue_cents, num_transactions)
+        - product: (product_id, price_cents, rating_cents, num_transactions)
+        """
+        keys, sums, counts = self.integer_totals("state_category")
+        state_category = [row for row in zip(
+            self._decode("state", keys // self._PAIR_SHIFT).tolist(),
+            self._decode("category", keys % self._PAIR_SHIFT).tolist(),
+            sums[0].tolist(), counts.tolist(),
+        ) if row[0] is not None and row[1] is not None]
+
+        keys, sums, counts = self.integer_totals("month")
+        month = list(zip(
+            keys.astype("datetime64[M]").astype(str).tolist(), sums[0].tolist(), counts.tolist(),
+        ))
+
+        keys, sums, counts = self.integer_totals("product")
+        product = [row for row in zip(
+            self._decode("product_id", keys).tolist(), sums[0].tolist(), sums[1].tolist(), counts.tolist(),
+        ) if row[0] is not None]
+        return {"state_category": state_category, "month": month, "product": product}
+
+    @classmethod
+    def from_rollup_rows(cls, state_category, month, product):
+        """
+        Reconstrói o agregador a partir das tabelas de rollup (formato de
+        to_rollup_rows), para gerar os mesmos CSVs sem ler as transações.
+        As tabelas só guardam a contagem de linhas, então as médias de
+        preço e rating consideram todos os valores como não nulos.
+        """
+        obj = cls()
+        if state_category:
+            state, category, revenue, counts = (list(c) for c in zip(*state_category))
+            keys = (factorize_into(obj.vocab["state"], state) * cls._PAIR_SHIFT
+                    + factorize_into(obj.vocab["category"], category))
+            obj.state_category.add_totals(keys, np.array([revenue], dtype=np.int64), np.array(counts))
+        if month:
+            year_month, revenue, counts = (list(c) for c in zip(*month))
+            keys = np.array(year_month, dtype="datetime64[M]").astype(np.int64)
+            obj.month.add_totals(keys, np.array([revenue], dtype=np.int64), np.array(counts))
+            obj.rows = int(sum(counts))
+        if product:
+            product_id, price, rating, counts = (list(c) for c in zip(*product))
+            keys = factorize_into(obj.vocab["product_id"], product_id)
+            obj.product.add_totals(keys, np.array([price, rating], dtype=np.int64), np.array(counts))
+        return obj
+
+    def results(self):
+        """As três tabelas finais, no mesmo formato dos CSVs em data/processed."""
+        return (
+            self.revenue_by_state_category(),
+            self.price_rating_by_product(),
+            self.sales_by_month(),
+        )
+
+
+def save_state(path, aggregator, **extra):
+    """
+    Grava o estado do agregador em JSON. A escrita vai para um arquivo
+    temporário e depois substitui o anterior, para que uma interrupção no
+    meio nunca deixe um estado corrompido.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = aggregator.to_dict()
+    data["saved_at"] = datetime.now().isoformat(timespec="seconds")
+    data.update(extra)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_state(path, table=None):
+    """
+    Lê o estado salvo por save_state; retorna None se o arquivo não existir.
+    Com `table`, lança ValueError se o estado foi agregado de outra tabela
+    (ou não registra a tabela): somar a ele leituras de outra fonte
+    misturaria os totais.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if table is not None and data.get("table") != table:
+        raise ValueError(
+            f"estado agregado de outra tabela: {data.get('table') or 'desconhecida'} (atual: {table})"
+        )
+    return SalesAggregator.from_dict(data)
+
+
+def finish_revenue_by_state_category(df_receita):
+    """
+    Completa a tabela de receita por (state, category) com o total do estado
+    e a participação da categoria, na ordenação usada no CSV.
+    """
+    # Variável nova: participação da categoria no total do estado (share)
+    df_receita = df_receita.sort_values(["state", "category"], ignore_index=True)
+    df_receita["total_revenue"] = df_receita["total_revenue"].round(2)
+    df_receita["state_total_revenue"] = df_receita.groupby("state", observed=True)["total_revenue"].transform("sum")
+    df_receita["share_in_state"] = df_receita["total_revenue"] / df_receita["state_total_revenue"]
+
+    # Ordenar para facilitar análise (por estado, depois receita desc)
+    return df_receita.sort_values(["state", "total_revenue"], ascending=[True, False])
+
+
+def customers_tickets_dataframe(df):
+    """
+    Versão exata (DataFrame completo) de customers_tickets_by_state_month e
+    customers_tickets_by_state: nunique de customer_id e quantis de
+    total_value pelo pandas. Retorna (por state e mês, por state).
+    """
+    year_month = df["purchase_date"].dt.to_period("M").astype(str)
+    results = []
+    for keys in (["state", year_month.rename("year_month")], ["state"]):
+        grouped = df.groupby(keys, observed=True)
+        result = grouped.agg(
+            distinct_customers=("customer_id", "nunique"),
+            num_transactions=("total_value", "size"),
+        )
+        quantiles = grouped["total_value"].quantile(list(TICKET_QUANTILES)).unstack()
+        for q in TICKET_QUANTILES:
+            result[f"ticket_p{round(q * 100)}"] = quantiles[q]
+        results.append(result.reset_index())
+    by_state_month, by_state = results
+    by_state_month["state"] = by_state_month["state"].astype(str)
+    by_state["state"] = by_state["state"].astype(str)
+    return by_state_month, by_state
+
+
+def aggregate_dataframe(df):
+    """
+    Caminho com o DataFrame completo em memória (groupby do pandas).
+    Produz as mesmas três tabelas de SalesAggregator.results().
+
+    As somas em float são arredondadas para centavos antes de virar receita
+    e médias, que é o valor que o agregador soma de forma exata: assim os
+    dois caminhos gravam CSVs idênticos, sem depender da ordem das linhas.
+    """
+    df_receita = (
+        df.groupby(["state", "category"], as_index=False, observed=True)["total_value"]
+        .sum()
+        .rename(columns={"total_value": "total_revenue"})
+    )
+    df_receita = finish_revenue_by_state_category(df_receita)
+
+    df_preco_rating = (
+        df.groupby("product_id", as_index=False, observed=True)
+        .agg(
+            price_sum=("price", "sum"),
+            price_count=("price", "count"),
+            rating_sum=("rating", "sum"),
+            rating_count=("rating", "count"),
+            num_transactions=("transaction_id", "count"),
+        )
+    )
+    df_preco_rating = pd.DataFrame({
+        "product_id": df_preco_rating["product_id"],
+        "avg_price": df_preco_rating["price_sum"].round(2) / df_preco_rating["price_count"],
+        "avg_rating": df_preco_rating["rating_sum"].round(2) / df_preco_rating["rating_count"],
+        "num_transactions": df_preco_rating["num_transactions"],
+    })
+
+    year_month = df["purchase_date"].dt.to_period("M").astype(str)
+    df_vendas_mes = (
+        df.assign(year_month=year_month)
+        .groupby("year_month", as_index=False)
+        .agg(
+            total_revenue=("total_value", "sum"),
+            num_transactions=("transaction_id", "count"),
+        )
+        .sort_values("year_month")
+    )
+    df_vendas_mes["total_revenue"] = df_vendas_mes["total_revenue"].round(2)
+    return df_receita, df_preco_rating, df_vendas_mes
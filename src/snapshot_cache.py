@@ -0,0 +1,247 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from cassandra.metadata import Murmur3Token
+
+from cassandra_session import prepare_cached
+
+SNAPSHOT_VERSION = 2
+
+# Colunas guardadas como dicionário (categóricas no pandas) na leitura
+DICTIONARY_COLUMNS = ["state", "category", "product_id", "customer_id"]
+
+# Idade máxima padrão de um state no snapshot, em segundos. A impressão
+# digital de probe_partitions não enxerga todas as escritas, então depois
+# desse tempo o state é relido do cluster mesmo sem mudança detectada.
+DEFAULT_MAX_AGE = 24 * 3600
+
+
+def partition_token(*values):
+    """
+    Token Murmur3 de uma chave de partição de colunas text, serializada como
+    no Cassandra (chave composta: tamanho + bytes + 0x00 por componente).
+    """
+    parts = [str(v).encode("utf-8") for v in values]
+    if len(parts) == 1:
+        return Murmur3Token.hash_fn(parts[0])
+    return Murmur3Token.hash_fn(b"".join(len(p).to_bytes(2, "big") + p + b"\x00" for p in parts))
+
+
+def probe_partitions(session, table="base"):
+    """
+    "Impressão digital" barata de cada state, usada para saber o que mudou
+    desde o snapshot sem ler as linhas:
+
+    - base: por "skip scan" (como discover_partitions), uma leitura por
+      (state, category). Como purchase_date é DESC dentro da categoria, a
+      primeira linha de cada categoria já traz a venda mais recente, então
+      a impressão é {categoria: última purchase_date}. Só vendas novas mais
+      recentes que a última da categoria mudam a impressão: inserções com
+      data retroativa, updates e deletes passam despercebidos;
+    - bucketed: a lista de buckets (year_month) do state, via SELECT
+      DISTINCT. Escritas num bucket já existente não mudam a impressão.
+
+    O que a impressão não enxerga só entra no snapshot quando o state passa
+    da idade máxima (max_age, DEFAULT_MAX_AGE por padrão).
+
+    Retorna {state: (impressão, [tokens das partições])}.
+    """
+    if table == "bucketed":
+        buckets = {}
+        for r in session.execute("SELECT DISTINCT state, year_month FROM sales_transactions_by_month"):
+            buckets.setdefault(r.state, []).append(r.year_month)
+        return {
+            state: ({ym: None for ym in sorted(yms)},
+                    sorted(partition_token(state, ym) for ym in yms))
+            for state, yms in sorted(buckets.items())
+        }
+
+    states = sorted(r.state for r in session.execute(
+        "SELECT DISTINCT state FROM sales_transactions"
+    ))
+    first = prepare_cached(
+        session,
+        "SELECT category, purchase_date FROM sales_transactions WHERE state = ? LIMIT 1"
+    )
+    after = prepare_cached(
+        session,
+        "SELECT category, purchase_date FROM sales_transactions "
+        "WHERE state = ? AND category > ? LIMIT 1"
+    )
+    result = {}
+    for state in states:
+        fingerprint = {}
+        row = session.execute(first, (state,)).one()
+        while row is not None:
+            fingerprint[row.category] = row.purchase_date.isoformat()
+            row = session.execute(after, (state, row.category)).one()
+        result[state] = (fingerprint, [partition_token(state)])
+    return result
+
+
+class SalesSnapshot:
+    """
+    Cópia local da tabela de transações em Parquet, um arquivo por state
+    (<dir>/state=<UF>/data.parquet), para a análise não pagar um scan
+    completo do cluster a cada execução.
+
+    O manifest.json registra, por state, o arquivo, as linhas, quando foi
+    lido, os tokens das partições cobertas e a impressão digital da
+    partição no momento da leitura (ver probe_partitions). refresh() compara
+    a impressão atual com a do manifest e relê do cluster só os states que
+    mudaram (ou mais antigos que max_age); os demais continuam do disco.
+    A leitura usa memory map, então abrir o snapshot não copia os arquivos
+    para a memória antes de o Arrow precisar das colunas.
+    """
+
+    def __init__(self, cache_dir, table="base"):
+        self.dir = Path(cache_dir)
+        self.table = table
+        self.manifest_path = self.dir / "manifest.json"
+        self.partitions = {}
+        self.created_at = None
+        self.updated_at = None
+        if self.manifest_path.exists():
+            with open(self.manifest_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != SNAPSHOT_VERSION or data.get("table") != table:
+                print(f"[ALERTA] Snapshot em {self.dir} é de outra versão ou tabela; será refeito.")
+            else:
+                self.partitions = data["partitions"]
+                self.created_at = data["created_at"]
+                self.updated_at = data["updated_at"]
+
+    def __len__(self):
+        return sum(p["rows"] for p in self.partitions.values())
+
+    def stale_states(self, probe, max_age=None):
+        """
+        States a reler: novos, com impressão diferente da do manifest ou,
+        com max_age (segundos), lidos há mais tempo que isso. Retorna
+        (a reler, removidos do cluster).
+        """
+        now = datetime.now()
+        stale = []
+        for state, (fingerprint, _tokens) in probe.items():
+            entry = self.partitions.get(state)
+            if entry is None or entry["fingerprint"] != fingerprint:
+                stale.append(state)
+            elif max_age is not None and (
+                now - datetime.fromisoformat(entry["scanned_at"])
+            ).total_seconds() > max_age:
+                stale.append(state)
+        removed = sorted(set(self.partitions) - set(probe))
+        return stale, removed
+
+    def refresh(self, session, workers=16, max_age=DEFAULT_MAX_AGE, scan_mode=None):
+        """
+        Atualiza o snapshot a partir do cluster, relendo só os states
+        desatualizados. Retorna a lista de states relidos.
+        """
+        from etl_analysis import SALES_TABLES, build_scan_tasks, fetch_scan_dataframe
+
+        probe = probe_partitions(session, self.table)
+        stale, removed = self.stale_states(probe, max_age)
+        for state in removed:
+            shutil.rmtree(self.dir / self.partitions.pop(state)["file"].split("/")[0],
+                          ignore_errors=True)
+        if not stale:
+            if removed:
+                self.save_manifest()
+            return []
+
+        mode = scan_mode or SALES_TABLES[self.table]["fanout"]
+        scanned_at = datetime.now().isoformat(timespec="seconds")
+        tasks = build_scan_tasks(session, mode, table=self.table, states=set(stale))
+        df = fetch_scan_dataframe(session, tasks, workers)
+        groups = dict(tuple(df.groupby("state", observed=True, sort=False))) if len(df) else {}
+        for state in stale:
+            part = groups.get(state, df.iloc[:0])
+            fingerprint, tokens = probe[state]
+            self.partitions[state] = {
+                "file": self._write_partition(state, part),
+                "rows": len(part),
+                "scanned_at": scanned_at,
+                "tokens": [str(t) for t in tokens],
+                "fingerprint": fingerprint,
+            }
+        self.save_manifest()
+        return stale
+
+    def _write_partition(self, state, df):
+        relative = f"state={state}/data.parquet"
+        path = self.dir / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # categóricas gravadas como texto: o dicionário é refeito na leitura
+        for i, field in enumerate(table.schema):
+            if pa.types.is_dictionary(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+        tmp_path = path.with_name(path.name + ".tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        return relative
+
+    def save_manifest(self):
+        """Grava o manifest de forma atômica (arquivo temporário + os.replace)."""
+        now = datetime.now().isoformat(timespec="seconds")
+        self.created_at = self.created_at or now
+        self.updated_at = now
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "table": self.table,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "partitions": self.partitions,
+        }
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def read_table(self, states=None):
+        """Tabela Arrow do snapshot (todos os states ou só `states`), via memory map."""
+        names = sorted(self.partitions) if states is None else sorted(states)
+        tables = [
+            pq.read_table(self.dir / self.partitions[state]["file"], memory_map=True,
+                          read_dictionary=DICTIONARY_COLUMNS)
+            for state in names if self.partitions[state]["rows"]
+        ]
+        if not tables:
+            return None
+        return pa.concat_tables(tables)
+
+    def read_dataframe(self, states=None):
+        """
+        DataFrame no mesmo formato de fetch_all_sales: categóricas com as
+        categorias em ordem alfabética (mantém a ordenação do groupby).
+        """
+        table = self.read_table(states)
+        if table is None:
+            return pd.DataFrame()
+        df = table.to_pandas()
+        for name in DICTIONARY_COLUMNS:
+            df[name] = df[name].cat.reorder_categories(sorted(df[name].cat.categories))
+        return df
+
+
+def load_snapshot(cache_dir, table, session=None, workers=16, max_age=DEFAULT_MAX_AGE):
+    """
+    Abre o snapshot e, com uma sessão, atualiza os states desatualizados
+    antes da leitura (sem sessão, usa o que estiver em disco). Retorna
+    (snapshot, states relidos, segundos gastos no refresh).
+    """
+    snapshot = SalesSnapshot(cache_dir, table)
+    refreshed = []
+    start = time.perf_counter()
+    if session is not None:
+        refreshed = snapshot.refresh(session, workers, max_age)
+    return snapshot, refreshed, time.perf_counter() - start
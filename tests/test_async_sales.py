@@ -0,0 +1,169 @@
+import asyncio
+
+import pytest
+
+from async_sales import AsyncWriter, LoadUnit, from_blocking, scan_sales, to_blocking
+from cassandra_session import connect_cluster
+from dataset_sintetico import write_parquet
+from etl_analysis import SALES_COLUMNS
+from fake_cassandra import preload_parquet
+
+
+class _Resposta:
+    """Resposta do driver que só termina quando o teste manda."""
+
+    def __init__(self):
+        self.callbacks = None
+
+    def add_callbacks(self, callback, errback):
+        self.callbacks = (callback, errback)
+
+    def termina(self, exc=None):
+        callback, errback = self.callbacks
+        if exc is None:
+            callback([])
+        else:
+            errback(exc)
+
+
+class _Sessao:
+    """
+    Sessão mínima para o AsyncWriter: `falhas[params]` é quantas vezes o
+    envio daquele statement falha antes de dar certo (None: sempre falha).
+    Com manual=True as respostas ficam em `respostas` até o teste terminá-las.
+    """
+
+    def __init__(self, falhas=None, manual=False):
+        self.falhas = dict(falhas or {})
+        self.manual = manual
+        self.respostas = []
+        self.envios = 0
+
+    def execute_async(self, statement, params):
+        self.envios += 1
+        resposta = _Resposta()
+        if self.manual:
+            self.respostas.append(resposta)
+            return resposta
+        restantes = self.falhas.get(params, 0)
+        if restantes is None or restantes > 0:
+            if restantes is not None:
+                self.falhas[params] = restantes - 1
+            raise TimeoutError(f"falha em {params}")
+        resposta.add_callbacks = lambda callback, errback: callback([])
+        return resposta
+
+
+def test_writer_reenvia_falhas_e_conta_so_as_definitivas():
+    async def run():
+        session = _Sessao(falhas={"instavel": 1, "quebrada": None})
+        writer = AsyncWriter(session, concurrency=2, max_attempts=3, retry_base_delay=0.001)
+        unit = LoadUnit("bloco", None)
+        for params in ("ok", "instavel", "quebrada"):
+            await writer.submit(unit, "INSERT", params, (f"t-{params}",))
+        writer.seal(unit)
+        await writer.drain()
+        return session, writer, unit
+
+    session, writer, unit = asyncio.run(run())
+    assert writer.rows_ok == 2
+    assert writer.retries == 3
+    assert session.envios == 6
+    assert [(row_id, str(exc)) for row_id, exc in writer.errors] == [("t-quebrada", "falha em quebrada")]
+    assert unit.failed_ids == ["t-quebrada"]
+
+
+def test_on_unit_so_dispara_depois_da_ultima_resposta_do_bloco_fechado():
+    async def run():
+        session = _Sessao(manual=True)
+        done = []
+        writer = AsyncWriter(session, concurrency=10, max_attempts=1, on_unit=done.append)
+        unit = LoadUnit("bloco", None)
+        await writer.submit(unit, "INSERT", "a", ("t1",))
+        await writer.submit(unit, "INSERT", "b", ("t2",))
+
+        session.respostas[0].termina()
+        await asyncio.sleep(0)
+        writer.seal(unit)
+        assert done == []  # ainda falta uma resposta
+
+        await writer.submit(LoadUnit("outro", None), "INSERT", "c", ("t3",))
+        session.respostas[2].termina()
+        await asyncio.sleep(0)
+        assert done == []
+
+        session.respostas[1].termina(TimeoutError("timeout"))
+        await writer.drain()
+        return done, unit
+
+    done, unit = asyncio.run(run())
+    assert done == [unit]
+    assert unit.failed_ids == ["t2"]
+
+
+def test_on_unit_espera_o_bloco_ser_fechado():
+    async def run():
+        session = _Sessao(manual=True)
+        done = []
+        writer = AsyncWriter(session, on_unit=done.append)
+        unit = LoadUnit("bloco", None)
+        await writer.submit(unit, "INSERT", "a", ("t1",))
+        session.respostas[0].termina()
+        await writer.drain()
+        assert done == []  # mais requisições do bloco ainda podem vir
+        writer.seal(unit)
+        return done, unit
+
+    done, unit = asyncio.run(run())
+    assert done == [unit]
+
+
+def test_scan_sales_percorre_todas_as_paginas(tmp_path):
+    path = str(tmp_path / "vendas.parquet")
+    write_parquet(path, 300, chunk_rows=300, seed=5)
+    cluster = connect_cluster(backend="fake", fake_options={"latency_ms": 0})
+    session = cluster.connect("marketplace_ks")
+    try:
+        preload_parquet(session, path)
+
+        async def run():
+            return [page async for page in scan_sales(session, concurrency=4, fetch_size=7)]
+
+        pages = asyncio.run(run())
+    finally:
+        cluster.shutdown()
+
+    sizes = [len(page[0]) for page in pages]
+    assert sum(sizes) == 300
+    assert max(sizes) <= 7
+    pos = SALES_COLUMNS.index("transaction_id")
+    ids = [transaction_id for page in pages for transaction_id in page[pos]]
+    assert len(set(ids)) == 300
+
+
+def test_to_blocking_relanca_o_erro_do_loop():
+    async def itens():
+        yield 1
+        yield 2
+        raise ValueError("falha no loop")
+
+    recebidos = []
+    with pytest.raises(ValueError, match="falha no loop"):
+        for item in to_blocking(itens()):
+            recebidos.append(item)
+    assert recebidos == [1, 2]
+
+
+def test_from_blocking_relanca_o_erro_do_iterador():
+    def itens():
+        yield 1
+        raise OSError("falha de leitura")
+
+    async def run():
+        recebidos = []
+        with pytest.raises(OSError, match="falha de leitura"):
+            async for item in from_blocking(itens()):
+                recebidos.append(item)
+        return recebidos
+
+    assert asyncio.run(run()) == [1]
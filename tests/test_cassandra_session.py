@@ -0,0 +1,69 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from cassandra_session import ENV_OVERRIDES, load_connection_config, profile_settings
+
+
+@pytest.fixture(autouse=True)
+def _sem_variaveis(monkeypatch):
+    for name in list(ENV_OVERRIDES) + ["CASSANDRA_CONFIG"]:
+        monkeypatch.delenv(name, raising=False)
+
+
+def _config_json(tmp_path, data):
+    path = tmp_path / "cassandra.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return path
+
+
+def test_variaveis_de_ambiente_tem_precedencia_sobre_o_json(tmp_path, monkeypatch):
+    path = _config_json(tmp_path, {"hosts": ["10.0.0.1"], "port": 9142, "compression": "snappy"})
+    monkeypatch.setenv("CASSANDRA_HOSTS", "10.0.0.2, 10.0.0.3")
+    monkeypatch.setenv("CASSANDRA_COMPRESSION", "false")
+
+    config = load_connection_config(path)
+    assert config["hosts"] == ["10.0.0.2", "10.0.0.3"]
+    assert config["port"] == 9142
+    assert config["compression"] is False
+    assert config["keyspace"] == "marketplace_ks"
+
+
+def test_json_vem_de_cassandra_config_sem_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("CASSANDRA_CONFIG", str(_config_json(tmp_path, {"local_dc": "dc2"})))
+    assert load_connection_config()["local_dc"] == "dc2"
+
+
+def test_perfis_do_json_sao_mesclados_chave_a_chave(tmp_path):
+    path = _config_json(tmp_path, {"profiles": {
+        "write": {"consistency": "LOCAL_QUORUM"},
+        "relatorio": {"request_timeout": 120.0},
+    }})
+    config = load_connection_config(path)
+
+    write = profile_settings(config, "write")
+    assert write["consistency"] == "LOCAL_QUORUM"
+    assert write["request_timeout"] == 20.0  # padrão do perfil "write"
+    assert write["speculative_delay_ms"] is None
+    assert write["retry"] == "default"  # herdado do perfil "default"
+
+    relatorio = profile_settings(config, "relatorio")
+    assert relatorio["request_timeout"] == 120.0
+    assert relatorio["speculative_delay_ms"] == 50.0
+    assert profile_settings(config, "lookup")["request_timeout"] == 2.0
+
+
+def test_chave_desconhecida_no_json_e_rejeitada(tmp_path):
+    with pytest.raises(ValueError, match="timeout"):
+        load_connection_config(_config_json(tmp_path, {"timeout": 5}))
+
+
+def test_backend_fake_so_e_importado_quando_pedido():
+    src = Path(__file__).resolve().parent.parent / "src"
+    code = "import sys, cassandra_session; print('fake_cassandra' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=src, capture_output=True,
+                            text=True, check=True).stdout
+    assert output.strip() == "False"
@@ -0,0 +1,9 @@
+from dataset_sintetico import write_parquet
+
+
+def test_arquivo_gerado_com_varios_workers_e_identico_ao_de_um(tmp_path):
+    single, parallel = tmp_path / "um.parquet", tmp_path / "tres.parquet"
+    totals = write_parquet(single, 5_000, chunk_rows=1_000, seed=42, workers=1)
+    assert write_parquet(parallel, 5_000, chunk_rows=1_000, seed=42, workers=3) == totals
+    assert sum(totals.values()) == 5_000
+    assert single.read_bytes() == parallel.read_bytes()
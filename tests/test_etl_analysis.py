@@ -0,0 +1,21 @@
+from datetime import datetime
+
+import pandas as pd
+
+from etl_analysis import SALES_COLUMNS, SalesColumnBuffer
+
+
+def test_buffer_colunar_guarda_nulos_como_nan():
+    rows = [
+        ("SP", "a", "t1", "c1", "p2", 1.0, 1.0, 1.0, datetime(2024, 1, 1), 4.0),
+        ("RJ", None, "t2", "c2", "p1", 2.0, 1.0, 2.0, datetime(2024, 1, 2), 5.0),
+        (None, "b", "t3", "c1", "p1", 3.0, 1.0, 3.0, datetime(2024, 1, 3), 3.0),
+    ]
+    buffer = SalesColumnBuffer()
+    buffer.append_page([list(column) for column in zip(*rows)])
+    df = buffer.to_dataframe()
+    expected = pd.DataFrame(rows, columns=SALES_COLUMNS)
+    assert df["state"].tolist()[:2] == ["SP", "RJ"] and pd.isna(df["state"][2])
+    assert df["category"].isna().tolist() == [False, True, False]
+    assert list(df["state"].cat.categories) == ["RJ", "SP"]
+    assert df["product_id"].astype(str).tolist() == expected["product_id"].tolist()
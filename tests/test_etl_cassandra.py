@@ -0,0 +1,139 @@
+import time
+
+from cassandra import OperationTimedOut
+
+from cassandra_session import connect_cluster
+from dataset_sintetico import write_parquet
+from etl_cassandra import (
+    ROLLUP_CQL,
+    AdaptiveConcurrency,
+    RollupWriter,
+    load_pipelined,
+    prepare_targets,
+    stream_encoded_chunks,
+)
+from load_checkpoint import LoadCheckpoint
+
+ROLLUP_TABLES = {
+    "rollup_revenue_by_state_category": ("state", "category"),
+    "rollup_revenue_by_month": ("year_month",),
+    "rollup_product_stats": ("product_id",),
+}
+
+
+def _fake_session():
+    cluster = connect_cluster(backend="fake", fake_options={"latency_ms": 0})
+    return cluster, cluster.connect("marketplace_ks")
+
+
+def _carregar(session, path, checkpoint=None, skip=None):
+    return load_pipelined(
+        session, prepare_targets(session),
+        stream_encoded_chunks(path, batch_size=500, skip=skip),
+        rollups=RollupWriter(session, flush_rows=1_000, checkpoint=checkpoint),
+        checkpoint=checkpoint, report=lambda progress: None,
+    )
+
+
+def _rollups(session):
+    tables = {}
+    for table, key in ROLLUP_TABLES.items():
+        rows = session.execute(f"SELECT * FROM {table}")
+        tables[table] = {tuple(row._asdict()[name] for name in key): row for row in rows}
+    return tables
+
+
+def test_falha_parcial_nos_rollups_e_refeita_no_resume_sem_somar_duas_vezes(tmp_path):
+    path = str(tmp_path / "vendas.parquet")
+    write_parquet(path, 3_000, chunk_rows=1_000, seed=7)
+
+    cluster_ref, session_ref = _fake_session()
+    cluster, session = _fake_session()
+    try:
+        _carregar(session_ref, path)
+        expected = _rollups(session_ref)
+
+        execute_async = session.execute_async
+        month_cql = ROLLUP_CQL["month"]
+
+        def falha_no_rollup_mensal(statement, params=None, *args, **kwargs):
+            if getattr(statement, "query_string", None) == month_cql:
+                raise RuntimeError("timeout simulado")
+            return execute_async(statement, params, *args, **kwargs)
+
+        session.execute_async = falha_no_rollup_mensal
+        checkpoint_path = str(tmp_path / "checkpoint.json")
+        checkpoint = LoadCheckpoint(checkpoint_path, path)
+        stats = _carregar(session, path, checkpoint)
+        assert stats["errors"] == []
+
+        checkpoint = LoadCheckpoint.load(checkpoint_path, path)
+        assert checkpoint.rows_done == 3_000
+        assert {name for name, _params in checkpoint.rollup_pending} == {"month"}
+        assert _rollups(session)["rollup_revenue_by_month"] == {}
+
+        session.execute_async = execute_async
+        _carregar(session, path, checkpoint, skip=frozenset(checkpoint.completed))
+        assert LoadCheckpoint.load(checkpoint_path, path).rollup_pending == []
+        assert _rollups(session) == expected
+    finally:
+        cluster_ref.shutdown()
+        cluster.shutdown()
+
+
+def _controle(initial=10, min_limit=4, max_limit=100):
+    return AdaptiveConcurrency(initial, min_limit, max_limit, target_latency=0.05, window=1.0,
+                               increase=4, decrease=0.5)
+
+
+class _Respostas:
+    """
+    Alimenta o controle com tempos sintéticos, uma janela por vez: n-1
+    respostas no início da janela e a última depois do fim, o que dispara
+    o ajuste.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.start = time.perf_counter()
+
+    def janelas(self, n_windows, latency=0.01, exc=None, saturated=True, n=20):
+        """Devolve o limite depois de cada janela."""
+        controller = self.controller
+        limits = []
+        for _ in range(n_windows):
+            for started in [self.start] * (n - 1) + [self.start + controller.window]:
+                controller.on_complete(started, latency, exc, controller.limit if saturated else 0)
+            limits.append(controller.limit)
+            self.start += 1.5 * controller.window
+        return limits
+
+
+def test_concorrencia_dobra_no_inicio_e_depois_cresce_aos_poucos():
+    controller = _controle()
+    respostas = _Respostas(controller)
+    assert respostas.janelas(2) == [20, 40]
+    assert respostas.janelas(1, exc=OperationTimedOut("timeout")) == [20]
+    assert respostas.janelas(3) == [24, 28, 32]
+
+
+def test_concorrencia_nao_cresce_sem_atingir_o_limite():
+    controller = _controle()
+    respostas = _Respostas(controller)
+    assert respostas.janelas(3, saturated=False) == [10, 10, 10]
+
+
+def test_concorrencia_cai_pela_metade_com_latencia_acima_do_alvo():
+    controller = _controle(initial=64)
+    respostas = _Respostas(controller)
+    assert respostas.janelas(2, latency=0.2) == [32, 16]
+    assert [entry[4] for entry in controller.history[1:]] == ["latência", "latência"]
+
+
+def test_concorrencia_respeita_os_limites():
+    controller = _controle(initial=50)
+    respostas = _Respostas(controller)
+    assert respostas.janelas(3)[-1] == 100
+    assert respostas.janelas(10, exc=OperationTimedOut("timeout"))[-3:] == [4, 4, 4]
+    summary = controller.summary()
+    assert (summary["min"], summary["max"], summary["final"]) == (4, 100, 4)
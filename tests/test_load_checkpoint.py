@@ -0,0 +1,88 @@
+import pytest
+
+from cassandra_session import connect_cluster
+from dataset_sintetico import write_parquet
+from etl_cassandra import load_pipelined, prepare_targets, stream_encoded_chunks
+from load_checkpoint import LoadCheckpoint, RetryBackoff, unit_key
+
+
+def _fake_session():
+    cluster = connect_cluster(backend="fake", fake_options={"latency_ms": 0})
+    return cluster, cluster.connect("marketplace_ks")
+
+
+def _carregar(session, chunks, checkpoint):
+    return load_pipelined(session, prepare_targets(session), chunks, checkpoint=checkpoint,
+                          report=lambda progress: None)
+
+
+def _transaction_ids(session):
+    return [row.transaction_id for row in session.execute("SELECT transaction_id FROM sales_transactions")]
+
+
+@pytest.fixture
+def vendas(tmp_path):
+    path = str(tmp_path / "vendas.parquet")
+    write_parquet(path, 2_000, chunk_rows=1_000, seed=3)
+    return path
+
+
+def test_carga_interrompida_e_retomada_sem_reenviar_blocos_concluidos(tmp_path, vendas):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    cluster, session = _fake_session()
+    try:
+        def interrompe_no_terceiro_bloco(chunks):
+            for i, unit in enumerate(chunks):
+                if i == 2:
+                    raise OSError("leitura interrompida")
+                yield unit
+
+        checkpoint = LoadCheckpoint(checkpoint_path, vendas, save_interval=0)
+        with pytest.raises(OSError, match="interrompida"):
+            _carregar(session, interrompe_no_terceiro_bloco(
+                stream_encoded_chunks(vendas, batch_size=250)), checkpoint)
+
+        # blocos ainda em voo na interrupção não contam como concluídos
+        checkpoint = LoadCheckpoint.load(checkpoint_path, vendas)
+        assert checkpoint.completed <= {unit_key(0, 0), unit_key(0, 1)}
+        done = frozenset(checkpoint.completed)
+        assert checkpoint.rows_done == 250 * len(done)
+
+        stats = _carregar(session, stream_encoded_chunks(vendas, batch_size=250, skip=done),
+                          checkpoint)
+        assert stats["rows"] == 2_000 - 250 * len(done)
+
+        checkpoint = LoadCheckpoint.load(checkpoint_path, vendas)
+        assert checkpoint.rows_done == 2_000
+        assert len(checkpoint.completed) == 8
+        ids = _transaction_ids(session)
+        assert len(ids) == len(set(ids)) == 2_000
+    finally:
+        cluster.shutdown()
+
+
+def test_parciais_dos_workers_sao_incorporados_ao_checkpoint(tmp_path, vendas):
+    base = LoadCheckpoint(str(tmp_path / "checkpoint.json"), vendas)
+    base.mark_failed(unit_key(1, 0), ["t1"])
+    cluster, session = _fake_session()
+    try:
+        for worker_id in range(2):
+            part = LoadCheckpoint(base.part_path(worker_id), vendas)
+            _carregar(session, stream_encoded_chunks(vendas, batch_size=250, shard=(worker_id, 2)),
+                      part)
+        assert base.merge_parts() == 2
+    finally:
+        cluster.shutdown()
+
+    assert base.rows_done == 2_000
+    assert base.completed == {unit_key(g, j) for g in range(2) for j in range(4)}
+    assert base.failed == {}
+    assert list(tmp_path.glob("checkpoint.part*")) == []
+    assert LoadCheckpoint.load(base.path, vendas).rows_done == 2_000
+
+
+def test_backoff_dobra_a_espera_e_respeita_o_limite():
+    backoff = RetryBackoff(base_delay=0.5, max_delay=3.0)
+    for attempt, expected in ((1, 0.5), (2, 1.0), (3, 2.0), (4, 3.0), (10, 3.0)):
+        for _ in range(50):
+            assert expected <= backoff.delay_for(attempt) <= expected * 1.2
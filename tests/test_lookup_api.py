@@ -0,0 +1,78 @@
+import threading
+from datetime import datetime, timedelta
+
+from cassandra_session import connect_cluster
+from etl_cassandra import INSERT_COLUMNS
+from fake_cassandra import FakeResponseFuture
+from lookup_api import SalesLookup
+
+COLUMNS = [name for name, _ in INSERT_COLUMNS]
+
+
+def _session_com_vendas(n_rows):
+    cluster = connect_cluster(backend="fake", fake_options={"latency_ms": 0})
+    session = cluster.connect("marketplace_ks")
+    insert = session.prepare(
+        f"INSERT INTO sales_by_product ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+    )
+    for i in range(n_rows):
+        row = {
+            "transaction_id": f"t{i}", "customer_id": "c1", "product_id": "p1", "state": "SP",
+            "category": "a", "price": 10.0, "quantity": 1, "total_value": 10.0,
+            "purchase_date": datetime(2024, 1, 1) + timedelta(hours=i), "city": "x",
+            "payment_method": "pix", "device_type": "mobile", "rating": 4.0,
+        }
+        session.execute(insert, [row[name] for name in COLUMNS])
+    return cluster, session
+
+
+def test_falha_ao_pedir_proxima_pagina_vira_erro_da_chave(monkeypatch):
+    cluster, session = _session_com_vendas(5)
+    try:
+        def falha(self):
+            raise RuntimeError("conexão perdida")
+
+        monkeypatch.setattr(FakeResponseFuture, "start_fetching_next_page", falha)
+        lookup = SalesLookup(session, fetch_size=2)
+        result = {}
+        worker = threading.Thread(target=lambda: result.update(df=lookup.product_sales(["p1"])),
+                                  daemon=True)
+        worker.start()
+        worker.join(timeout=10)
+        assert not worker.is_alive(), "lookup travou esperando a chave com falha"
+        assert result["df"].empty
+        assert [(key, str(exc)) for key, exc in lookup.errors] == [("p1", "conexão perdida")]
+    finally:
+        cluster.shutdown()
+
+
+def test_chave_com_varias_paginas():
+    cluster, session = _session_com_vendas(5)
+    try:
+        df = SalesLookup(session, fetch_size=2).product_sales(["p1", "p2"])
+        assert df["transaction_id"].tolist() == [f"t{i}" for i in range(4, -1, -1)]
+    finally:
+        cluster.shutdown()
+
+
+def test_pagina_que_chega_depois_da_falha_e_descartada(monkeypatch):
+    cluster, session = _session_com_vendas(5)
+    try:
+        fetch = FakeResponseFuture.start_fetching_next_page
+
+        def pede_e_falha(self):
+            fetch(self)  # a próxima página já foi pedida quando o erro sobe
+            raise RuntimeError("falha depois do pedido")
+
+        monkeypatch.setattr(FakeResponseFuture, "start_fetching_next_page", pede_e_falha)
+        lookup = SalesLookup(session, fetch_size=2)
+        result = {}
+        worker = threading.Thread(target=lambda: result.update(df=lookup.product_sales(["p1"])),
+                                  daemon=True)
+        worker.start()
+        worker.join(timeout=10)
+        assert not worker.is_alive()
+        assert result["df"].empty
+        assert [key for key, _exc in lookup.errors] == ["p1"]
+    finally:
+        cluster.shutdown()
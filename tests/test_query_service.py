@@ -0,0 +1,72 @@
+import os
+import time
+
+from query_service import ResultCache, SalesQueryService
+
+
+def _escreve_csvs(processed_dir, monthly):
+    (processed_dir / "receita_estado_categoria.csv").write_text(
+        "state,category,total_revenue,state_total_revenue,share_in_state\n"
+        "SP,a,10.0,10.0,1.0\n", encoding="utf-8")
+    (processed_dir / "preco_rating_por_produto.csv").write_text(
+        "product_id,avg_price,avg_rating,num_transactions\n"
+        "P1,10.0,4.0,1\n", encoding="utf-8")
+    (processed_dir / "vendas_por_mes.csv").write_text(
+        "year_month,total_revenue,num_transactions\n"
+        + "".join(f"{month},{revenue},{count}\n" for month, revenue, count in monthly),
+        encoding="utf-8")
+
+
+def test_entrada_expira_depois_do_ttl():
+    cache = ResultCache(ttl=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == (True, 1)
+    time.sleep(0.1)
+    assert cache.get("a") == (False, None)
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_sai_a_entrada_usada_ha_mais_tempo():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == (True, 1)  # "b" passa a ser a mais antiga
+    cache.put("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+    assert cache.evictions == 1
+
+
+def test_cache_desligado_nao_guarda_nada():
+    cache = ResultCache(max_entries=0)
+    cache.put("a", 1)
+    assert cache.get("a") == (False, None)
+    assert len(cache) == 0
+
+
+def test_resultado_em_cache_e_descartado_quando_o_csv_muda(tmp_path):
+    _escreve_csvs(tmp_path, [("2024-01", 10.0, 1), ("2024-02", 20.0, 2)])
+    service = SalesQueryService(tmp_path, check_interval=0)
+    assert service.monthly_revenue()["total_revenue"] == 30.0
+    assert service.monthly_revenue()["total_revenue"] == 30.0
+    assert (service.cache.hits, service.reloads) == (1, 0)
+
+    # mesmo tamanho, conteúdo e mtime novos
+    _escreve_csvs(tmp_path, [("2024-01", 10.0, 1), ("2024-02", 50.0, 2)])
+    monthly = tmp_path / "vendas_por_mes.csv"
+    stat = os.stat(monthly)
+    os.utime(monthly, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert service.monthly_revenue()["total_revenue"] == 60.0
+    assert service.reloads == 1
+    # um resultado da geração anterior gravado depois da recarga não é servido
+    service.cache.put(("monthly_revenue", 0, None, None), {"total_revenue": 30.0})
+    assert service.monthly_revenue()["total_revenue"] == 60.0
+
+    # mesmo mtime, tamanho novo
+    stat = os.stat(monthly)
+    _escreve_csvs(tmp_path, [("2024-01", 10.0, 1), ("2024-02", 500.0, 2)])
+    os.utime(monthly, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert service.monthly_revenue()["total_revenue"] == 510.0
+    assert service.reloads == 2
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+import pytest
+
+from dataset_sintetico import write_parquet
+
+from sales_aggregates import (
+    KeyedSums,
+    SalesAggregator,
+    aggregate_dataframe,
+    customers_tickets_dataframe,
+    factorize_into,
+    load_state,
+    save_state,
+)
+
+
+def _vendas_com_nulos():
+    return pd.DataFrame({
+        "transaction_id": ["t1", "t2", "t3", "t4", "t5"],
+        "customer_id": ["c1", "c2", "c1", "c3", "c2"],
+        "product_id": ["p1", "p1", "p2", "p2", "p3"],
+        "category": ["a", "a", "b", "b", "b"],
+        "state": ["SP", "SP", "RJ", "RJ", "SP"],
+        "price": [10.0, np.nan, 5.5, 4.5, np.nan],
+        "rating": [4.0, 3.0, np.nan, 5.0, np.nan],
+        "total_value": [10.0, 20.0, np.nan, 9.0, 1.25],
+        "purchase_date": pd.to_datetime(
+            ["2024-01-05", "2024-01-20", "2024-02-01", "2024-02-03", "2024-03-01"]
+        ),
+    })
+
+
+def test_keyed_sums_ignora_nulos():
+    acc = KeyedSums(1)
+    acc.add(np.array([0, 0, 1]), np.array([1.25, np.nan, 2.0]))
+    keys, sums, counts = acc.totals()
+    assert acc.exact
+    assert keys.tolist() == [0, 1]
+    assert sums[0].tolist() == [1.25, 2.0]
+    assert counts.tolist() == [2, 1]
+    assert acc.nonnull[0].tolist() == [1, 1]
+
+
+def test_keyed_sums_merge_e_estado_preservam_nao_nulos():
+    a, b = KeyedSums(1), KeyedSums(1)
+    a.add(np.array([0, 1]), np.array([np.nan, 1.0]))
+    b.add(np.array([0, 0]), np.array([2.0, np.nan]))
+    a.merge(b)
+    restored = KeyedSums.from_dict(a.to_dict())
+    assert restored.counts.tolist() == [3, 1]
+    assert restored.nonnull.tolist() == [[1, 1]]
+
+
+def test_medias_com_preco_e_rating_nulos_batem_com_pandas():
+    df = _vendas_com_nulos()
+    aggregator = SalesAggregator()
+    aggregator.update({name: df[name].to_numpy() for name in df.columns})
+    for stream, expected in zip(aggregator.results(), aggregate_dataframe(df)):
+        pd.testing.assert_frame_equal(stream, expected, check_dtype=False)
+
+
+def test_factorize_into_da_codigo_proprio_aos_nulos():
+    vocab = {}
+    codes = factorize_into(vocab, ["SP", None, "RJ", np.nan, "SP"])
+    assert vocab == {"SP": 0, "RJ": 1, None: 2}
+    assert codes.tolist() == [0, 2, 1, 2, 0]
+    assert factorize_into(vocab, ["RJ", "MG"]).tolist() == [1, 3]
+
+
+def test_chaves_nulas_ficam_fora_das_tabelas_como_no_pandas():
+    df = _vendas_com_nulos().astype({"state": object, "category": object, "product_id": object})
+    df.loc[1, "state"] = None
+    df.loc[3, "category"] = None
+    df.loc[4, "product_id"] = None
+    aggregator = SalesAggregator()
+    aggregator.update({name: df[name].to_numpy() for name in df.columns})
+    for stream, expected in zip(aggregator.results(), aggregate_dataframe(df)):
+        pd.testing.assert_frame_equal(stream.reset_index(drop=True), expected.reset_index(drop=True),
+                                      check_dtype=False)
+    rollups = aggregator.to_rollup_rows()
+    assert {row[:2] for row in rollups["state_category"]} == {("SP", "a"), ("RJ", "b"), ("SP", "b")}
+    assert {row[0] for row in rollups["product"]} == {"p1", "p2"}
+
+
+def test_csvs_dos_dois_engines_sao_identicos():
+    rng = np.random.default_rng(7)
+    n = 5000
+    df = pd.DataFrame({
+        "transaction_id": [f"t{i}" for i in range(n)],
+        "customer_id": rng.choice(["c1", "c2", "c3"], n),
+        "product_id": rng.choice([f"p{i}" for i in range(20)], n),
+        "category": rng.choice(["a", "b"], n),
+        "state": rng.choice(["SP", "RJ", "MG"], n),
+        "price": rng.integers(1, 100_000, n) / 100,
+        "rating": rng.integers(10, 51, n) / 10,
+        "total_value": rng.integers(1, 1_000_000, n) / 100,
+        "purchase_date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), "D"),
+    })
+    aggregator = SalesAggregator()
+    aggregator.update({name: df[name].to_numpy() for name in df.columns})
+    for stream, expected in zip(aggregator.results(), aggregate_dataframe(df.sample(frac=1, random_state=1))):
+        assert stream.to_csv(index=False) == expected.to_csv(index=False)
+
+
+def test_estado_de_outra_tabela_nao_e_reaproveitado(tmp_path):
+    path = tmp_path / "estado.json"
+    df = _vendas_com_nulos()
+    aggregator = SalesAggregator()
+    aggregator.update({name: df[name].to_numpy() for name in df.columns})
+    save_state(path, aggregator, table="sales_transactions")
+
+    assert load_state(path, table="sales_transactions").rows == 5
+    with pytest.raises(ValueError, match="outra tabela"):
+        load_state(path, table="sales_transactions_by_month")
+
+
+def test_sketches_proximos_do_caminho_exato_com_nulos(tmp_path):
+    path = tmp_path / "vendas.parquet"
+    write_parquet(path, 20_000, chunk_rows=20_000, seed=11)
+    df = pd.read_parquet(path)
+    rng = np.random.default_rng(0)
+    df.loc[rng.random(len(df)) < 0.05, "customer_id"] = None
+    df.loc[rng.random(len(df)) < 0.05, "total_value"] = np.nan
+
+    aggregator = SalesAggregator(sketches=True)
+    aggregator.update({name: df[name].to_numpy() for name in df.columns})
+    _, exact = customers_tickets_dataframe(df)
+    approx = aggregator.customers_tickets_by_state()
+
+    assert approx["state"].tolist() == exact["state"].tolist()
+    assert approx["num_transactions"].tolist() == exact["num_transactions"].tolist()
+    error = (approx["distinct_customers"] - exact["distinct_customers"]).abs()
+    assert (error / exact["distinct_customers"]).max() < 0.05
+    # o KLL garante o erro de rank: a fração de tickets até o quantil aproximado
+    tickets = {state: np.sort(group.dropna().to_numpy())
+               for state, group in df.groupby("state", observed=True)["total_value"]}
+    for q in (0.5, 0.95):
+        for state, value in zip(approx["state"], approx[f"ticket_p{round(q * 100)}"]):
+            values = tickets[state]
+            rank = np.searchsorted(values, value, side="right") / len(values)
+            assert abs(rank - q) < 0.02, (state, q)
+
+    # só nulos: a chave aparece, com 0 distintos e as linhas contadas
+    aggregator = SalesAggregator(sketches=True)
+    only_nulls = df.head(3).assign(state="SP", customer_id=None, total_value=np.nan)
+    aggregator.update({name: only_nulls[name].to_numpy() for name in only_nulls.columns})
+    row = aggregator.customers_tickets_by_state().iloc[0]
+    assert (row["distinct_customers"], row["num_transactions"]) == (0, 3)
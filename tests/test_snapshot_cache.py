@@ -0,0 +1,17 @@
+from datetime import datetime, timedelta
+
+from snapshot_cache import DEFAULT_MAX_AGE, SalesSnapshot
+
+
+def test_estado_sem_mudanca_na_impressao_e_relido_depois_da_idade_maxima(tmp_path):
+    snapshot = SalesSnapshot(tmp_path)
+    fingerprint = {"a": "2024-01-01T00:00:00"}
+    for state, age in (("SP", DEFAULT_MAX_AGE + 60), ("RJ", 60)):
+        snapshot.partitions[state] = {
+            "fingerprint": fingerprint,
+            "scanned_at": (datetime.now() - timedelta(seconds=age)).isoformat(),
+        }
+    probe = {"SP": (fingerprint, [1]), "RJ": (fingerprint, [2]), "MG": (fingerprint, [3])}
+    stale, removed = snapshot.stale_states(probe, DEFAULT_MAX_AGE)
+    assert sorted(stale) == ["MG", "SP"]
+    assert removed == []